@@ -0,0 +1,102 @@
+# answer_cache.py
+#
+# Process-wide cache of generated answers. Keys are derived from the full
+# model request (model, messages, settings), so an answer is reused only
+# when the exact same prompt - including the same corpus text - is sent.
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class AnswerCache:
+    """
+    A small thread-safe LRU cache with a time-to-live.
+
+    - `get()` returns None for missing or expired entries.
+    - The least recently used entry is dropped once `max_entries` is reached.
+    - `hits` / `misses` are kept for monitoring.
+    - With a shared `backend` (see cache_backend.py), answers generated by
+      one process are reused by the others.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 24 * 3600, backend=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, count: bool = True) -> str | None:
+        """
+        The cached answer for `key`, or None. Pass `count=False` for lookups
+        that shouldn't show up in the hit/miss counters (e.g. polling).
+        """
+        answer = self._lookup(key)
+        if count:
+            with self._lock:
+                if answer is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return answer
+
+    def _lookup(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                return entry[1]
+            self._entries.pop(key, None)
+
+        if self.backend is not None:
+            raw = self.backend.get(f"answer:{key}")
+            if raw is not None:
+                created, answer = json.loads(raw)
+                self._remember(key, created, answer)
+                return answer
+        return None
+
+    def set(self, key: str, answer: str) -> None:
+        created = time.time()
+        self._remember(key, created, answer)
+        if self.backend is not None:
+            self.backend.set(
+                f"answer:{key}",
+                json.dumps([created, answer]).encode("utf-8"),
+                ttl_seconds=self.ttl_seconds,
+            )
+
+    def _remember(self, key: str, created: float, answer: str) -> None:
+        with self._lock:
+            self._entries[key] = (created, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        """Drop one answer (here and in the shared backend), e.g. once its sources change."""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(f"answer:{key}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def answer_cache_from_env(backend=None) -> AnswerCache:
+    """Build an AnswerCache from ANSWER_CACHE_SIZE / ANSWER_CACHE_TTL (seconds)."""
+    return AnswerCache(
+        max_entries=int(os.environ.get("ANSWER_CACHE_SIZE", "512")),
+        ttl_seconds=float(os.environ.get("ANSWER_CACHE_TTL", str(24 * 3600))),
+        backend=backend,
+    )
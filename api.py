@@ -0,0 +1,322 @@
+# api.py
+#
+# Headless HTTP/JSON API for the answer engine, for internal tools that need
+# more throughput than a Streamlit session. Run it next to the UI with the
+# same POLICY_CACHE_PATH so both share the corpus store and answer cache:
+#
+#     POLICY_CACHE_PATH=policy_cache.sqlite python api.py --port 8000
+#
+# Endpoints (POST bodies are JSON):
+#   POST /v1/answer    {"jurisdiction": "...", "question": "...", "stream": false}
+#   POST /v1/compare   {"jurisdiction_1": "...", "jurisdiction_2": "...", "question": "...", "stream": false}
+#   POST /v1/canada    {"question": "...", "stream": false}
+#   GET  /v1/corpus    corpus, answer-cache, model-usage and cache-warming status
+#
+# With "stream": true the reply is sent as newline-delimited JSON:
+# {"delta": "..."} lines followed by {"done": true} (or {"error": "..."}).
+#
+# Each answer has the same per-mode deadline as in the UI (504 when it runs
+# out), and is cancelled - model stream included - if the client disconnects.
+# Add ?profile=<PROFILE_ADMIN_TOKEN> to profile one request (see profiling.py).
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import policy_engine
+from cancellation import AnswerCancelled, CancelToken, DeadlineExceeded, cancel_scope
+from profiling import profile_requested, profiled
+
+# Answers run in worker threads (fetching and model calls block). At most
+# API_MAX_CONCURRENCY run at once; up to API_MAX_QUEUE more wait for a slot,
+# and anything beyond that is turned away with 503 + Retry-After.
+API_MAX_CONCURRENCY = int(os.environ.get("API_MAX_CONCURRENCY", "16"))
+API_MAX_QUEUE = int(os.environ.get("API_MAX_QUEUE", "64"))
+
+# How often a non-streaming request checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 0.5
+
+_executor = ThreadPoolExecutor(max_workers=API_MAX_CONCURRENCY, thread_name_prefix="api-answer")
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Backpressure:
+    """Bounded concurrency with a bounded waiting line."""
+
+    def __init__(self, limit: int, max_waiting: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+
+    async def acquire(self) -> None:
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+_gate = Backpressure(API_MAX_CONCURRENCY, API_MAX_QUEUE)
+
+
+# ---- Helpers ----
+def _error(message: str, status_code: int, headers: dict | None = None) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code, headers=headers)
+
+
+async def _read_body(request: Request) -> dict:
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError("Request body must be JSON.")
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object.")
+    return body
+
+
+def _required_text(body: dict, field: str) -> str:
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{field}' is required.")
+    return value.strip()
+
+
+def _optional_text(body: dict, field: str) -> str | None:
+    value = body.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"'{field}' must be a string.")
+    return value.strip() or None
+
+
+def _jurisdiction(body: dict, field: str) -> str:
+    name = _required_text(body, field)
+    canonical = policy_engine.NORM_KEYS.get(name.lower())
+    if canonical is None:
+        raise ValueError(f"Unknown jurisdiction: {name!r}")
+    return canonical
+
+
+def _profiled(request: Request, fn, mode: str, jurisdictions: list[str]):
+    force = profile_requested(request.query_params.get("profile"))
+    return profiled(fn, mode, jurisdictions, force=force)
+
+
+def _run_with_token(token: CancelToken, fn, *args, **kwargs):
+    with cancel_scope(token):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            token.close()
+
+
+class _GatedStreamingResponse(StreamingResponse):
+    """
+    A streaming response that runs `finish()` once it is over, however it
+    ends - including when the client goes away before the body is ever
+    iterated, in which case the body generator's own cleanup never runs.
+    """
+
+    def __init__(self, content, finish, **kwargs):
+        super().__init__(content, **kwargs)
+        self._finish = finish
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._finish()
+
+
+async def _run_answer(request: Request, fn, *args, stream: bool, deadline: float, on_success=None):
+    """
+    Run an answer function in a worker thread, as JSON or as an NDJSON
+    stream. `on_success()` is called once an answer has been delivered.
+    """
+    try:
+        await _gate.acquire()
+    except Overloaded:
+        return _error("Server is busy, please retry shortly.", 503, {"Retry-After": "5"})
+
+    loop = asyncio.get_running_loop()
+    token = CancelToken(deadline)
+
+    if not stream:
+        future = loop.run_in_executor(_executor, partial(_run_with_token, token, fn, *args))
+        try:
+            # Starlette doesn't interrupt a handler when its client goes
+            # away, so check for that while the answer is being generated
+            while not future.done():
+                await asyncio.wait({future}, timeout=DISCONNECT_POLL_SECONDS)
+                if not future.done() and await request.is_disconnected():
+                    token.cancel("client disconnected")
+            answer = future.result()
+        except asyncio.CancelledError:
+            token.cancel("client disconnected")
+            raise
+        except DeadlineExceeded:
+            return _error("The answer took too long and was stopped.", 504)
+        except AnswerCancelled:
+            return _error("The client disconnected.", 499)
+        except Exception as e:
+            return _error(f"Error generating answer: {e}", 500)
+        finally:
+            _gate.release()
+        if on_success is not None:
+            on_success()
+        return JSONResponse({"answer": answer})
+
+    queue: asyncio.Queue[str] = asyncio.Queue()
+
+    def on_delta(text: str) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, text)
+
+    future = loop.run_in_executor(_executor, partial(_run_with_token, token, fn, *args, on_delta=on_delta))
+
+    async def body():
+        streamed = False
+        while not (future.done() and queue.empty()):
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, future}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                streamed = True
+                yield json.dumps({"delta": getter.result()}) + "\n"
+            else:
+                getter.cancel()
+        try:
+            answer = future.result()
+        except Exception as e:
+            yield json.dumps({"error": f"Error generating answer: {e}"}) + "\n"
+            return
+        # Guardrail and "thin corpus" replies are returned without calling the model
+        if not streamed:
+            yield json.dumps({"delta": answer}) + "\n"
+        yield json.dumps({"done": True}) + "\n"
+        if on_success is not None:
+            on_success()
+
+    def finish() -> None:
+        # The client went away before the answer finished
+        if not future.done():
+            token.cancel("client disconnected")
+        _gate.release()
+
+    return _GatedStreamingResponse(body(), finish, media_type="application/x-ndjson")
+
+
+# ---- Endpoints ----
+async def answer(request: Request):
+    try:
+        body = await _read_body(request)
+        jurisdiction = _jurisdiction(body, "jurisdiction")
+        question = _required_text(body, "question")
+    except ValueError as e:
+        return _error(str(e), 400)
+    return await _run_answer(
+        request,
+        _profiled(request, policy_engine.answer_ai_policy_question, "single", [jurisdiction]),
+        jurisdiction,
+        question,
+        stream=bool(body.get("stream")),
+        deadline=policy_engine.ANSWER_DEADLINES["single"],
+        on_success=partial(policy_engine.record_query, "single", [jurisdiction], question),
+    )
+
+
+async def compare(request: Request):
+    try:
+        body = await _read_body(request)
+        j1 = _jurisdiction(body, "jurisdiction_1")
+        j2 = _jurisdiction(body, "jurisdiction_2")
+        question = _optional_text(body, "question")
+    except ValueError as e:
+        return _error(str(e), 400)
+    return await _run_answer(
+        request,
+        _profiled(request, policy_engine.compare_jurisdictions, "compare", [j1, j2]),
+        j1,
+        j2,
+        question,
+        stream=bool(body.get("stream")),
+        deadline=policy_engine.ANSWER_DEADLINES["compare"],
+        on_success=partial(policy_engine.record_query, "compare", [j1, j2], question),
+    )
+
+
+async def canada(request: Request):
+    try:
+        body = await _read_body(request)
+        question = _required_text(body, "question")
+    except ValueError as e:
+        return _error(str(e), 400)
+    return await _run_answer(
+        request,
+        _profiled(request, policy_engine.answer_canada_wide, "canada", []),
+        question,
+        stream=bool(body.get("stream")),
+        deadline=policy_engine.ANSWER_DEADLINES["canada"],
+        on_success=partial(policy_engine.record_query, "canada", [], question),
+    )
+
+
+def _corpus_report() -> dict:
+    store = policy_engine.get_corpus_store()
+    report = store.memory_report()
+    jurisdictions = {}
+    for name, urls in policy_engine.JURISDICTION_SOURCES.items():
+        jurisdictions[name] = {
+            "configured_sources": len(urls),
+            "loaded": store.has(name),
+            "loaded_sources": len(store.sources(name)),
+            **report.get(name, {}),
+        }
+    cache = policy_engine.get_answer_cache()
+    return {
+        "jurisdictions": jurisdictions,
+        "answer_cache": {"entries": len(cache), "hits": cache.hits, "misses": cache.misses},
+        "model_usage": policy_engine.get_model_usage().report(),
+        "cache_warming": policy_engine.get_cache_warmer().last_run,
+    }
+
+
+async def corpus_status(request: Request):
+    # The store may read from (and sync with) the shared cache backend
+    report = await asyncio.get_running_loop().run_in_executor(None, _corpus_report)
+    return JSONResponse({**report, "requests": {"waiting": _gate.waiting}})
+
+
+app = Starlette(
+    routes=[
+        Route("/v1/answer", answer, methods=["POST"]),
+        Route("/v1/compare", compare, methods=["POST"]),
+        Route("/v1/canada", canada, methods=["POST"]),
+        Route("/v1/corpus", corpus_status, methods=["GET"]),
+    ]
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the policy answer API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,241 @@
+# benchmark_compression.py
+#
+# Measures what context compression (see compression.py) saves and costs on
+# a fixed question set. For every question it reports the prompt excerpt's
+# tokens without compression (the first `max_chars` of the corpus) and with
+# it (see CONTEXT_KEEP_RATIOS in policy_engine.py), and how many of the
+# question's terms survive; with --judge it also generates both answers and
+# has the model say which one is better grounded and more complete (this
+# makes model calls). Compression is off by default in the engine, so pass
+# --keep-ratio (or set CONTEXT_KEEP_RATIO_*) to benchmark a setting.
+#
+#     python benchmark_compression.py --keep-ratio 0.6     # offline, token counts only
+#     CONTEXT_KEEP_RATIO_SINGLE=0.4 python benchmark_compression.py --modes single
+#     python benchmark_compression.py --keep-ratio 0.6 --judge --output compression_benchmark.json
+#
+# Set CORPUS_SNAPSHOT_PATH to run offline against a snapshot instead of
+# fetching the sources.
+
+import argparse
+import json
+import statistics
+import time
+
+# Fixed question set: (mode, jurisdictions, question)
+QUESTION_SET = [
+    ("single", ["Federal"], "What does the Directive on Automated Decision-Making require before a system is deployed?"),
+    ("single", ["Ontario"], "How does Ontario expect ministries to manage AI risks?"),
+    ("single", ["Alberta"], "What rules apply to generative AI use by Alberta public servants?"),
+    ("single", ["Manitoba"], "What has Manitoba announced about artificial intelligence in government?"),
+    ("single", ["Newfoundland and Labrador"], "What privacy concerns about AI has Newfoundland and Labrador raised?"),
+    ("single", ["Northwest Territories"], "What does the GNWT guideline say about using generative AI?"),
+    ("compare", ["Federal", "Ontario"], "How do their transparency requirements compare?"),
+    ("compare", ["Québec", "Nova Scotia"], "How do they approach responsible use of AI?"),
+    ("compare", ["Manitoba", "Newfoundland and Labrador"], None),
+    ("canada", [], "What are the common transparency expectations for AI in Canadian governments?"),
+    ("canada", [], "Which governments require an impact assessment before using AI?"),
+]
+
+JUDGE_PROMPT = """Two answers to the same question about Canadian public-sector AI policy follow.
+Judge which one is more accurate, better grounded in specific policies, and more complete.
+Reply with exactly one word: A, B, or tie.
+
+Question: {question}
+
+### Answer A
+{a}
+
+### Answer B
+{b}"""
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens, via tiktoken if installed, else the usual ~4 chars/token."""
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4
+    return len(tiktoken.get_encoding("o200k_base").encode(text))
+
+
+def _max_chars(mode: str) -> int:
+    import policy_engine
+
+    return policy_engine.COMPARE_MAX_CHARS if mode == "compare" else 16000
+
+
+def _raw_excerpt(mode: str, jurisdictions: list[str], read_chars: int | None = None) -> str:
+    """
+    The excerpt a mode puts in its prompt without compression, or the first
+    `read_chars` characters compression picks from.
+    """
+    import policy_engine
+
+    store = policy_engine.get_corpus_store()
+    read_chars = read_chars or _max_chars(mode)
+    if mode == "single":
+        return store.head(jurisdictions[0], read_chars)
+    if mode == "compare":
+        return "\n\n".join(store.head(j, read_chars) for j in jurisdictions)
+    names = [j for j in policy_engine.JURISDICTION_SOURCES if store.length(j)]
+    return policy_engine._joined_corpora_head(store, names, read_chars)
+
+
+def _compressed_excerpt(mode: str, jurisdictions: list[str], question: str | None) -> str:
+    import policy_engine
+
+    store = policy_engine.get_corpus_store()
+    max_chars = _max_chars(mode)
+    head = _raw_excerpt(mode, jurisdictions, policy_engine.excerpt_read_chars(mode, max_chars))
+    if mode == "single":
+        return policy_engine.compress_excerpt(head, mode, jurisdictions, max_chars, question)
+    if mode == "compare":
+        return "\n\n".join(policy_engine.prepare_compare_context(j) for j in jurisdictions)
+    names = [j for j in policy_engine.JURISDICTION_SOURCES if store.length(j)]
+    return policy_engine.compress_excerpt(head, mode, names, max_chars, question)
+
+
+def term_recall(question: str | None, original: str, compressed: str) -> float | None:
+    """Share of the question's content terms found in `original` that are still in `compressed`."""
+    from compression import _terms
+
+    if not question:
+        return None
+    present = {t for t in _terms(question) if t in set(_terms(original))}
+    if not present:
+        return None
+    kept = set(_terms(compressed))
+    return len(present & kept) / len(present)
+
+
+def _answer(mode: str, jurisdictions: list[str], question: str | None) -> str:
+    import policy_engine
+
+    if mode == "single":
+        return policy_engine.answer_ai_policy_question(jurisdictions[0], question)
+    if mode == "compare":
+        return policy_engine.compare_jurisdictions(jurisdictions[0], jurisdictions[1], question)
+    return policy_engine.answer_canada_wide(question)
+
+
+def judge(mode: str, jurisdictions: list[str], question: str | None, index: int) -> dict:
+    """
+    Answer with and without compression and ask the model which is better.
+    The two answers swap positions on alternate questions to offset any
+    preference for the first one.
+    """
+    import policy_engine
+
+    ratio = policy_engine.CONTEXT_KEEP_RATIOS[mode]
+    compressed = _answer(mode, jurisdictions, question)
+    policy_engine.CONTEXT_KEEP_RATIOS[mode] = 1.0
+    try:
+        uncompressed = _answer(mode, jurisdictions, question)
+    finally:
+        policy_engine.CONTEXT_KEEP_RATIOS[mode] = ratio
+
+    swapped = index % 2 == 1
+    a, b = (uncompressed, compressed) if swapped else (compressed, uncompressed)
+    verdict = policy_engine.complete_chat(
+        model="gpt-4.1-mini",
+        messages=[{"role": "user", "content": JUDGE_PROMPT.format(
+            question=question or f"Compare the AI policies of {' and '.join(jurisdictions)}.", a=a, b=b
+        )}],
+        temperature=0,
+    ).strip().strip(".").lower()
+    if verdict not in ("a", "b", "tie"):
+        verdict = "tie"
+    if verdict != "tie":
+        verdict = "compressed" if (verdict == "a") != swapped else "uncompressed"
+    return {
+        "verdict": verdict,
+        "compressed_answer_chars": len(compressed),
+        "uncompressed_answer_chars": len(uncompressed),
+    }
+
+
+def run_benchmark(modes: list[str], with_judge: bool = False) -> dict:
+    import policy_engine
+
+    results = []
+    for index, (mode, jurisdictions, question) in enumerate(QUESTION_SET):
+        if mode not in modes:
+            continue
+        names = jurisdictions or list(policy_engine.JURISDICTION_SOURCES)
+        for name in names:
+            policy_engine.load_jurisdiction_corpus(name)
+
+        original = _raw_excerpt(mode, jurisdictions)
+        start = time.perf_counter()
+        compressed = _compressed_excerpt(mode, jurisdictions, question)
+        seconds = time.perf_counter() - start
+        result = {
+            "mode": mode,
+            "jurisdictions": jurisdictions,
+            "question": question,
+            "original_chars": len(original),
+            "compressed_chars": len(compressed),
+            "original_tokens": count_tokens(original),
+            "compressed_tokens": count_tokens(compressed),
+            "term_recall": term_recall(question, original, compressed),
+            "compress_seconds": round(seconds, 4),
+        }
+        if with_judge:
+            result.update(judge(mode, jurisdictions, question, index))
+        results.append(result)
+
+    return {
+        "keep_ratios": {m: policy_engine.CONTEXT_KEEP_RATIOS[m] for m in modes},
+        "focus_on_question": policy_engine.CONTEXT_FOCUS_ON_QUESTION,
+        "results": results,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"Keep ratios: {report['keep_ratios']}  (question in focus: {report['focus_on_question']})")
+    print(f"{'mode':<8} {'jurisdictions':<38} {'tokens':>15} {'saved':>6} {'recall':>6} {'judge':>12}")
+    for r in report["results"]:
+        names = ", ".join(r["jurisdictions"]) or "all"
+        tokens = f"{r['original_tokens']} -> {r['compressed_tokens']}"
+        saved = 1 - r["compressed_tokens"] / r["original_tokens"] if r["original_tokens"] else 0
+        recall = "-" if r["term_recall"] is None else f"{r['term_recall']:.0%}"
+        print(f"{r['mode']:<8} {names[:38]:<38} {tokens:>15} {saved:>6.0%} {recall:>6} {r.get('verdict', '-'):>12}")
+
+    results = report["results"]
+    original = sum(r["original_tokens"] for r in results)
+    compressed = sum(r["compressed_tokens"] for r in results)
+    if original:
+        print(f"\nExcerpt tokens: {original} -> {compressed} ({1 - compressed / original:.0%} fewer)")
+    recalls = [r["term_recall"] for r in results if r["term_recall"] is not None]
+    if recalls:
+        print(f"Mean question-term recall: {statistics.mean(recalls):.0%}")
+    verdicts = [r["verdict"] for r in results if "verdict" in r]
+    if verdicts:
+        print("Judge: " + ", ".join(
+            f"{v} {verdicts.count(v)}" for v in ("compressed", "uncompressed", "tie")
+        ))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark context compression on a fixed question set.")
+    parser.add_argument("--modes", default="single,compare,canada", help="comma-separated modes to run")
+    parser.add_argument("--judge", action="store_true", help="also compare answers with the model (makes API calls)")
+    parser.add_argument("--output", default=None, help="write the full results to this JSON file")
+    parser.add_argument("--keep-ratio", type=float, default=None,
+                        help="keep ratio for every mode (default: CONTEXT_KEEP_RATIO_* settings)")
+    args = parser.parse_args()
+
+    if args.keep_ratio is not None:
+        import policy_engine
+
+        policy_engine.CONTEXT_KEEP_RATIOS.update(dict.fromkeys(policy_engine.CONTEXT_KEEP_RATIOS, args.keep_ratio))
+
+    report = run_benchmark([m.strip() for m in args.modes.split(",")], with_judge=args.judge)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+# cache_backend.py
+#
+# Shared key/value storage behind the corpus store, answer cache and source
+# health records, so that separate worker processes - the Streamlit UI and
+# the HTTP API, on one host or several - see the same corpora and answers.
+#
+# Pick one with POLICY_CACHE_URL:
+#   memory://                  in-process only (mostly useful for testing)
+#   sqlite:///cache.sqlite     shared by processes on one host
+#                              (sqlite:////abs/path for an absolute path)
+#   redis://host:6379/0        shared by processes on any host (needs `redis`)
+# POLICY_CACHE_PATH=<file> is still accepted as shorthand for sqlite.
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class CacheBackend(ABC):
+    """
+    Interface every backend implements. Values are bytes; `ttl_seconds`
+    makes an entry expire.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl_seconds: float | None = None) -> bool:
+        """Set `key` only if it is absent (or expired); True if it was set."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_if(self, key: str, value: bytes) -> bool:
+        """Delete `key` only if it still holds `value`; True if it was deleted."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def incr_counts(self, key: str, counts: dict[str, int], max_entries: int | None = None) -> None:
+        """
+        Atomically add `counts` to the per-member counters stored under
+        `key`, then keep only the `max_entries` highest members.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def top_counts(self, key: str, n: int) -> list[tuple[str, int]]:
+        """The `n` highest (member, count) pairs under `key`, highest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_members(self, key: str, members: list[str], ttl_seconds: float | None = None) -> None:
+        """Atomically add `members` to the set stored under `key`; each expires after `ttl_seconds`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def members(self, key: str) -> list[str]:
+        """The unexpired members of the set under `key`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_members(self, key: str, members: list[str]) -> None:
+        raise NotImplementedError
+
+
+def _top(counters: dict[str, int], n: int) -> list[tuple[str, int]]:
+    return sorted(counters.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+def _text(value: bytes | str) -> str:
+    # Redis clients made with decode_responses=True already return str
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class MemoryBackend(CacheBackend):
+    """Dictionary-backed store, private to one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[bytes, float | None]] = {}
+        self._counters: dict[str, dict[str, int]] = {}
+        self._sets: dict[str, dict[str, float | None]] = {}
+
+    def _live(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires < time.time():
+            del self._entries[key]
+            return None
+        return value
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        expires = time.time() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+
+    def add(self, key: str, value: bytes, ttl_seconds: float | None = None) -> bool:
+        expires = time.time() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._entries[key] = (value, expires)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            del self._entries[key]
+            return True
+
+    def incr_counts(self, key: str, counts: dict[str, int], max_entries: int | None = None) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(key, {})
+            for member, amount in counts.items():
+                counters[member] = counters.get(member, 0) + amount
+            if max_entries is not None and len(counters) > max_entries:
+                self._counters[key] = dict(_top(counters, max_entries))
+
+    def top_counts(self, key: str, n: int) -> list[tuple[str, int]]:
+        with self._lock:
+            return _top(self._counters.get(key, {}), n)
+
+    def add_members(self, key: str, members: list[str], ttl_seconds: float | None = None) -> None:
+        expires = time.time() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._sets.setdefault(key, {}).update(dict.fromkeys(members, expires))
+
+    def members(self, key: str) -> list[str]:
+        now = time.time()
+        with self._lock:
+            found = self._sets.get(key, {})
+            for member in [m for m, expires in found.items() if expires is not None and expires < now]:
+                del found[member]
+            return list(found)
+
+    def remove_members(self, key: str, members: list[str]) -> None:
+        with self._lock:
+            found = self._sets.get(key, {})
+            for member in members:
+                found.pop(member, None)
+            if not found:
+                self._sets.pop(key, None)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Key/value store in a single SQLite file.
+
+    - Safe to use from many threads (one connection per thread) and many
+      processes (WAL journal, busy timeout).
+    - Values are bytes; `ttl_seconds` makes an entry expire.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " expires REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counts ("
+                " key TEXT NOT NULL,"
+                " member TEXT NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " PRIMARY KEY (key, member))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS members ("
+                " key TEXT NOT NULL,"
+                " member TEXT NOT NULL,"
+                " expires REAL,"
+                " PRIMARY KEY (key, member))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> bytes | None:
+        row = self._connect().execute(
+            "SELECT value, expires FROM kv WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        expires = time.time() + ttl_seconds if ttl_seconds else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, expires),
+            )
+
+    def add(self, key: str, value: bytes, ttl_seconds: float | None = None) -> bool:
+        now = time.time()
+        expires = now + ttl_seconds if ttl_seconds else None
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM kv WHERE key = ? AND expires IS NOT NULL AND expires < ?",
+                (key, now),
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, expires),
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, value))
+            return cursor.rowcount == 1
+
+    def incr_counts(self, key: str, counts: dict[str, int], max_entries: int | None = None) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO counts (key, member, count) VALUES (?, ?, ?)"
+                " ON CONFLICT (key, member) DO UPDATE SET count = count + excluded.count",
+                [(key, member, amount) for member, amount in counts.items()],
+            )
+            if max_entries is not None:
+                conn.execute(
+                    "DELETE FROM counts WHERE key = ? AND member NOT IN"
+                    " (SELECT member FROM counts WHERE key = ? ORDER BY count DESC LIMIT ?)",
+                    (key, key, max_entries),
+                )
+
+    def top_counts(self, key: str, n: int) -> list[tuple[str, int]]:
+        rows = self._connect().execute(
+            "SELECT member, count FROM counts WHERE key = ? ORDER BY count DESC LIMIT ?", (key, n)
+        ).fetchall()
+        return [(member, count) for member, count in rows]
+
+    def add_members(self, key: str, members: list[str], ttl_seconds: float | None = None) -> None:
+        now = time.time()
+        expires = now + ttl_seconds if ttl_seconds else None
+        with self._connect() as conn:
+            conn.execute("DELETE FROM members WHERE key = ? AND expires < ?", (key, now))
+            conn.executemany(
+                "INSERT INTO members (key, member, expires) VALUES (?, ?, ?)"
+                " ON CONFLICT (key, member) DO UPDATE SET expires = excluded.expires",
+                [(key, member, expires) for member in members],
+            )
+
+    def members(self, key: str) -> list[str]:
+        rows = self._connect().execute(
+            "SELECT member FROM members WHERE key = ? AND (expires IS NULL OR expires >= ?)",
+            (key, time.time()),
+        ).fetchall()
+        return [member for member, in rows]
+
+    def remove_members(self, key: str, members: list[str]) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM members WHERE key = ? AND member = ?", [(key, member) for member in members]
+            )
+
+
+class RedisBackend(CacheBackend):
+    """
+    Store in Redis (or anything speaking its protocol), shared across hosts.
+
+    `client` is any object with redis-py's `get` / `set(..., px=, nx=)` /
+    `delete` methods (and `pipeline` with `watch` for conditional deletes) (and the sorted-set methods used for counters and
+    sets, whose scores are counts and expiry times) - pass a local stand-in
+    for testing. Without one, a client is created from `url` (requires the
+    `redis` package). Keys are namespaced with `prefix` so one Redis can
+    serve several deployments.
+    """
+
+    def __init__(self, url: str | None = None, client=None, prefix: str = "policy:"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+        self.prefix = prefix
+
+    @staticmethod
+    def _px(ttl_seconds: float | None) -> int | None:
+        return max(1, int(ttl_seconds * 1000)) if ttl_seconds else None
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        self.client.set(self.prefix + key, value, px=self._px(ttl_seconds))
+
+    def add(self, key: str, value: bytes, ttl_seconds: float | None = None) -> bool:
+        return bool(self.client.set(self.prefix + key, value, px=self._px(ttl_seconds), nx=True))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        from redis.exceptions import WatchError
+
+        # Optimistic transaction: the delete is dropped if the key changes
+        # between the check and the delete
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.prefix + key)
+                current = pipe.get(self.prefix + key)
+                if current is None or _text(current) != _text(value):
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.delete(self.prefix + key)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def incr_counts(self, key: str, counts: dict[str, int], max_entries: int | None = None) -> None:
+        pipe = self.client.pipeline()
+        for member, amount in counts.items():
+            pipe.zincrby(self.prefix + key, amount, member)
+        if max_entries is not None:
+            pipe.zremrangebyrank(self.prefix + key, 0, -max_entries - 1)
+        pipe.execute()
+
+    def top_counts(self, key: str, n: int) -> list[tuple[str, int]]:
+        pairs = self.client.zrevrange(self.prefix + key, 0, n - 1, withscores=True)
+        return [(_text(member), int(score)) for member, score in pairs]
+
+    def add_members(self, key: str, members: list[str], ttl_seconds: float | None = None) -> None:
+        now = time.time()
+        expires = now + ttl_seconds if ttl_seconds else float("inf")
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.prefix + key, "-inf", now)
+        pipe.zadd(self.prefix + key, dict.fromkeys(members, expires))
+        if ttl_seconds:
+            # Callers use one TTL per key, so the newest member expires last
+            pipe.pexpire(self.prefix + key, max(1, int(ttl_seconds * 1000)))
+        pipe.execute()
+
+    def members(self, key: str) -> list[str]:
+        found = self.client.zrangebyscore(self.prefix + key, time.time(), "+inf")
+        return [_text(member) for member in found]
+
+    def remove_members(self, key: str, members: list[str]) -> None:
+        if members:
+            self.client.zrem(self.prefix + key, *members)
+
+
+@contextmanager
+def hold_lease(backend: CacheBackend | None, lease_key: str, lease_seconds: float):
+    """
+    Try to take the lease `lease_key`; yields True if this worker holds it
+    (always, without a backend). Each holder writes its own token, so a
+    holder whose lease expired and was taken over doesn't release the new
+    holder's lease on its way out.
+    """
+    if backend is None:
+        yield True
+        return
+    token = uuid.uuid4().hex.encode("ascii")
+    if not backend.add(lease_key, token, ttl_seconds=lease_seconds):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        backend.delete_if(lease_key, token)
+
+
+def run_once_across_processes(
+    backend: CacheBackend | None,
+    lease_key: str,
+    build: Callable[[], T],
+    ready: Callable[[], T | None],
+    lease_seconds: float = 300,
+    poll_seconds: float = 0.5,
+    check: Callable[[], None] | None = None,
+) -> T:
+    """
+    Cross-process counterpart of SingleFlight: run `build()` in only one
+    worker at a time.
+
+    The worker that takes the lease builds; the others poll `ready()` (which
+    returns the shared result, or None while it isn't there yet) until the
+    lease is released or expires, then build themselves if there is still
+    nothing to show for it. Without a backend, `build()` just runs.
+    `check()`, if given, is called while waiting and may raise to give up.
+    """
+    with hold_lease(backend, lease_key, lease_seconds) as held:
+        if held:
+            return build()
+
+    deadline = time.monotonic() + lease_seconds
+    while time.monotonic() < deadline:
+        if check is not None:
+            check()
+        time.sleep(poll_seconds)
+        result = ready()
+        if result is not None:
+            return result
+        if backend.get(lease_key) is None:
+            break
+    result = ready()
+    return result if result is not None else build()
+
+
+def backend_from_url(url: str) -> CacheBackend:
+    """A backend for a memory://, sqlite:///path or redis:// (rediss://, unix://) URL."""
+    scheme, _, rest = url.partition("://")
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme == "sqlite":
+        return SQLiteBackend(rest[1:] if rest.startswith("/") else rest)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported POLICY_CACHE_URL scheme: {scheme!r}")
+
+
+def backend_from_env() -> CacheBackend | None:
+    """
+    The shared backend named by POLICY_CACHE_URL (or POLICY_CACHE_PATH for
+    SQLite), or None to keep caches in-process only.
+    """
+    url = os.environ.get("POLICY_CACHE_URL")
+    if url:
+        return backend_from_url(url)
+    path = os.environ.get("POLICY_CACHE_PATH")
+    return SQLiteBackend(path) if path else None
@@ -0,0 +1,208 @@
+# cache_warming.py
+#
+# Keeps the most popular answers cached across corpus changes. Every question
+# asked in the UI or API is counted by (mode, jurisdictions, question); when
+# the corpus version changes (a refresh, a new snapshot, a deploy), the top
+# N of them - topped up with the example questions - are answered again in
+# the background, a few per minute, so the first people to ask them after
+# the change get a cached answer instead of waiting for the model.
+#
+#     python cache_warming.py top --limit 20    # most-asked questions so far
+#     python cache_warming.py run --top 20      # warm now, whatever the version
+#
+# The engine warms automatically with CACHE_WARM_TOP_N > 0; see
+# CACHE_WARM_PER_MINUTE and CACHE_WARM_CHECK_SECONDS in policy_engine.py.
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+
+from cache_backend import MemoryBackend
+from ratelimit import TokenBucket
+
+
+@dataclass
+class PopularQuery:
+    """A question as asked in one mode ("single", "compare" or "canada"), and how often."""
+    mode: str
+    jurisdictions: list[str]
+    question: str | None
+    count: int = 0
+
+    @property
+    def key(self) -> str:
+        return json.dumps([self.mode, self.jurisdictions, self.question], ensure_ascii=False)
+
+
+class QueryStats:
+    """
+    Thread-safe question counts.
+
+    - Counts are batched in memory and added to the backend's counters
+      (see CacheBackend.incr_counts) at most every `flush_seconds`, and
+      before `top()` reads them; `flush()` writes the rest, e.g. at exit.
+    - Only the `max_entries` most frequent questions are kept.
+    - With a shared `backend` (see cache_backend.py), counts from every
+      worker process are added up in one place; without one they stay in
+      this process.
+    """
+
+    def __init__(self, max_entries: int = 500, backend=None, flush_seconds: float = 10):
+        self.max_entries = max_entries
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending: Counter = Counter()
+        self._flushed = time.monotonic()
+
+    def record(self, mode: str, jurisdictions: list[str], question: str | None) -> None:
+        with self._lock:
+            self._pending[PopularQuery(mode, list(jurisdictions), question).key] += 1
+            due = time.monotonic() - self._flushed >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Add the counts recorded since the last flush to the backend."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed = time.monotonic()
+        if pending:
+            self.backend.incr_counts("warm:query_counts", dict(pending), self.max_entries)
+
+    def top(self, n: int) -> list[PopularQuery]:
+        """The `n` most frequently asked questions, most frequent first."""
+        self.flush()
+        return [
+            PopularQuery(*json.loads(key), count=count)
+            for key, count in self.backend.top_counts("warm:query_counts", n)
+        ]
+
+
+class CacheWarmer:
+    """
+    Answers popular questions again whenever the corpus version changes.
+
+    - `candidates(n)` gives the questions to warm, most important first.
+    - `answer(query)` generates (and thereby caches) one answer.
+    - `version()` identifies the current corpus contents.
+    - Answers are generated one at a time, at most `per_minute` per minute,
+      so warming never crowds out people waiting for answers.
+    - With a shared `backend`, each corpus version is warmed by one worker
+      only.
+    """
+
+    def __init__(
+        self,
+        candidates: Callable[[int], list[PopularQuery]],
+        answer: Callable[[PopularQuery], str],
+        version: Callable[[], str],
+        top_n: int = 20,
+        per_minute: float = 10,
+        backend=None,
+    ):
+        self.candidates = candidates
+        self.answer = answer
+        self.version = version
+        self.top_n = top_n
+        self.backend = backend
+        self._bucket = TokenBucket(per_minute)
+        # Start with an empty bucket, so a burst of warming can't take the
+        # rate-limit headroom of a freshly started worker
+        self._bucket.reserve(per_minute)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.warmed_version: str | None = None
+        self.last_run: dict | None = None
+
+    def warm_if_changed(self) -> dict | None:
+        """Warm if the corpus version differs from the last one warmed; returns the run report."""
+        version = self.version()
+        if version == self.warmed_version:
+            return None
+        if self.backend is not None and not self.backend.add(
+            f"warm:version:{version}", b"1", ttl_seconds=7 * 24 * 3600
+        ):
+            # Another worker is warming (or has warmed) this version
+            self.warmed_version = version
+            return None
+        return self.warm(version)
+
+    def warm(self, version: str | None = None) -> dict:
+        """Answer the top candidates now; returns a report of the run."""
+        with self._lock:
+            version = version or self.version()
+            run = {"version": version, "started": time.time(), "warmed": 0, "failed": 0, "finished": None}
+            self.last_run = run
+            for query in self.candidates(self.top_n):
+                time.sleep(self._bucket.reserve(1))
+                try:
+                    self.answer(query)
+                    run["warmed"] += 1
+                except Exception as e:
+                    run["failed"] += 1
+                    print(f"[CacheWarmer] Error warming {query.mode} {query.jurisdictions}: {e}")
+            run["finished"] = time.time()
+            # Warming loads any corpus that wasn't loaded yet, which changes
+            # the version; the answers are current for the new one too
+            self.warmed_version = self.version()
+            if self.backend is not None and self.warmed_version != version:
+                self.backend.add(f"warm:version:{self.warmed_version}", b"1", ttl_seconds=7 * 24 * 3600)
+            print(f"[CacheWarmer] Warmed {run['warmed']} answers for corpus version {version} "
+                  f"in {run['finished'] - run['started']:.0f} s")
+            return run
+
+    def wake(self) -> None:
+        """Check the corpus version now instead of at the next interval."""
+        self._wake.set()
+
+    def run_forever(self, check_seconds: float) -> None:
+        while True:
+            try:
+                self.warm_if_changed()
+            except Exception as e:
+                print(f"[CacheWarmer] Error: {e}")
+            self._wake.wait(check_seconds)
+            self._wake.clear()
+
+    def start(self, check_seconds: float) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.run_forever, args=(check_seconds,), name="cache-warmer", daemon=True
+        )
+        thread.start()
+        return thread
+
+
+# ---- Command line ----
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect question counts and warm the answer cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    top = commands.add_parser("top", help="show the most frequently asked questions")
+    top.add_argument("--limit", type=int, default=20)
+
+    run = commands.add_parser("run", help="answer the most popular questions now")
+    run.add_argument("--top", type=int, default=None, help="how many (default: CACHE_WARM_TOP_N or 20)")
+    args = parser.parse_args()
+
+    import policy_engine
+
+    if args.command == "top":
+        for query in policy_engine.get_query_stats().top(args.limit):
+            names = " vs ".join(query.jurisdictions) or "Canada-wide"
+            print(f"{query.count:>6}  {query.mode:<8} {names:<40} {query.question}")
+    else:
+        warmer = policy_engine.get_cache_warmer()
+        if args.top:
+            warmer.top_n = args.top
+        report = warmer.warm()
+        print(f"Warmed {report['warmed']} answers ({report['failed']} failed) "
+              f"for corpus version {report['version']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# cancellation.py
+#
+# Cancellable answer jobs. An answer runs in a background thread under a
+# CancelToken; the engine checks the token while it waits (for a corpus, a
+# rate-limit slot, another caller's identical request) and closes the model
+# stream when the token is cancelled, so superseded or overdue answers stop
+# using worker time and rate-limit budget. Shared work that others can reuse
+# (corpus builds) is not cancelled - the job just stops waiting for it.
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+
+class AnswerCancelled(Exception):
+    """The answer was cancelled (superseded, abandoned, or out of time)."""
+
+
+class DeadlineExceeded(AnswerCancelled):
+    """The answer ran past its deadline."""
+
+
+class CancelToken:
+    """
+    Cancellation flag with an optional deadline.
+
+    - `check()` raises AnswerCancelled / DeadlineExceeded once cancelled.
+    - Callbacks registered with `on_cancel()` run when it is cancelled
+      (including when the deadline passes), e.g. to close a network stream.
+    - `close()` releases the deadline timer once the work is finished.
+    """
+
+    def __init__(self, deadline_seconds: float | None = None):
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[], None]] = []
+        self.reason: str | None = None
+        self.deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+        self._timer = None
+        if deadline_seconds:
+            self._timer = threading.Timer(deadline_seconds, self.cancel, args=("deadline",))
+            self._timer.daemon = True
+            self._timer.start()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None or self.remaining() == 0
+
+    def remaining(self) -> float | None:
+        """Seconds left before the deadline (None without one)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[CancelToken] cancel callback failed: {e}")
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Run `callback` when the token is cancelled (right away if it already is)."""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self) -> None:
+        if not self.cancelled:
+            return
+        if self.reason in (None, "deadline"):
+            raise DeadlineExceeded("The answer ran past its deadline.")
+        raise AnswerCancelled(f"The answer was cancelled ({self.reason}).")
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            self._callbacks = []
+
+
+# ---- Current token ----
+# The token of the job running in this thread, so the engine can check it
+# without threading it through every function signature.
+_local = threading.local()
+
+
+def current_token() -> CancelToken | None:
+    return getattr(_local, "token", None)
+
+
+def check_cancelled() -> None:
+    """Raise if the current thread's answer has been cancelled."""
+    token = current_token()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def cancel_scope(token: CancelToken | None):
+    """Make `token` the current thread's token for the `with` block."""
+    previous = current_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+class AnswerJob:
+    """
+    Runs `fn(*args, on_delta=..., **kwargs)` in a background thread under its
+    own CancelToken, collecting the streamed text so the caller can poll it.
+    """
+
+    def __init__(self, fn: Callable[..., str], *args, deadline_seconds: float | None = None, **kwargs):
+        self.token = CancelToken(deadline_seconds)
+        self.answer: str | None = None
+        self.error: BaseException | None = None
+        self._parts: list[str] = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(fn, args, kwargs), name="answer-job", daemon=True
+        )
+        self._thread.start()
+
+    def _on_delta(self, text: str) -> None:
+        with self._lock:
+            self._parts.append(text)
+
+    def _run(self, fn, args, kwargs) -> None:
+        try:
+            with cancel_scope(self.token):
+                self.answer = fn(*args, on_delta=self._on_delta, **kwargs)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.token.close()
+            self._done.set()
+
+    def text(self) -> str:
+        """The reply streamed so far."""
+        with self._lock:
+            return "".join(self._parts)
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait up to `timeout` seconds; True once the job has finished."""
+        return self._done.wait(timeout)
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        self.token.cancel(reason)
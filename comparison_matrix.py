@@ -0,0 +1,187 @@
+# comparison_matrix.py
+#
+# Batch job that builds the pairwise comparison matrix for one question,
+# across all jurisdictions or a chosen subset. Pairs run in parallel under
+# the engine's shared rate limiter; each jurisdiction's excerpts are prepared
+# once and reused for every pair it appears in. Results are saved after every
+# pair, so an interrupted run picks up where it left off:
+#
+#     python comparison_matrix.py --output comparison_matrix.json
+#     python comparison_matrix.py --jurisdictions Federal,Ontario,Alberta \
+#         --question "How do their AI risk-management practices compare?"
+#
+# The Streamlit app shows results from COMPARISON_MATRIX_PATH (default:
+# comparison_matrix.json) in "Compare two governments" mode. Each result
+# records the version of the two corpora it was generated from; once either
+# corpus is refreshed with changed sources, the result is no longer shown
+# and the next run of this job regenerates it.
+
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+MATRIX_FORMAT_VERSION = 1
+DEFAULT_MATRIX_PATH = os.environ.get("COMPARISON_MATRIX_PATH", "comparison_matrix.json")
+
+
+def pair_key(j1: str, j2: str) -> str:
+    return f"{j1}|{j2}"
+
+
+def load_comparison_matrix(path: str = DEFAULT_MATRIX_PATH) -> dict | None:
+    """Read a matrix file written by this job, or None if there isn't one."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            matrix = json.load(f)
+    except FileNotFoundError:
+        return None
+    if matrix.get("version") != MATRIX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported comparison matrix version in {path}: {matrix.get('version')!r}")
+    return matrix
+
+
+def find_comparison(
+    matrix: dict | None,
+    j1: str,
+    j2: str,
+    question: str | None,
+    corpus_version: str | None,
+) -> dict | None:
+    """
+    The stored result for a pair (in either order), if it was built for
+    `question` from the corpora at `corpus_version` (see
+    policy_engine.corpus_version; None - corpora not loaded - never matches).
+    """
+    if not matrix or matrix.get("question") != question or corpus_version is None:
+        return None
+    results = matrix.get("results", {})
+    result = results.get(pair_key(j1, j2)) or results.get(pair_key(j2, j1))
+    if result is None or result.get("corpus_version") != corpus_version:
+        return None
+    return result
+
+
+def _write_atomically(path: str, matrix: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(matrix, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_comparison_matrix(
+    jurisdictions: list[str],
+    question: str | None,
+    output: str,
+    workers: int = 4,
+) -> dict:
+    """
+    Compare every pair of `jurisdictions` and save the results to `output`.
+
+    Pairs already present in `output` for the same question and the current
+    corpora are skipped; pairs whose corpora have changed since are compared
+    again. Failed pairs are reported and left out, so a later run retries
+    them.
+    """
+    import policy_engine
+
+    matrix = load_comparison_matrix(output)
+    if matrix is not None and matrix.get("question") != question:
+        raise ValueError(
+            f"{output} was built for a different question; choose another --output file."
+        )
+    if matrix is None:
+        matrix = {
+            "version": MATRIX_FORMAT_VERSION,
+            "question": question,
+            "results": {},
+        }
+
+    # Every corpus is needed to tell which stored results are still current
+    # (corpus builds run in parallel)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(policy_engine.load_jurisdiction_corpus, jurisdictions))
+    versions = {
+        (j1, j2): policy_engine.corpus_version([j1, j2])
+        for j1, j2 in itertools.combinations(jurisdictions, 2)
+    }
+    pairs = [
+        (j1, j2)
+        for (j1, j2), version in versions.items()
+        if find_comparison(matrix, j1, j2, question, version) is None
+    ]
+    print(f"{len(pairs)} of {len(versions)} pairs left to compare")
+    if not pairs:
+        return matrix
+
+    # Prepare each jurisdiction's excerpts once
+    needed = sorted({j for pair in pairs for j in pair}, key=jurisdictions.index)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        contexts = dict(zip(needed, pool.map(policy_engine.prepare_compare_context, needed)))
+
+    lock = threading.Lock()
+
+    def run_pair(j1: str, j2: str) -> str:
+        return policy_engine.compare_jurisdictions(j1, j2, question, contexts=contexts)
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_pair, j1, j2): (j1, j2) for j1, j2 in pairs}
+        for future in as_completed(futures):
+            j1, j2 = futures[future]
+            try:
+                answer = future.result()
+            except Exception as e:
+                print(f"  !! {j1} vs {j2} failed: {e}")
+                continue
+            with lock:
+                matrix["results"][pair_key(j1, j2)] = {
+                    "jurisdiction_1": j1,
+                    "jurisdiction_2": j2,
+                    "answer": answer,
+                    "corpus_version": versions[(j1, j2)],
+                    "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                _write_atomically(output, matrix)
+            done += 1
+            print(f"  [{done}/{len(pairs)}] {j1} vs {j2}")
+
+    return matrix
+
+
+def main() -> None:
+    import policy_engine
+
+    parser = argparse.ArgumentParser(description="Build the pairwise jurisdiction comparison matrix.")
+    parser.add_argument(
+        "--question",
+        default=None,
+        help="comparison question (default: each pair's standard 'how do they differ' question)",
+    )
+    parser.add_argument(
+        "--jurisdictions",
+        default=None,
+        help="comma-separated subset of jurisdictions (default: all)",
+    )
+    parser.add_argument("--output", default=DEFAULT_MATRIX_PATH, help="matrix JSON file to write")
+    parser.add_argument("--workers", type=int, default=4, help="pairs to run in parallel")
+    args = parser.parse_args()
+
+    if args.jurisdictions:
+        jurisdictions = []
+        for name in args.jurisdictions.split(","):
+            canonical = policy_engine.NORM_KEYS.get(name.strip().lower())
+            if canonical is None:
+                parser.error(f"Unknown jurisdiction: {name.strip()!r}")
+            jurisdictions.append(canonical)
+    else:
+        jurisdictions = list(policy_engine.JURISDICTION_SOURCES)
+
+    build_comparison_matrix(jurisdictions, args.question, args.output, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# compression.py
+#
+# Local extractive compression of corpus excerpts before they go into a
+# prompt. Sentences are scored with TF-IDF (computed over the excerpt
+# itself, no network, no model) by how central they are to the excerpt and
+# how well they match the focus terms; the lowest-scoring ones - navigation
+# leftovers, repeated headings, news-release boilerplate - are dropped until
+# the target size is reached. Kept sentences stay in their original order,
+# and "[Section · pp. 3–4]" provenance lines stay with their passages.
+
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+# Vocabulary that marks a sentence as being about public-sector AI policy;
+# used (with the jurisdiction name) as focus terms when the question isn't.
+POLICY_TERMS = (
+    "artificial intelligence ai generative automated decision algorithm algorithmic model "
+    "policy directive guideline guidance framework strategy standard principle "
+    "risk assessment impact privacy personal information security transparency "
+    "accountability fairness bias oversight disclosure procurement responsible ethics"
+)
+
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can could did do does for from had has have how if in "
+    "into is it its may more most must not of on or our should such than that the their them "
+    "then there these they this those through to under up us was we were what when where "
+    "which while who why will with would you your also any all each other only over own same "
+    "so some very about after again against before between both during further here just".split()
+)
+
+_WORD = re.compile(r"[a-z0-9]+(?:['’][a-z]+)?")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"“(\[]?[A-Z0-9])")
+_MARKER_LINE = re.compile(r"^\[[^\]]+\]$")
+_HEADING_LINE = re.compile(r"^#{1,6}\s")
+
+# Sentences shorter than this many content words carry little information
+# on their own ("Home", "Share this page", "Contact us").
+MIN_CONTENT_WORDS = 4
+
+
+def _terms(text: str) -> list[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS and len(w) > 1]
+
+
+def _split_units(text: str) -> list[tuple[str, list[str]]]:
+    """
+    Split text into lines, each either a provenance marker, heading or
+    blank line (no sentences) or a list of sentences.
+    """
+    units = []
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if not stripped or _MARKER_LINE.match(stripped) or _HEADING_LINE.match(stripped):
+            units.append((line, []))
+        else:
+            units.append((line, [s for s in _SENTENCE_END.split(stripped) if s]))
+    return units
+
+
+def _score_sentences(sentences: list[str], focus: str, focus_weight: float) -> list[float]:
+    """
+    TF-IDF score of each sentence: cosine similarity to the excerpt's
+    centroid (centrality) blended with similarity to the focus terms.
+    Exact repeats and very short sentences score zero.
+    """
+    term_lists = [_terms(s) for s in sentences]
+    doc_freq = Counter(t for terms in term_lists for t in set(terms))
+    n = len(sentences)
+    idf = {t: math.log((1 + n) / (1 + df)) + 1 for t, df in doc_freq.items()}
+
+    vectors = []
+    centroid: Counter = Counter()
+    for terms in term_lists:
+        counts = Counter(terms)
+        vector = {t: (1 + math.log(c)) * idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        vector = {t: v / norm for t, v in vector.items()}
+        vectors.append(vector)
+        centroid.update(vector)
+    centroid_norm = math.sqrt(sum(v * v for v in centroid.values())) or 1.0
+
+    focus_counts = Counter(_terms(focus))
+    focus_vector = {t: idf.get(t, 1.0) for t in focus_counts}
+    focus_norm = math.sqrt(sum(v * v for v in focus_vector.values())) or 1.0
+
+    seen: set[tuple[str, ...]] = set()
+    scores = []
+    for terms, vector in zip(term_lists, vectors):
+        key = tuple(terms)
+        if len(terms) < MIN_CONTENT_WORDS or key in seen:
+            scores.append(0.0)
+            continue
+        seen.add(key)
+        centrality = sum(v * centroid[t] for t, v in vector.items()) / centroid_norm
+        relevance = sum(v * focus_vector.get(t, 0.0) for t, v in vector.items()) / focus_norm
+        scores.append((1 - focus_weight) * centrality + focus_weight * relevance)
+    return scores
+
+
+@lru_cache(maxsize=128)
+def compress_context(text: str, focus: str, max_chars: int, focus_weight: float = 0.5) -> str:
+    """
+    Extract the most informative sentences of `text`, in their original
+    order, keeping at most `max_chars` characters (headings and provenance
+    lines included).
+
+    - `focus` is the question and/or jurisdiction and policy terms that
+      sentences are scored against (see POLICY_TERMS).
+    - Text already within `max_chars` is returned unchanged.
+    - Results are memoized, so repeat calls with the same excerpt are free.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    units = _split_units(text)
+    sentences = [s for _, unit in units for s in unit]
+    if not sentences:
+        return text[:max_chars]
+    scores = _score_sentences(sentences, focus, focus_weight)
+
+    # The heading and provenance line each sentence would bring along
+    extras: list[tuple[int | None, int | None]] = []
+    heading = marker = None
+    for n, (line, unit) in enumerate(units):
+        if not unit:
+            if _HEADING_LINE.match(line.strip()):
+                heading, marker = n, None
+            elif line.strip():
+                marker = n
+            continue
+        extras += [(heading, marker)] * len(unit)
+        marker = None
+
+    # Pick sentences best-first until the budget is used, charging each
+    # heading and provenance line the first time a sentence needs it
+    ranked = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)
+    keep: set[int] = set()
+    charged: set[int] = set()
+    used = 0
+    for i in ranked:
+        if scores[i] <= 0:
+            break
+        needed = [n for n in extras[i] if n is not None and n not in charged]
+        cost = len(sentences[i]) + 1 + sum(len(units[n][0]) + 1 for n in needed)
+        if used + cost > max_chars:
+            continue
+        keep.add(i)
+        charged.update(needed)
+        used += cost
+    if not keep:
+        return text[:max_chars]
+
+    # Blank lines between passages aren't charged; drop the weakest
+    # sentences if they tip the result over the budget
+    result = _rebuild(units, keep)
+    while len(result) > max_chars and len(keep) > 1:
+        keep.remove(min(keep, key=lambda i: scores[i]))
+        result = _rebuild(units, keep)
+    return result[:max_chars]
+
+
+def _rebuild(units: list[tuple[str, list[str]]], keep: set[int]) -> str:
+    """
+    The kept sentences in document order. A provenance line is kept only if
+    its passage is; a "### Jurisdiction" heading if anything under it is.
+    """
+    out: list[str] = []
+    pending_heading: str | None = None
+    pending_marker: str | None = None
+    index = 0
+    for line, unit in units:
+        if not unit:
+            if _HEADING_LINE.match(line.strip()):
+                pending_heading, pending_marker = line, None
+            elif line.strip():
+                pending_marker = line
+            elif out and out[-1] != "":
+                out.append("")
+            continue
+        kept = [s for j, s in enumerate(unit, start=index) if j in keep]
+        index += len(unit)
+        if kept:
+            if pending_heading is not None:
+                out.append(pending_heading)
+                pending_heading = None
+            if pending_marker is not None:
+                out.append(pending_marker)
+            out.append(" ".join(kept))
+        pending_marker = None
+    return "\n".join(out).strip()
+
+
+def policy_focus(jurisdictions: list[str], question: str | None = None) -> str:
+    """Focus terms for scoring: the jurisdiction names, policy vocabulary and (optionally) the question."""
+    return " ".join([*jurisdictions, POLICY_TERMS, question or ""])
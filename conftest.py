@@ -0,0 +1,4 @@
+# conftest.py
+#
+# Lets the tests in tests/ import the top-level modules (pytest puts this
+# directory on sys.path because this file is here).
@@ -0,0 +1,491 @@
+# corpus_store.py
+#
+# Compact in-process storage for jurisdiction corpora. Each source's text is
+# zlib-compressed and stored once per unique content hash; a jurisdiction is
+# just an ordered list of references to those blobs. Callers read the
+# pieces they need (a prefix, a slice, individual passages) without ever
+# building the full joined corpus string.
+
+import codecs
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterator
+
+# Same separator the corpus builder has always used between sources
+SOURCE_SEPARATOR = "\n\n"
+
+# Page furniture whose numbers change from page to page ("Date modified:
+# 2025-03-04", "Page 3 of 12"); numbers are ignored when comparing these.
+# Matched against the normalized key (lower case, punctuation as spaces).
+_BOILERPLATE = re.compile(
+    r"^(?:date modified|last (?:updated|modified|reviewed)|updated on|published on|page \d+(?: of \d+)?$)"
+)
+# Normalized keys shorter than this ("•", "Yes") are never treated as duplicates.
+MIN_DEDUP_KEY_CHARS = 4
+
+_NON_WORD = re.compile(r"[\W_]+")
+_DIGITS = re.compile(r"\d+")
+
+
+@dataclass(frozen=True)
+class Passage:
+    """
+    A paragraph- or section-sized piece of a source's text.
+
+    PDF passages also carry the section heading they fall under and the
+    pages they span, so answers can cite them.
+    """
+    url: str
+    text: str
+    section: str | None = None
+    page_start: int | None = None
+    page_end: int | None = None
+
+
+@dataclass(frozen=True)
+class SourceRecord:
+    """
+    One source in a jurisdiction's corpus: where it came from and which blob
+    holds its text. `spans` are the passage boundaries within that text as
+    (start, end, section, page_start, page_end); empty for sources stored as
+    plain text, whose passages are simply their lines.
+    """
+    url: str
+    digest: str
+    length: int
+    spans: tuple = ()
+
+
+def passage_label(passage: Passage) -> str | None:
+    """Provenance line such as "[Scope · pp. 3–4]" for passages with page numbers."""
+    if passage.page_start is None:
+        return None
+    if passage.page_end in (None, passage.page_start):
+        pages = f"p. {passage.page_start}"
+    else:
+        pages = f"pp. {passage.page_start}–{passage.page_end}"
+    return f"[{passage.section} · {pages}]" if passage.section else f"[{pages}]"
+
+
+def render_passages(passages: list[Passage]) -> tuple[str, tuple]:
+    """
+    Join passages into one source text (provenance line, then body) and
+    return it with the (start, end, section, page_start, page_end) span of
+    each passage body.
+    """
+    parts: list[str] = []
+    spans = []
+    pos = 0
+    for passage in passages:
+        prefix = _passage_prefix(passage, first=not parts)
+        parts.append(prefix + passage.text)
+        pos += len(prefix)
+        spans.append((pos, pos + len(passage.text), passage.section, passage.page_start, passage.page_end))
+        pos += len(passage.text)
+    return "".join(parts), tuple(spans)
+
+
+def _passage_prefix(passage: Passage, first: bool) -> str:
+    """Line break before every passage but the first, then its provenance line (if any)."""
+    label = passage_label(passage)
+    return ("" if first else "\n") + (label + "\n" if label else "")
+
+
+# ---- Streaming source writer ----
+@dataclass(frozen=True)
+class CompressedSource:
+    """One source's rendered text, compressed, with its passage spans."""
+    url: str
+    blob: bytes
+    digest: str
+    length: int
+    spans: tuple
+
+    def iter_passages(self) -> Iterator[Passage]:
+        return _iter_blob_passages(self.url, self.blob, self.spans)
+
+
+class SourceWriter:
+    """
+    Renders and compresses a source's passages as they arrive, so the full
+    text of a document is never held in memory at once.
+    """
+
+    def __init__(self, url: str, compression_level: int = 6):
+        self.url = url
+        self._compressor = zlib.compressobj(compression_level)
+        self._hash = hashlib.sha256()
+        self._chunks: list[bytes] = []
+        self._spans: list[tuple] = []
+        self._pos = 0
+        self._has_provenance = False
+
+    def add(self, passage: Passage) -> None:
+        prefix = _passage_prefix(passage, first=not self._spans)
+        start = self._pos + len(prefix)
+        end = start + len(passage.text)
+        self._spans.append((start, end, passage.section, passage.page_start, passage.page_end))
+        self._has_provenance = self._has_provenance or bool(passage.section or passage.page_start)
+        self._pos = end
+
+        data = (prefix + passage.text).encode("utf-8")
+        self._hash.update(data)
+        self._chunks.append(self._compressor.compress(data))
+
+    def finish(self) -> CompressedSource:
+        self._chunks.append(self._compressor.flush())
+        return CompressedSource(
+            url=self.url,
+            blob=b"".join(self._chunks),
+            digest=self._hash.hexdigest(),
+            length=self._pos,
+            # Plain paragraphs (HTML) need no spans: their passages are their lines
+            spans=tuple(self._spans) if self._has_provenance else (),
+        )
+
+
+def _iter_blob_passages(url: str, blob: bytes, spans: tuple, chunk_size: int = 64 * 1024) -> Iterator[Passage]:
+    """Yield a compressed source's passages while decompressing it piece by piece."""
+    decompressor = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def text_chunks() -> Iterator[str]:
+        for i in range(0, len(blob), chunk_size):
+            yield decoder.decode(decompressor.decompress(blob[i:i + chunk_size]))
+        yield decoder.decode(decompressor.flush(), final=True)
+
+    buffer = ""
+    if spans:
+        base = 0  # offset of buffer[0] within the source text
+        remaining = iter(spans)
+        span = next(remaining, None)
+        for chunk in text_chunks():
+            buffer += chunk
+            while span is not None and span[1] - base <= len(buffer):
+                start, end, section, page_start, page_end = span
+                yield Passage(url, buffer[start - base:end - base], section, page_start, page_end)
+                buffer = buffer[end - base:]
+                base = end
+                span = next(remaining, None)
+        return
+
+    for chunk in text_chunks():
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield Passage(url=url, text=line)
+    if buffer.strip():
+        yield Passage(url=url, text=buffer)
+
+
+# ---- Paragraph-level deduplication ----
+def _paragraph_key(paragraph: str) -> str:
+    """
+    Case-, punctuation- and whitespace-insensitive key for comparing
+    paragraphs. Numbers count, except in known boilerplate lines.
+    """
+    key = _NON_WORD.sub(" ", paragraph.casefold()).strip()
+    if _BOILERPLATE.match(key):
+        key = _DIGITS.sub("#", key)
+    return key
+
+
+class ParagraphDeduplicator:
+    """
+    Drops paragraphs that have already been seen while a corpus is assembled.
+
+    Use one instance per jurisdiction build and pass each source's passages
+    (HTML <p>/<li> blocks, PDF passages) through `filter()` in order:
+    repeated cookie banners, "Date modified" lines and shared intro
+    paragraphs are kept only the first time. Whole passages are compared,
+    never the lines inside them - in PDF text those are just where the
+    layout wrapped, and dropping one would cut a sentence in half.
+    """
+
+    def __init__(self):
+        self._seen: set[bytes] = set()
+        self.kept = 0
+        self.dropped = 0
+        self.dropped_chars = 0
+
+    def filter(self, text: str) -> str:
+        """`text` (stripped), or "" if the same paragraph has been seen before."""
+        text = text.strip()
+        key = _paragraph_key(text)
+        if len(key) >= MIN_DEDUP_KEY_CHARS:
+            digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+            if digest in self._seen:
+                self.dropped += 1
+                self.dropped_chars += len(text) + 1
+                return ""
+            self._seen.add(digest)
+        self.kept += 1
+        return text
+
+
+def _joined_length(records: list[SourceRecord]) -> int:
+    if not records:
+        return 0
+    return sum(r.length for r in records) + len(SOURCE_SEPARATOR) * (len(records) - 1)
+
+
+def _manifest_version(manifest: bytes) -> str:
+    return hashlib.sha256(manifest).hexdigest()[:16]
+
+
+class CorpusStore:
+    """
+    Deduplicated, compressed corpus storage shared by all sessions.
+
+    - `put()` records the sources for a jurisdiction (identical texts are
+      stored once, even across jurisdictions).
+    - `head()`, `slice()` and `iter_passages()` decompress only the sources
+      they touch.
+    - `text()` still returns the full joined corpus for callers that really
+      need it.
+    - With a shared `backend` (see cache_backend.py), corpora written by one
+      process are picked up by the others instead of being fetched again.
+      Each corpus's version in the backend is checked at most every
+      `sync_seconds` when it is read, and a corpus another process has
+      replaced (e.g. refreshed) is reloaded.
+    - With a `snapshot` (see snapshot.py), jurisdictions not otherwise loaded
+      are read from the memory-mapped snapshot file; its compressed texts
+      are decompressed on demand and never copied into this store.
+    """
+
+    def __init__(self, compression_level: int = 6, backend=None, snapshot=None, sync_seconds: float = 30):
+        self.compression_level = compression_level
+        self.backend = backend
+        self.snapshot = snapshot
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._blobs: dict[str, bytes] = {}
+        self._sources: dict[str, list[SourceRecord]] = {}
+        # Backend manifest version of each corpus held here, and when it was last checked
+        self._versions: dict[str, str] = {}
+        self._synced: dict[str, float] = {}
+
+    # ---- Writing ----
+    def put(
+        self,
+        jurisdiction: str,
+        sources: list[tuple[str, "str | list[Passage] | CompressedSource"]],
+    ) -> list[SourceRecord]:
+        """
+        Store `(url, text)`, `(url, passages)` or `(url, CompressedSource)`
+        pairs as the corpus for `jurisdiction`, replacing any previous one.
+        """
+        compressed = []
+        for url, content in sources:
+            if isinstance(content, str):
+                data = content.encode("utf-8")
+                content = CompressedSource(
+                    url=url,
+                    blob=zlib.compress(data, self.compression_level),
+                    digest=hashlib.sha256(data).hexdigest(),
+                    length=len(content),
+                    spans=(),
+                )
+            elif not isinstance(content, CompressedSource):
+                writer = SourceWriter(url, self.compression_level)
+                for passage in content:
+                    writer.add(passage)
+                content = writer.finish()
+            compressed.append((url, content))
+
+        records = []
+        with self._lock:
+            for url, source in compressed:
+                if source.digest not in self._blobs:
+                    self._blobs[source.digest] = source.blob
+                    if self.backend is not None:
+                        self.backend.set(f"corpus:blob:{source.digest}", source.blob)
+                records.append(
+                    SourceRecord(url=url, digest=source.digest, length=source.length, spans=source.spans)
+                )
+            self._sources[jurisdiction] = records
+            self._drop_unreferenced_blobs()
+        if self.backend is not None:
+            manifest = json.dumps([[r.url, r.digest, r.length, r.spans] for r in records]).encode("utf-8")
+            version = _manifest_version(manifest)
+            self.backend.set(f"corpus:manifest:{jurisdiction}", manifest)
+            self.backend.set(f"corpus:version:{jurisdiction}", version.encode("ascii"))
+            with self._lock:
+                self._versions[jurisdiction] = version
+                self._synced[jurisdiction] = time.monotonic()
+        return records
+
+    def _drop_unreferenced_blobs(self) -> None:
+        referenced = {r.digest for records in self._sources.values() for r in records}
+        for digest in list(self._blobs):
+            if digest not in referenced:
+                del self._blobs[digest]
+
+    # ---- Reading ----
+    def _records(self, jurisdiction: str) -> list[SourceRecord]:
+        """Records for `jurisdiction`, loading its manifest from the backend if needed."""
+        records = self._sources.get(jurisdiction)
+        if records is not None and self.backend is not None and self._stale(jurisdiction):
+            records = None
+        if records is None and self.backend is not None:
+            raw = self.backend.get(f"corpus:manifest:{jurisdiction}")
+            if raw is not None:
+                records = [
+                    SourceRecord(url, digest, length, tuple(tuple(span) for span in spans))
+                    for url, digest, length, spans in json.loads(raw)
+                ]
+                with self._lock:
+                    self._sources[jurisdiction] = records
+                    self._versions[jurisdiction] = _manifest_version(raw)
+                    self._synced[jurisdiction] = time.monotonic()
+                    self._drop_unreferenced_blobs()
+        if records is None and self.snapshot is not None:
+            records = self.snapshot.records(jurisdiction)
+            if records is not None:
+                with self._lock:
+                    self._sources[jurisdiction] = records
+                    # Not in the backend: replaced once another process stores it there
+                    self._versions[jurisdiction] = ""
+                    self._synced[jurisdiction] = time.monotonic()
+        return records or []
+
+    def _stale(self, jurisdiction: str) -> bool:
+        """True if another process has stored a different version of the corpus (checked every `sync_seconds`)."""
+        now = time.monotonic()
+        if now - self._synced.get(jurisdiction, 0.0) < self.sync_seconds:
+            return False
+        self._synced[jurisdiction] = now
+        raw = self.backend.get(f"corpus:version:{jurisdiction}")
+        return raw is not None and raw.decode("ascii") != self._versions.get(jurisdiction)
+
+    def _blob(self, digest: str) -> bytes:
+        blob = self._blobs.get(digest)
+        if blob is None and self.backend is not None:
+            blob = self.backend.get(f"corpus:blob:{digest}")
+            if blob is not None:
+                self._blobs[digest] = blob
+        if blob is None and self.snapshot is not None:
+            # A view into the mapped file, shared with other processes
+            blob = self.snapshot.blob(digest)
+        if blob is None:
+            raise KeyError(f"Missing corpus blob {digest}")
+        return blob
+
+    def compressed_blob(self, record: SourceRecord) -> bytes:
+        """The compressed text of one source, as stored."""
+        return self._blob(record.digest)
+
+    def reload(self, jurisdiction: str) -> None:
+        """Forget this process's copy of a corpus, so the next read picks up the shared one."""
+        with self._lock:
+            self._sources.pop(jurisdiction, None)
+            self._versions.pop(jurisdiction, None)
+            self._drop_unreferenced_blobs()
+
+    def has(self, jurisdiction: str) -> bool:
+        self._records(jurisdiction)
+        return jurisdiction in self._sources
+
+    def sources(self, jurisdiction: str) -> list[SourceRecord]:
+        return list(self._records(jurisdiction))
+
+    def find_source(self, url: str) -> CompressedSource | None:
+        """The stored copy of `url` in any corpus held by this process, or None."""
+        with self._lock:
+            records = [r for rs in self._sources.values() for r in rs if r.url == url]
+        if not records:
+            return None
+        record = records[0]
+        return CompressedSource(url, bytes(self._blob(record.digest)), record.digest, record.length, record.spans)
+
+    def source_text(self, record: SourceRecord) -> str:
+        return zlib.decompress(self._blob(record.digest)).decode("utf-8")
+
+    def length(self, jurisdiction: str) -> int:
+        """Length of the joined corpus, as `len(text(jurisdiction))` would report."""
+        return _joined_length(self._records(jurisdiction))
+
+    def slice(self, jurisdiction: str, start: int, end: int) -> str:
+        """Equivalent to `text(jurisdiction)[start:end]` for non-negative bounds."""
+        out: list[str] = []
+        pos = 0
+        for i, record in enumerate(self._records(jurisdiction)):
+            if pos >= end:
+                break
+            if i:
+                # Separator before every source except the first
+                sep_end = pos + len(SOURCE_SEPARATOR)
+                if sep_end > start:
+                    out.append(SOURCE_SEPARATOR[max(0, start - pos):end - pos])
+                pos = sep_end
+            rec_end = pos + record.length
+            if rec_end > start and pos < end:
+                text = self.source_text(record)
+                out.append(text[max(0, start - pos):end - pos])
+            pos = rec_end
+        return "".join(out)
+
+    def head_sources(self, jurisdiction: str, max_chars: int) -> list[SourceRecord]:
+        """The sources that `head(jurisdiction, max_chars)` draws text from."""
+        used = []
+        pos = 0
+        for record in self._records(jurisdiction):
+            if pos >= max_chars:
+                break
+            used.append(record)
+            pos += record.length + len(SOURCE_SEPARATOR)
+        return used
+
+    def head(self, jurisdiction: str, max_chars: int) -> str:
+        """The first `max_chars` characters of the joined corpus."""
+        return self.slice(jurisdiction, 0, max_chars)
+
+    def text(self, jurisdiction: str) -> str:
+        """The full joined corpus (builds a new string; prefer head/slice/iter_passages)."""
+        return SOURCE_SEPARATOR.join(
+            self.source_text(r) for r in self._records(jurisdiction)
+        )
+
+    def iter_passages(self, jurisdiction: str) -> Iterator[Passage]:
+        """
+        Yield passages source by source: the stored passages (with section
+        and pages) where known, otherwise each non-empty line.
+        """
+        for record in self._records(jurisdiction):
+            yield from _iter_blob_passages(record.url, self._blob(record.digest), record.spans)
+
+    # ---- Reporting ----
+    def memory_report(self) -> dict[str, dict[str, int]]:
+        """
+        Per-jurisdiction sizes:
+        - `chars`: length of the joined corpus
+        - `compressed_bytes`: compressed size of its sources
+        - `unique_bytes`: compressed bytes not shared with any other jurisdiction
+        """
+        # Work from a copy: reading blobs may go to the backend, and nothing
+        # here may re-enter _records() (which takes the lock to sync)
+        with self._lock:
+            sources = dict(self._sources)
+
+        owners: dict[str, set[str]] = {}
+        for jurisdiction, records in sources.items():
+            for r in records:
+                owners.setdefault(r.digest, set()).add(jurisdiction)
+
+        report = {}
+        for jurisdiction, records in sources.items():
+            digests = {r.digest for r in records}
+            report[jurisdiction] = {
+                "chars": _joined_length(records),
+                "compressed_bytes": sum(len(self._blob(d)) for d in digests),
+                "unique_bytes": sum(
+                    len(self._blob(d)) for d in digests if owners[d] == {jurisdiction}
+                ),
+            }
+        return report
@@ -0,0 +1,594 @@
+# load_test.py
+#
+# Load-test harness for sizing a deployment. Simulated users call the three
+# answer functions (directly, or through the HTTP API) with a mix of
+# jurisdictions and questions at a set concurrency. Sources are served from
+# recorded fixtures and the model from a local stub server, so a run costs
+# nothing and is repeatable:
+#
+#     python load_test.py record --fixtures loadtest_fixtures
+#     python load_test.py run --fixtures loadtest_fixtures --users 20 --requests 400
+#     python load_test.py run --target api --users 50 --duration 60 --stream
+#
+# Sources without a recording are replaced by a synthetic page. The report
+# gives throughput, p50/p95/p99 latency per mode, answer-cache hit rate and
+# how many source fetches and model calls actually happened. The engine's
+# client-side rate limiter still applies, so set OPENAI_RPM / OPENAI_TPM to
+# your real account limits (or very high, to find the other bottlenecks).
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_QUESTIONS = [
+    "What are the main requirements for using generative AI in government?",
+    "How does this government assess the risks of automated decision systems?",
+    "What transparency obligations apply to AI used in public services?",
+    "How are privacy and personal information protected when AI is used?",
+    "Who is accountable for AI systems used by departments?",
+    "What training or guidance is provided to public servants on AI?",
+]
+
+SYNTHETIC_PARAGRAPHS = [
+    "Departments must assess the impact of automated decision systems before deployment.",
+    "Public servants should not enter sensitive or personal information into public AI tools.",
+    "Outputs produced with generative AI must be reviewed by a person before they are used.",
+    "Institutions are expected to be transparent about when and how AI is used in services.",
+    "Risks to privacy, security and fairness must be documented and mitigated.",
+    "Accountability for decisions remains with the institution, not the AI system.",
+    "Staff are encouraged to complete training on the responsible use of AI tools.",
+    "Procurement of AI systems must follow existing policies on information management.",
+]
+
+
+# ---- Source fixtures ----
+def _fixture_name(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def record_fixtures(urls: list[str], directory: str) -> None:
+    """Download each URL once and save the response body and content type."""
+    import requests
+
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, "index.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+
+    for url in urls:
+        try:
+            resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
+        except Exception as e:
+            print(f"  !! {url}: {e}")
+            continue
+        if resp.status_code != 200:
+            print(f"  !! {url}: HTTP {resp.status_code}")
+            continue
+        name = _fixture_name(url)
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(resp.content)
+        index[url] = {"file": name, "content_type": resp.headers.get("Content-Type", "text/html")}
+        print(f"  recorded {url} ({len(resp.content)} bytes)")
+
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    print(f"{len(index)} fixtures in {directory}")
+
+
+def _synthetic_page(url: str, paragraphs: int) -> bytes:
+    rng = random.Random(url)
+    body = "\n".join(
+        f"<p>{rng.choice(SYNTHETIC_PARAGRAPHS)} (Section {i + 1}.)</p>" for i in range(paragraphs)
+    )
+    return f"<html><body><h1>{url}</h1>\n{body}\n</body></html>".encode("utf-8")
+
+
+class FixtureServer:
+    """
+    Serves every configured source from its recording (or a synthetic page)
+    at http://127.0.0.1:<port>/source/<n>, and counts the requests.
+    """
+
+    def __init__(self, urls: list[str], directory: str | None, synthetic_paragraphs: int = 200):
+        self.documents: dict[str, tuple[bytes, str]] = {}
+        self.local_urls: dict[str, str] = {}
+        self.recorded = 0
+        self.fetches = 0
+        self._lock = threading.Lock()
+
+        index = {}
+        if directory and os.path.exists(os.path.join(directory, "index.json")):
+            with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+                index = json.load(f)
+
+        for n, url in enumerate(urls):
+            entry = index.get(url)
+            if entry is not None:
+                with open(os.path.join(directory, entry["file"]), "rb") as f:
+                    document = (f.read(), entry["content_type"])
+                self.recorded += 1
+            else:
+                document = (_synthetic_page(url, synthetic_paragraphs), "text/html; charset=utf-8")
+            self.documents[f"/source/{n}"] = document
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                document = server.documents.get(self.path)
+                with server._lock:
+                    server.fetches += 1
+                if document is None:
+                    self.send_error(404)
+                    return
+                body, content_type = document
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        base = f"http://127.0.0.1:{self._httpd.server_port}"
+        for n, url in enumerate(urls):
+            self.local_urls[url] = f"{base}/source/{n}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+
+
+# ---- Stub model server ----
+class StubModelServer:
+    """
+    Minimal OpenAI-compatible /v1/chat/completions endpoint (plain and
+    streamed) that answers after a configurable delay, and counts calls.
+
+    It imitates provider-side prompt caching: the longest prompt prefix seen
+    before (in 128-token steps, from 1024 tokens) is reported as
+    `prompt_tokens_details.cached_tokens`.
+    """
+
+    CACHE_MIN_TOKENS = 1024
+    CACHE_STEP_TOKENS = 128
+
+    def __init__(self, first_token_seconds: float = 0.5, tokens_per_second: float = 80, completion_tokens: int = 300):
+        self.calls = 0
+        self.disconnects = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+        self._seen_prefixes: set[str] = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt = "".join(
+                    f"{m.get('role')}:{m.get('content') or ''}\n" for m in request.get("messages", [])
+                )
+                prompt_tokens = len(prompt) // 4
+                cached_tokens = server._cached_prefix_tokens(prompt)
+                with server._lock:
+                    server.calls += 1
+                    server.prompt_tokens += prompt_tokens
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                }
+                words = [f"word{i % 50}" for i in range(completion_tokens)]
+                base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": request.get("model")}
+
+                time.sleep(first_token_seconds)
+                if not request.get("stream"):
+                    time.sleep(completion_tokens / tokens_per_second)
+                    body = json.dumps({
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": " ".join(words)},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": usage,
+                    }).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send(payload: dict | str) -> None:
+                    data = payload if isinstance(payload, str) else json.dumps(payload)
+                    event = f"data: {data}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                    self.wfile.flush()
+
+                per_chunk = 10
+                try:
+                    for i in range(0, len(words), per_chunk):
+                        time.sleep(per_chunk / tokens_per_second)
+                        send({
+                            **base,
+                            "object": "chat.completion.chunk",
+                            "choices": [{
+                                "index": 0,
+                                "delta": {"content": " ".join(words[i:i + per_chunk]) + " "},
+                                "finish_reason": None,
+                            }],
+                        })
+                    send({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+                    send("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the answer mid-stream
+                    with server._lock:
+                        server.disconnects += 1
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_port}/v1"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def _cached_prefix_tokens(self, prompt: str) -> int:
+        """Tokens of the longest previously seen prefix; remembers this prompt's prefixes."""
+        step = self.CACHE_STEP_TOKENS * 4
+        ends = range(self.CACHE_MIN_TOKENS * 4, len(prompt) + 1, step)
+        digests = [hashlib.sha1(prompt[:end].encode("utf-8")).hexdigest() for end in ends]
+        with self._lock:
+            cached = 0
+            for end, digest in zip(ends, digests):
+                if digest not in self._seen_prefixes:
+                    break
+                cached = end // 4
+            self._seen_prefixes.update(digests)
+        return cached
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+
+
+# ---- Workload ----
+def parse_mix(spec: str) -> dict[str, float]:
+    """'single=6,compare=3,canada=1' -> relative weights per mode."""
+    mix = {}
+    for part in spec.split(","):
+        mode, _, weight = part.partition("=")
+        if mode.strip() not in ("single", "compare", "canada"):
+            raise ValueError(f"Unknown mode in --mix: {mode!r}")
+        mix[mode.strip()] = float(weight or 1)
+    return mix
+
+
+class EngineTarget:
+    """Calls the answer functions in this process."""
+
+    def __init__(self):
+        import policy_engine
+
+        self.engine = policy_engine
+
+    def call(self, mode: str, args: tuple, stream: bool) -> float | None:
+        """Run one request; returns seconds to the first streamed piece (if streaming)."""
+        fn = {
+            "single": self.engine.answer_ai_policy_question,
+            "compare": self.engine.compare_jurisdictions,
+            "canada": self.engine.answer_canada_wide,
+        }[mode]
+        if not stream:
+            fn(*args)
+            return None
+        started = time.perf_counter()
+        first: list[float] = []
+
+        def on_delta(text: str) -> None:
+            if not first:
+                first.append(time.perf_counter() - started)
+
+        fn(*args, on_delta=on_delta)
+        return first[0] if first else None
+
+
+class ApiTarget:
+    """Calls the HTTP API (api.py), served in this process on a free port."""
+
+    def __init__(self):
+        import httpx
+        import uvicorn
+
+        import api
+
+        config = uvicorn.Config(api.app, host="127.0.0.1", port=0, log_level="warning")
+        self._server = uvicorn.Server(config)
+        threading.Thread(target=self._server.run, daemon=True).start()
+        while not self._server.started:
+            time.sleep(0.05)
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.client = httpx.Client(timeout=600, limits=httpx.Limits(max_connections=1000))
+
+    def call(self, mode: str, args: tuple, stream: bool) -> float | None:
+        if mode == "single":
+            path, body = "/v1/answer", {"jurisdiction": args[0], "question": args[1]}
+        elif mode == "compare":
+            path, body = "/v1/compare", {"jurisdiction_1": args[0], "jurisdiction_2": args[1], "question": args[2]}
+        else:
+            path, body = "/v1/canada", {"question": args[0]}
+        body["stream"] = stream
+
+        started = time.perf_counter()
+        if not stream:
+            resp = self.client.post(self.base_url + path, json=body)
+            if resp.status_code != 200:
+                raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+            return None
+        first = None
+        with self.client.stream("POST", self.base_url + path, json=body) as resp:
+            if resp.status_code != 200:
+                raise RuntimeError(f"HTTP {resp.status_code}")
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if "error" in message:
+                    raise RuntimeError(message["error"])
+                if "delta" in message and first is None:
+                    first = time.perf_counter() - started
+        return first
+
+    def close(self) -> None:
+        self._server.should_exit = True
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return float("nan")
+    rank = max(1, round(pct / 100 * len(values) + 0.5 - 1e-9))
+    return values[min(rank, len(values)) - 1]
+
+
+def run_load(
+    target,
+    jurisdictions: list[str],
+    questions: list[str],
+    mix: dict[str, float],
+    users: int,
+    requests: int | None,
+    duration: float | None,
+    stream: bool,
+    think_seconds: float,
+    seed: int,
+) -> dict:
+    """Drive `target` with `users` simulated users; returns per-request results."""
+    results: list[dict] = []
+    lock = threading.Lock()
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+    modes, weights = zip(*mix.items())
+
+    def next_request(rng: random.Random) -> tuple[str, tuple] | None:
+        nonlocal issued
+        with lock:
+            if requests is not None and issued >= requests:
+                return None
+            issued += 1
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        mode = rng.choices(modes, weights)[0]
+        question = rng.choice(questions)
+        if mode == "single":
+            return mode, (rng.choice(jurisdictions), question)
+        if mode == "compare":
+            j1, j2 = rng.sample(jurisdictions, 2)
+            return mode, (j1, j2, question)
+        return mode, (question,)
+
+    def user(n: int) -> None:
+        rng = random.Random(seed + n)
+        while True:
+            request = next_request(rng)
+            if request is None:
+                return
+            mode, args = request
+            started = time.perf_counter()
+            error = None
+            first = None
+            try:
+                first = target.call(mode, args, stream)
+            except Exception as e:
+                error = str(e)
+            latency = time.perf_counter() - started
+            with lock:
+                results.append({"mode": mode, "latency": latency, "first_delta": first, "error": error})
+            if think_seconds:
+                time.sleep(rng.uniform(0, 2 * think_seconds))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    return {"elapsed": time.perf_counter() - started, "results": results}
+
+
+def summarize(run: dict, engine, fixtures: FixtureServer, model: StubModelServer) -> dict:
+    results = run["results"]
+    ok = [r for r in results if r["error"] is None]
+
+    def latency_stats(rows: list[dict], field: str = "latency") -> dict:
+        values = sorted(r[field] for r in rows if r[field] is not None)
+        if not values:
+            return {}
+        return {
+            "count": len(values),
+            "mean": statistics.fmean(values),
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+            "max": values[-1],
+        }
+
+    cache = engine.get_answer_cache()
+    lookups = cache.hits + cache.misses
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "elapsed_seconds": run["elapsed"],
+        "throughput_rps": len(ok) / run["elapsed"] if run["elapsed"] else 0.0,
+        "latency": latency_stats(ok),
+        "first_delta": latency_stats(ok, "first_delta"),
+        "by_mode": {mode: latency_stats([r for r in ok if r["mode"] == mode]) for mode in ("single", "compare", "canada")},
+        "answer_cache": {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "hit_rate": cache.hits / lookups if lookups else 0.0,
+        },
+        "source_fetches": fixtures.fetches,
+        "model_calls": model.calls,
+        "model_streams_cancelled": model.disconnects,
+        "model_prompt_tokens": model.prompt_tokens,
+        "model_usage": engine.get_model_usage().report(),
+        "sample_errors": sorted({r["error"] for r in results if r["error"]})[:5],
+    }
+
+
+def print_report(summary: dict) -> None:
+    def row(name: str, stats: dict) -> None:
+        if stats:
+            print(
+                f"  {name:<14} n={stats['count']:<6} mean={stats['mean']:7.2f}s "
+                f"p50={stats['p50']:7.2f}s p95={stats['p95']:7.2f}s p99={stats['p99']:7.2f}s"
+            )
+
+    print(f"requests:          {summary['requests']} ({summary['errors']} errors)")
+    print(f"elapsed:           {summary['elapsed_seconds']:.1f} s")
+    print(f"throughput:        {summary['throughput_rps']:.2f} answers/s")
+    print("latency:")
+    row("all", summary["latency"])
+    for mode, stats in summary["by_mode"].items():
+        row(mode, stats)
+    row("first delta", summary["first_delta"])
+    cache = summary["answer_cache"]
+    print(f"answer cache:      {cache['hit_rate']:.1%} hit rate ({cache['hits']} hits / {cache['misses']} misses)")
+    print(f"source fetches:    {summary['source_fetches']}")
+    print(
+        f"model calls:       {summary['model_calls']} ({summary['model_prompt_tokens']} prompt tokens, "
+        f"{summary['model_streams_cancelled']} cancelled mid-stream)"
+    )
+    usage = summary["model_usage"]
+    print(f"prompt cache:      {usage['cached_ratio']:.1%} of prompt tokens cached ({usage['cached_tokens']} tokens)")
+    for error in summary["sample_errors"]:
+        print(f"  error: {error}")
+
+
+# ---- Command line ----
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the answer engine against fixtures and a stub model.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="record every configured source as a fixture")
+    record.add_argument("--fixtures", default="loadtest_fixtures", help="directory to write fixtures to")
+
+    run = commands.add_parser("run", help="run a load test")
+    run.add_argument("--fixtures", default="loadtest_fixtures", help="directory of recorded sources")
+    run.add_argument("--target", choices=["engine", "api"], default="engine", help="call the engine directly or through api.py")
+    run.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    run.add_argument("--requests", type=int, default=None, help="total requests (default: 10 per user)")
+    run.add_argument("--duration", type=float, default=None, help="stop issuing requests after this many seconds")
+    run.add_argument("--mix", default="single=6,compare=3,canada=1", help="relative weight of each mode")
+    run.add_argument("--jurisdictions", default=None, help="comma-separated jurisdictions to draw from (default: all with sources)")
+    run.add_argument("--questions-file", default=None, help="file with one question per line")
+    run.add_argument("--stream", action="store_true", help="stream answers and report time to first piece")
+    run.add_argument("--think", type=float, default=0.0, help="mean pause between a user's requests, in seconds")
+    run.add_argument("--model-first-token", type=float, default=0.5, help="stub model delay before the first token (s)")
+    run.add_argument("--model-tokens-per-second", type=float, default=80, help="stub model generation speed")
+    run.add_argument("--model-completion-tokens", type=int, default=300, help="stub model reply length")
+    run.add_argument("--synthetic-paragraphs", type=int, default=200, help="paragraphs per synthetic source page")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--json", default=None, help="also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        import policy_engine
+
+        urls = [url for urls in policy_engine.JURISDICTION_SOURCES.values() for url in urls]
+        record_fixtures(urls, args.fixtures)
+        return
+
+    # The stub model must be in place before the engine creates its client
+    model = StubModelServer(args.model_first_token, args.model_tokens_per_second, args.model_completion_tokens)
+    os.environ["OPENAI_BASE_URL"] = model.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+
+    import policy_engine
+
+    urls = [url for urls in policy_engine.JURISDICTION_SOURCES.values() for url in urls]
+    fixtures = FixtureServer(urls, args.fixtures, args.synthetic_paragraphs)
+    for name, sources in policy_engine.JURISDICTION_SOURCES.items():
+        policy_engine.JURISDICTION_SOURCES[name] = [fixtures.local_urls[url] for url in sources]
+    print(f"{fixtures.recorded} recorded and {len(urls) - fixtures.recorded} synthetic sources; stub model at {model.base_url}")
+
+    if args.jurisdictions:
+        jurisdictions = [policy_engine.NORM_KEYS[name.strip().lower()] for name in args.jurisdictions.split(",")]
+    else:
+        jurisdictions = [name for name, sources in policy_engine.JURISDICTION_SOURCES.items() if sources]
+    if args.questions_file:
+        with open(args.questions_file, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = DEFAULT_QUESTIONS
+
+    target = ApiTarget() if args.target == "api" else EngineTarget()
+    requests = args.requests
+    if requests is None and args.duration is None:
+        requests = 10 * args.users
+
+    result = run_load(
+        target,
+        jurisdictions,
+        questions,
+        parse_mix(args.mix),
+        args.users,
+        requests,
+        args.duration,
+        args.stream,
+        args.think,
+        args.seed,
+    )
+    summary = summarize(result, policy_engine, fixtures, model)
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    if isinstance(target, ApiTarget):
+        target.close()
+    fixtures.close()
+    model.close()
+
+
+if __name__ == "__main__":
+    main()
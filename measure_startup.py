@@ -0,0 +1,54 @@
+# measure_startup.py
+#
+# Measures how long the Streamlit script takes on its first (cold) run and on
+# later reruns, and which heavy dependencies get imported along the way.
+# Run it before and after changes to app.py to compare:
+#
+#     python measure_startup.py --reruns 20
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+HEAVY_MODULES = ["pdfplumber", "openai", "requests"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time cold and warm runs of the Streamlit script.")
+    parser.add_argument("--script", default="app.py", help="Streamlit script to run")
+    parser.add_argument("--reruns", type=int, default=20, help="number of warm reruns to time")
+    args = parser.parse_args()
+
+    # No model calls are made; a placeholder key keeps client construction happy.
+    os.environ.setdefault("OPENAI_API_KEY", "sk-measure-startup")
+
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_import = time.perf_counter() - start
+
+    at = AppTest.from_file(args.script, default_timeout=60)
+
+    start = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - start
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    timings = []
+    for _ in range(args.reruns):
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+
+    print(f"streamlit import:        {streamlit_import * 1000:8.1f} ms")
+    print(f"first run (cold):        {cold * 1000:8.1f} ms")
+    print(f"rerun median ({args.reruns:>3}):     {statistics.median(timings) * 1000:8.1f} ms")
+    print(f"rerun max:               {max(timings) * 1000:8.1f} ms")
+    print(f"heavy modules loaded:    {', '.join(loaded) or 'none'}")
+    if at.exception:
+        print(f"script raised: {at.exception}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1687 @@
+# policy_engine.py
+#
+# Answer engine behind the Streamlit app: curated sources, fetching and text
+# extraction, the shared corpus store, and the three answer functions.
+#
+# Streamlit re-executes app.py on every interaction, but imported modules are
+# kept in sys.modules, so everything defined here (tables, caches, the
+# OpenAI client) is built once per process. Heavy dependencies (requests,
+# pdfplumber, openai) are imported only on the code path that needs
+# them.
+
+import atexit
+import codecs
+import dataclasses
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from html.parser import HTMLParser
+from typing import Callable, Iterator
+from ratelimit import create_chat_completion, limiter_from_env, stream_chat_completion
+from singleflight import SingleFlight
+from snapshot import snapshot_from_env
+from source_health import SourceHealthTracker, health_tracker_from_env
+from corpus_store import (
+    CompressedSource,
+    CorpusStore,
+    ParagraphDeduplicator,
+    Passage,
+    SourceWriter,
+    render_passages,
+)
+from answer_cache import AnswerCache, answer_cache_from_env
+from compression import compress_context, policy_focus
+from cache_warming import CacheWarmer, PopularQuery, QueryStats
+from source_changes import Artifact, DependencyTracker, change_log_from_env, source_diff
+from cancellation import AnswerCancelled, check_cancelled, current_token
+from cache_backend import backend_from_env, hold_lease, run_once_across_processes
+from profiling import waiting_for, working_on
+
+# ---- OpenAI client (uses your OPENAI_API_KEY env var) ----
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Create the OpenAI client on first use, importing openai only then."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                # Retries are handled by create_chat_completion, so the
+                # client's own retry loop is turned off to avoid retrying twice.
+                _client = OpenAI(max_retries=0)
+    return _client
+
+# ---- Shared rate limiter for model calls ----
+# One limiter for the whole process, so every session queues on the same
+# requests/tokens-per-minute budget and concurrency gate.
+# Tune with OPENAI_RPM, OPENAI_TPM and OPENAI_MAX_CONCURRENCY.
+_rate_limiter = limiter_from_env()
+
+def get_rate_limiter():
+    return _rate_limiter
+
+# ---- Request coalescing (single-flight) ----
+# One group per kind of work, shared across sessions. Concurrent callers
+# with the same key wait for one shared result instead of each fetching /
+# calling the model themselves.
+# Waiting callers give up when their answer is cancelled (see cancellation.py).
+_single_flights = {
+    "corpus": SingleFlight(poll=check_cancelled),
+    "url": SingleFlight(poll=check_cancelled),
+    "answer": SingleFlight(poll=check_cancelled),
+}
+
+def get_single_flight(name: str) -> SingleFlight:
+    return _single_flights[name]
+
+# ---- Shared cache backend ----
+# With POLICY_CACHE_URL (or POLICY_CACHE_PATH) set, the corpus store, answer
+# cache and source health records also write to a shared SQLite file or
+# Redis, so separate worker processes (Streamlit UI, HTTP API, on one host or
+# several) reuse each other's corpora and answers. Corpus builds and model
+# calls are also coordinated through it, so only one worker does each.
+_cache_backend = backend_from_env()
+
+# How long one worker may hold a build/answer lease before others give up
+# waiting for it and do the work themselves.
+CORPUS_BUILD_LEASE_SECONDS = 300
+ANSWER_LEASE_SECONDS = 120
+
+# ---- Answer cache ----
+# Generated answers are reused across sessions when the exact same request
+# (model, messages, settings - and therefore the same corpus text) comes in
+# again. Tune with ANSWER_CACHE_SIZE and ANSWER_CACHE_TTL.
+_answer_cache = answer_cache_from_env(backend=_cache_backend)
+
+def get_answer_cache() -> AnswerCache:
+    return _answer_cache
+
+# ---- Answer dependencies ----
+# Which source texts each cached answer was generated from, so a corpus
+# refresh only invalidates (and regenerates) the answers whose sources
+# actually changed. See source_changes.py.
+_dependencies = DependencyTracker(
+    max_entries=4 * _answer_cache.max_entries,
+    ttl_seconds=_answer_cache.ttl_seconds,
+    backend=_cache_backend,
+)
+
+def get_dependency_tracker() -> DependencyTracker:
+    return _dependencies
+
+# ---- Model usage (prompt-cache monitoring) ----
+# Prompts are laid out as a stable prefix (system prompt, jurisdiction
+# excerpts, instructions) followed by the question, so the provider can reuse
+# the cached prefix for repeat jurisdictions. These totals show how much of
+# each prompt was actually served from that cache.
+class ModelUsage:
+    """Running totals of model token usage, safe to update from many threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, usage) -> None:
+        """Add one call's `usage` (from a completion or the end of a stream) and log it."""
+        prompt = getattr(usage, "prompt_tokens", None) or 0
+        completion = getattr(usage, "completion_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt
+            self.cached_tokens += cached
+            self.completion_tokens += completion
+        print(f"[complete_chat] {prompt} prompt tokens ({cached} cached), {completion} completion tokens")
+
+    def report(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "completion_tokens": self.completion_tokens,
+            }
+
+_model_usage = ModelUsage()
+
+def get_model_usage() -> ModelUsage:
+    return _model_usage
+
+def _prompt_messages(system_prompt: str, context_prompt: str, question_prompt: str) -> list[dict]:
+    """
+    Chat messages with the stable parts first and the question last: the
+    system prompt and the context/instructions message are identical for
+    every question about the same jurisdiction(s), so they form a reusable
+    cached prefix.
+    """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": context_prompt},
+        {"role": "user", "content": question_prompt},
+    ]
+
+def complete_chat(
+    on_delta: Callable[[str], None] | None = None,
+    artifact: Artifact | None = None,
+    **kwargs,
+) -> str:
+    """
+    Rate-limited chat completion that returns the reply text.
+
+    - Answers already in the answer cache are returned without a model call.
+    - Identical in-flight requests share a single API call, within this
+      process and, with a shared cache backend, across worker processes.
+    - If `on_delta` is given, the reply is streamed to it as it is generated
+      (cached or shared replies arrive as a single piece).
+    - When running under a cancel token (see cancellation.py), waiting stops
+      and the model request is aborted as soon as the token is cancelled
+      (the reply is then always fetched as a stream, which can be closed).
+    - `artifact` records which sources the prompt was built from and how to
+      regenerate the answer when one of them changes.
+    """
+    key = hashlib.sha256(json.dumps(kwargs, sort_keys=True).encode("utf-8")).hexdigest()
+    if artifact is not None:
+        _dependencies.record(key, artifact)
+    cached = _answer_cache.get(key)
+    if cached is not None:
+        if on_delta is not None:
+            on_delta(cached)
+        return cached
+
+    token = current_token()
+    check = token.check if token is not None else None
+    streamed = False
+
+    def _call() -> str:
+        nonlocal streamed
+        if on_delta is None and token is None:
+            response = create_chat_completion(get_client(), get_rate_limiter(), **kwargs)
+            answer = response.choices[0].message.content
+            if response.usage is not None:
+                _model_usage.record(response.usage)
+        else:
+            streamed = on_delta is not None
+            answer = stream_chat_completion(
+                get_client(),
+                get_rate_limiter(),
+                on_delta if on_delta is not None else (lambda text: None),
+                on_usage=_model_usage.record,
+                check=check,
+                on_stream=(lambda stream: token.on_cancel(stream.close)) if token is not None else None,
+                **kwargs,
+            )
+        _answer_cache.set(key, answer)
+        return answer
+
+    def _call_once() -> str:
+        return run_once_across_processes(
+            _cache_backend,
+            f"lease:answer:{key}",
+            _call,
+            ready=lambda: _answer_cache.get(key, count=False),
+            lease_seconds=ANSWER_LEASE_SECONDS,
+            check=check,
+        )
+
+    while True:
+        try:
+            answer = get_single_flight("answer").do(key, _call_once)
+            break
+        except AnswerCancelled:
+            # Ours was cancelled: give up. Otherwise another caller's
+            # identical request was cancelled while we waited on it: retry.
+            check_cancelled()
+    if on_delta is not None and not streamed:
+        on_delta(answer)
+    return answer
+
+# ---- Guardrail Helper ----
+
+# Terms that clearly indicate the question is about Canada
+CANADIAN_HINTS = [
+    "canada",
+    "canadian",
+    "federal",
+    "province",
+    "provincial",
+    "territorial",
+    "territory",
+    # Provinces and territories
+    "alberta",
+    "british columbia",
+    "bc",
+    "saskatchewan",
+    "manitoba",
+    "ontario",
+    "quebec",
+    "québec",
+    "new brunswick",
+    "nova scotia",
+    "prince edward island",
+    "pei",
+    "newfoundland",
+    "labrador",
+    "yukon",
+    "northwest territories",
+    "nunavut",
+]
+
+# Explicitly non-Canadian places to block
+NON_CANADIAN_HINTS = [
+    "usa", "u.s.a", "united states", "america", "american",
+    "us federal", "u.s. federal",
+    "uk", "united kingdom", "britain", "england",
+    "europe", "european union", "eu",
+    "china", "india", "japan", "germany", "france", "mexico",
+    "brazil", "australia", "new zealand", "nz",
+    "africa", "asia", "russia", "russian",
+    "barbados", "cuba", "italy", "italian", "spain", "spanish",
+    "singapore", "saudi arabia", "saudi",
+    # add more as needed
+]
+
+# Both hint lists compiled once into substring matchers (same semantics as
+# checking each term with `in`, but a single scan of the question).
+_CANADIAN_MATCHER = re.compile("|".join(map(re.escape, CANADIAN_HINTS)))
+_NON_CANADIAN_MATCHER = re.compile("|".join(map(re.escape, NON_CANADIAN_HINTS)))
+
+def is_non_canadian_question(question: str) -> bool:
+    """
+    Return True if the question appears to be explicitly about a
+    non-Canadian country or region based on simple keyword matching.
+
+    Generic questions about 'this government' or 'AI policy' are allowed,
+    even if they don't explicitly mention Canada.
+    """
+    q = question.lower()
+
+    # If it clearly references Canada or a province/territory, it's allowed.
+    if _CANADIAN_MATCHER.search(q):
+        return False
+
+    # If it clearly references a non-Canadian place, we block it.
+    if _NON_CANADIAN_MATCHER.search(q):
+        return True
+
+    # Otherwise, we treat the question as in-scope.
+    return False
+
+# ---- 1. JURISDICTION SOURCES ----
+JURISDICTION_SOURCES = {
+    "Federal": [
+        "https://www.canada.ca/en/government/system/digital-government/digital-government-innovations/responsible-use-ai.html",
+        "https://www.canada.ca/en/government/system/digital-government/digital-government-innovations/responsible-use-ai/guide-use-generative-ai.html",
+        "https://www.canada.ca/en/government/system/digital-government/digital-government-innovations/responsible-use-ai/guide-scope-directive-automated-decision-making.html",
+        "https://www.canada.ca/en/government/system/digital-government/digital-government-innovations/responsible-use-ai/gc-ai-strategy-overview.html",
+        "https://www.canada.ca/en/government/system/digital-government/digital-government-innovations/responsible-use-ai/principles.html",
+        "https://open.canada.ca/data/en/dataset/fcbc0200-79ba-4fa4-94a6-00e32facea6b",
+        "https://www.canada.ca/en/innovation-science-economic-development/news/2025/09/government-of-canada-launches-ai-strategy-task-force-and-public-engagement-on-the-development-of-the-next-ai-strategy.html",
+        # Policy Horizons Canada (foresight & AI futures)
+        "https://horizons.service.canada.ca/en/2025/02/10/ai-policy-consideration/index.shtml",
+        # Health Canada
+        "https://www.canada.ca/en/health-canada/corporate/transparency/health-agreements/pan-canadian-ai-guiding-principles.html",
+        # Office of the Privacy Commissioner of Canada
+        "https://www.priv.gc.ca/en/privacy-topics/technology/artificial-intelligence/gd_principles_ai/",
+        # Canadian Judicial Council
+        "https://cjc-ccm.ca/sites/default/files/documents/2024/AI%20Guidelines%20-%20FINAL%20-%202024-09%20-%20EN.pdf",
+    ],
+
+    "Ontario": [
+        "https://www.ontario.ca/page/ontarios-trustworthy-artificial-intelligence-ai-framework",
+        "https://www.ontario.ca/page/responsible-use-artificial-intelligence-directive",
+        "https://www.ontario.ca/page/ontario-broader-public-sector-cyber-security-strategy-report",
+        "https://www.ipc.on.ca/en/media-centre/blog/artificial-intelligence-public-sector-building-trust-now-and-future",
+        "https://www.ontario.ca/page/strengthening-cyber-security-and-building-trust-public-sector",
+        "https://www.ontario.ca/page/digital-ontario",
+    ],
+    "Alberta": [
+        "https://www.alberta.ca/technology-and-innovation",
+        "https://www.alberta.ca/artificial-intelligence-data-centres-strategy",
+        "https://open.alberta.ca/publications/albertas-ai-data-centre-strategy",
+        "https://www.alberta.ca/system/files/popa-fact-sheet-ai-automated-systems.pdf",
+        "https://www.alberta.ca/lookup/imt-policy-instruments-portal.aspx",
+    ],
+   "British Columbia": [
+        "https://digital.gov.bc.ca/policies-standards/generative-ai-policy",
+        "https://digital.gov.bc.ca/ai/draft-responsible-use-principles",
+        "https://www2.gov.bc.ca/assets/gov/education/administration/kindergarten-to-grade-12/ai-in-education/considerations-for-using-ai-tools-in-k-12-schools.pdf",
+    ],
+
+    "Québec": [
+        "https://www.quebec.ca/en/government/policies-orientations/artificial-intelligence",
+        "https://www.quebec.ca/en/government/policies-orientations/digital-strategy",
+        "https://api.forum-ia.devbeet.com/app/uploads/2020/09/ai-strategy_en-acj-19-juin-v8.pdf?utm_source=chatgpt.com", 
+    ],
+
+    "Nova Scotia": [
+        "https://www.novascotia.ca/digital-code-practice",
+        "https://www.novascotia.ca/government/cyber-security-and-digital-solutions",
+    ],
+
+    "New Brunswick": [
+        "https://www.gnb.ca/nosearch/digital-numerique/digital_new_brunswick.pdf",
+    ],
+
+    "Manitoba": [
+        "https://www.gov.mb.ca/asset_library/en/proactive/20252026/innovation-and-prosperity-report.pdf",
+        "https://news.gov.mb.ca/news/index.html?item=71303",
+        "https://news.gov.mb.ca/news/?item=68018",
+    ],
+
+    "Saskatchewan": [
+        "https://www.saskatchewan.ca/government/government-data/digital-government",
+        "https://taskroom.saskatchewan.ca/services-and-support/information-technology/artificial-intelligence/generative-artificial-intelligence-guidelines",
+    ],
+   
+    "Prince Edward Island": [
+        "https://www.princeedwardisland.ca/sites/default/files/ad9e/MD2025-06ENG.pdf",
+        "https://www.princeedwardisland.ca/sites/default/files/publications/pei_digital_health_strategy.pdf",
+        "https://www.princeedwardisland.ca/sites/default/files/publications/2021_speech_from_the_throne.pdf",
+        "https://www.princeedwardisland.ca/sites/default/files/3089/Health_PEI_Strategic_Plan_2025-2028.pdf",
+    ],
+
+    "Yukon": [
+        "https://yukon.ca/en/education-and-schools/kindergarten-grade-12-curriculum/learn-about-use-artificial-intelligence-ai",
+
+    ],
+
+    "Nunavut":  [
+        "https://www.gov.nu.ca/en/culture-language-heritage-and-art/language-preservation-and-promotion-through-technology-ms",
+        "https://assembly.nu.ca/sites/default/files/2025-05/OGOPA%20Report%20-%20IPC%202023-2024%20-%20May2025%20-%20English.pdf",
+    ],
+
+    "Newfoundland and Labrador":  [
+        "https://www.gov.nl.ca/releases/2025/gmsd-en/0723n01/",
+        "https://www.gov.nl.ca/releases/2025/ipgs/0507n03/",
+        "https://www.gov.nl.ca/releases/2023/oipc/1207n04/",
+        "https://www.gov.nl.ca/releases/2025/ipgs/0416n04/",
+        "https://www.gov.nl.ca/releases/2022/exec/0708n02/",
+    ],
+
+    "Northwest Territories":  [
+        "https://bearnet.gov.nt.ca/sites/bearnet/files/2025-05-29_gnwt_guideline_on_use_of_generative_ai_-_signed.pdf",
+        "https://www.nwtgeoscience.ca/news/canada-and-northwest-territories-partner-innovative-ai-based-core-scanning-initiative-support",
+    ],
+
+}
+
+# Normalize lookups so internal logic can safely use lowercase keys
+NORM_KEYS = {k.lower(): k for k in JURISDICTION_SOURCES.keys()}
+
+# ---- 2. FETCH + EXTRACT TEXT ----
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-CA,en;q=0.9",
+}
+
+# PDF passages start at each detected heading; long sections are split at
+# line boundaries once they reach roughly this many characters.
+PDF_CHUNK_CHARS = 1500
+
+def _pdf_page_lines(page) -> list[tuple[str, float, bool]]:
+    """(text, font size, is bold) for each text line of a PDF page, in reading order."""
+    words = page.extract_words(extra_attrs=["size", "fontname"], use_text_flow=True)
+    lines: list[list[dict]] = []
+    for word in words:
+        if lines and abs(word["top"] - lines[-1][-1]["top"]) <= 2:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return [
+        (
+            " ".join(w["text"] for w in line),
+            max(w["size"] for w in line),
+            all("bold" in w["fontname"].lower() for w in line),
+        )
+        for line in lines
+    ]
+
+def _body_font_size(lines: list[tuple[str, float, bool]]) -> float:
+    """The font size carrying the most characters on a page."""
+    weights: dict[float, int] = {}
+    for text, size, _ in lines:
+        weights[round(size, 1)] = weights.get(round(size, 1), 0) + len(text)
+    return max(weights, key=weights.get) if weights else 0.0
+
+def _is_heading(text: str, size: float, bold: bool, body_size: float) -> bool:
+    """Short lines set larger than the body text (or bold at body size) are headings."""
+    if len(text) > 120 or text.endswith((".", ",", ";")):
+        return False
+    if not any(c.isalpha() for c in text):
+        return False
+    return size >= body_size * 1.15 or (bold and size >= body_size * 0.95 and len(text.split()) <= 12)
+
+def iter_pdf_passages(pdf, url: str) -> Iterator[Passage]:
+    """
+    Yield section-aware passages from an open pdfplumber PDF, one page at a time.
+
+    - A new passage starts at every heading; long sections are split at line
+      boundaries about every PDF_CHUNK_CHARS characters.
+    - Each passage carries the section title it falls under and its page range.
+    - Passages are produced while the pages are read, with no second pass.
+    """
+    section: str | None = None
+    lines: list[str] = []
+    chars = 0
+    first_page = last_page = 0
+    heading_size: float | None = None  # set while the previous line was a heading
+
+    def take_passage() -> Passage:
+        nonlocal lines, chars
+        passage = Passage(url, "\n".join(lines), section, first_page, last_page)
+        lines, chars = [], 0
+        return passage
+
+    for page_number, page in enumerate(pdf.pages, start=1):
+        try:
+            page_lines = _pdf_page_lines(page)
+        except Exception:
+            # Fall back to plain text lines (no heading detection) for odd pages
+            page_lines = [(t, 0.0, False) for t in (page.extract_text() or "").split("\n")]
+        body_size = _body_font_size(page_lines)
+
+        for text, size, bold in page_lines:
+            text = text.strip()
+            if not text:
+                continue
+            if body_size and _is_heading(text, size, bold, body_size):
+                if lines:
+                    yield take_passage()
+                # A heading line right after one of the same size continues it (wrapped heading)
+                if heading_size is not None and section and abs(size - heading_size) < 0.5:
+                    section = f"{section} {text}"
+                else:
+                    section = text
+                heading_size = size
+                continue
+            heading_size = None
+            if not lines:
+                first_page = page_number
+            last_page = page_number
+            lines.append(text)
+            chars += len(text) + 1
+            if chars >= PDF_CHUNK_CHARS:
+                yield take_passage()
+
+        # Release the page's parsed objects before moving on
+        page.close()
+
+    if lines:
+        yield take_passage()
+
+# ---- Streaming HTML extraction ----
+# Elements whose text is never part of the corpus, and elements that cannot
+# have children (so are never "open").
+_HTML_SKIP_TAGS = {"script", "style", "nav", "header", "footer"}
+_HTML_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "source", "track", "wbr",
+}
+# Block elements that implicitly close an open <p>
+_HTML_CLOSES_P = {
+    "address", "article", "aside", "blockquote", "div", "dl", "fieldset",
+    "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "main", "nav", "ol", "p", "pre", "section", "table", "ul",
+}
+
+class _ParagraphParser(HTMLParser):
+    """
+    Incremental HTML parser that collects the text of each <p>/<li> as the
+    document is fed in, skipping script/style/nav/header/footer content.
+    Finished passages are picked up with `pop_passages()`.
+
+    Passages come out in document order, which differs from
+    BeautifulSoup's find_all("p", "li") in two ways:
+
+    - A <p>/<li> with a nested <p>/<li> is split around it: "A <ul><li>B
+      </li></ul> C" gives "A", "B", "C" (BeautifulSoup gives "A B C" and
+      then "B" again).
+    - Text following a <p> that was implicitly closed by a block element
+      (e.g. "<p>A<table>...</table>B") is kept as its own passage, up to
+      the end of the <p>'s parent.
+    """
+
+    def __init__(self, url: str):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self._stack: list[tuple[str, list[str] | None]] = []  # (tag, raw text for p/li)
+        self._skip_depth = 0
+        # (stack depth, raw text) of the text after an implicitly closed <p>
+        self._tail: tuple[int, list[str]] | None = None
+        self._done: list[Passage] = []
+
+    def pop_passages(self) -> list[Passage]:
+        done, self._done = self._done, []
+        return done
+
+    def _emit(self, parts: list[str]) -> None:
+        text = " ".join("".join(parts).split())
+        parts.clear()
+        if text:
+            self._done.append(Passage(self.url, text))
+
+    def _end_tail(self) -> None:
+        if self._tail is not None:
+            self._emit(self._tail[1])
+            self._tail = None
+
+    def _close_to(self, index: int) -> None:
+        """Close every element from `index` up, emitting any <p>/<li> text."""
+        while len(self._stack) > index:
+            tag, parts = self._stack.pop()
+            if tag in _HTML_SKIP_TAGS:
+                self._skip_depth -= 1
+            if parts is not None:
+                self._emit(parts)
+        if self._tail is not None and len(self._stack) < self._tail[0]:
+            self._end_tail()
+
+    def _nearest(self, *tags: str) -> int | None:
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] in tags:
+                return i
+        return None
+
+    def _separate(self) -> None:
+        # Tags inside a paragraph separate words, as with get_text(" ")
+        parts = self._open_parts()
+        if parts is not None:
+            parts.append(" ")
+
+    def _open_parts(self) -> list[str] | None:
+        for _, parts in reversed(self._stack):
+            if parts is not None:
+                return parts
+        return self._tail[1] if self._tail is not None else None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _HTML_CLOSES_P:
+            # An open <p> is implicitly closed by the next block element;
+            # the text after it is collected until its parent closes
+            i = self._nearest("p", "li")
+            if i is not None and self._stack[i][0] == "p":
+                self._close_to(i)
+                self._end_tail()
+                self._tail = (i, [])
+        self._separate()
+        if tag in _HTML_VOID_TAGS:
+            return
+        elif tag == "li":
+            # An open <li> is closed by a sibling <li> (but not by a nested list's)
+            i = self._nearest("li", "ul", "ol")
+            if i is not None and self._stack[i][0] == "li":
+                self._close_to(i)
+        if tag in ("p", "li"):
+            # Emit the text so far of the enclosing <p>/<li> (or tail) first,
+            # so passages stay in document order
+            self._end_tail()
+            parts = self._open_parts()
+            if parts is not None:
+                self._emit(parts)
+        if tag in _HTML_SKIP_TAGS:
+            self._skip_depth += 1
+        self._stack.append((tag, [] if tag in ("p", "li") else None))
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        self._separate()
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                self._close_to(i)
+                return
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        parts = self._open_parts()
+        if parts is not None:
+            parts.append(data)
+
+    def close(self):
+        super().close()
+        self._close_to(0)
+        self._end_tail()
+
+# Response bodies are read in chunks of this size. PDFs are spooled to a
+# temporary file once they grow past PDF_SPOOL_BYTES instead of staying in memory.
+FETCH_CHUNK_BYTES = 64 * 1024
+PDF_SPOOL_BYTES = 4 * 1024 * 1024
+
+def iter_passages_from_url(url: str, outcome: dict | None = None) -> Iterator[Passage]:
+    """
+    Download a URL and yield readable passages as they are extracted.
+
+    - HTML is decoded and parsed incrementally; each <p>/<li> is yielded as
+      soon as it closes.
+    - PDF bytes are streamed to a spooled temporary file (on disk once large)
+      and pages are parsed one at a time (see iter_pdf_passages).
+
+    Memory use is bounded by the chunk size and the current page/paragraph,
+    not by the size of the document. Failed requests are logged and yield
+    nothing; pass an `outcome` dict to get the HTTP "status" and, for a
+    failure, an "error" description.
+    """
+    import requests
+
+    outcome = {} if outcome is None else outcome
+    try:
+        resp = requests.get(url, headers=DEFAULT_HEADERS, timeout=20, stream=True)
+    except Exception as e:
+        print(f"[iter_passages_from_url] Error fetching {url}: {e}")
+        outcome["error"] = type(e).__name__
+        return
+
+    with resp:
+        outcome["status"] = resp.status_code
+        if resp.status_code != 200:
+            print(f"[iter_passages_from_url] {url} returned HTTP {resp.status_code}")
+            outcome["error"] = f"HTTP {resp.status_code}"
+            return
+        yield from _iter_response_passages(resp, url)
+
+def _iter_response_passages(resp, url: str) -> Iterator[Passage]:
+    """Passages from a successful (HTTP 200) streamed response."""
+    content_type = resp.headers.get("Content-Type", "").lower()
+    extracted = False
+
+    # PDF handling
+    if "pdf" in content_type or url.lower().endswith(".pdf"):
+        import pdfplumber
+
+        with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_BYTES) as spool:
+            for chunk in resp.iter_content(FETCH_CHUNK_BYTES):
+                spool.write(chunk)
+            spool.seek(0)
+            try:
+                with pdfplumber.open(spool) as pdf:
+                    for passage in iter_pdf_passages(pdf, url):
+                        extracted = True
+                        yield passage
+            except Exception as e:
+                print(f"[iter_passages_from_url] Error reading PDF {url}: {e}")
+
+        if not extracted:
+            print(f"[iter_passages_from_url] No text extracted from PDF {url}")
+        return
+
+    # HTML handling: use the declared charset, otherwise UTF-8
+    encoding = resp.encoding if "charset=" in content_type else "utf-8"
+    decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    parser = _ParagraphParser(url)
+    for chunk in resp.iter_content(FETCH_CHUNK_BYTES):
+        parser.feed(decoder.decode(chunk))
+        for passage in parser.pop_passages():
+            extracted = True
+            yield passage
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    for passage in parser.pop_passages():
+        extracted = True
+        yield passage
+
+    if not extracted:
+        print(f"[iter_passages_from_url] No <p>/<li> text extracted from {url}")
+
+# Limits how many source documents are downloaded and parsed at once across
+# all corpus builds, so parallel builds keep a bounded memory footprint.
+_fetch_slots = threading.BoundedSemaphore(int(os.environ.get("FETCH_MAX_CONCURRENCY", "8")))
+
+# Per-URL health records and circuit breaker (see source_health.py)
+_source_health = health_tracker_from_env(backend=_cache_backend)
+
+def get_source_health() -> SourceHealthTracker:
+    return _source_health
+
+def fetch_source(url: str) -> CompressedSource:
+    """
+    Stream a URL's passages straight into a compressed source, recording the
+    outcome in the source health tracker.
+
+    A source whose circuit is open is not requested at all. When a source is
+    skipped or fails, its last good copy is returned (an empty source if it
+    has never been fetched successfully).
+    """
+    health = get_source_health()
+    if not health.allow(url):
+        print(f"[fetch_source] Skipping {url}: {health.get(url).summary()}")
+        return _last_good_source(url)
+
+    outcome: dict = {}
+    with _fetch_slots:
+        started = time.monotonic()
+        writer = SourceWriter(url)
+        try:
+            for passage in iter_passages_from_url(url, outcome):
+                writer.add(passage)
+        except Exception as e:
+            # The connection failed while the body was being read
+            print(f"[fetch_source] Error fetching {url}: {e}")
+            outcome["error"] = type(e).__name__
+        latency = time.monotonic() - started
+
+    status = outcome.get("status")
+    error = outcome.get("error")
+    if error is None:
+        source = writer.finish()
+        if not source.length:
+            error = "no text extracted"
+    if error is None:
+        health.record_success(url, status, latency, source)
+        return source
+
+    record = health.record_failure(url, status, error, latency)
+    print(f"[fetch_source] {url} failed ({error}); {record.summary()}")
+    return _last_good_source(url)
+
+def _last_good_source(url: str) -> CompressedSource:
+    health = get_source_health()
+    source = health.last_good(url)
+    if source is None and health.last_good_digest(url) is not None:
+        # No shared copy: use the (deduplicated) text the corpus was built from
+        source = get_corpus_store().find_source(url)
+    if source is None:
+        return SourceWriter(url).finish()
+    print(f"[fetch_source] Using last good copy of {url} ({source.length} characters)")
+    return source
+
+def fetch_passages_from_url(url: str) -> list[Passage]:
+    """
+    Download a URL and extract readable passages from HTML or PDF.
+
+    HTML gives one passage per <p>/<li>; PDFs give section-aware passages with
+    page numbers (see iter_pdf_passages).
+    """
+    return list(iter_passages_from_url(url))
+
+def fetch_text_from_url(url: str) -> str:
+    """Download a URL and extract readable text from HTML or PDF."""
+    return render_passages(fetch_passages_from_url(url))[0]
+
+# ---- 3. CORPUS BUILDER (with normalization + caching) ----
+
+# Cache so we only fetch each jurisdiction once per process. Source texts
+# are stored compressed and deduplicated (see corpus_store.py), and callers
+# read prefixes/slices instead of full copies. With CORPUS_SNAPSHOT_PATH set,
+# corpora come from a memory-mapped snapshot (see snapshot.py) instead of
+# the network.
+_corpus_store = CorpusStore(
+    backend=_cache_backend,
+    snapshot=snapshot_from_env(),
+    # How often a worker checks whether another one has refreshed a corpus
+    sync_seconds=float(os.environ.get("CORPUS_SYNC_SECONDS", "30")),
+)
+
+def get_corpus_store() -> CorpusStore:
+    return _corpus_store
+
+def load_jurisdiction_corpus(jurisdiction: str) -> str:
+    """
+    Make sure the corpus for a jurisdiction is in the corpus store and
+    return its canonical name.
+
+    - Accepts any capitalization (e.g., 'federal', 'Federal', 'FEDERAL').
+    - Uses NORM_KEYS to map to the canonical key in JURISDICTION_SOURCES.
+    - "Thin" jurisdictions with no URLs configured get an empty corpus.
+    """
+    if not jurisdiction:
+        raise ValueError("Jurisdiction name is required.")
+
+    # Normalize to canonical key (e.g., 'federal' -> 'Federal')
+    canonical = NORM_KEYS.get(jurisdiction.lower())
+    if canonical is None:
+        raise ValueError(f"Unknown jurisdiction: {jurisdiction!r}")
+
+    if get_corpus_store().has(canonical):
+        return canonical
+
+    if current_token() is None:
+        _load_corpus_now(canonical)
+    else:
+        # Cancellable answers wait for a background build instead of running
+        # it: if the answer is cancelled, the build carries on and its result
+        # is kept for the next caller.
+        future, _ = _start_corpus_load(canonical)
+        with waiting_for(f"corpus:{canonical}"):
+            while True:
+                try:
+                    future.result(timeout=0.25)
+                    break
+                except FutureTimeoutError:
+                    check_cancelled()
+    return canonical
+
+def _load_corpus_now(canonical: str) -> None:
+    # Concurrent callers for the same jurisdiction share one build (and with
+    # a shared cache backend, so do other worker processes)
+    get_single_flight("corpus").do(
+        canonical,
+        run_once_across_processes,
+        _cache_backend,
+        f"lease:corpus:{canonical}",
+        lambda: _build_jurisdiction_corpus(canonical),
+        ready=lambda: True if get_corpus_store().has(canonical) else None,
+        lease_seconds=CORPUS_BUILD_LEASE_SECONDS,
+    )
+
+# Background corpus loads: started as soon as the UI knows which jurisdiction
+# will be asked about, and used by cancellable answers. Answer calls join a
+# load that is already running instead of starting another.
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "4"))
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="corpus-prefetch")
+_corpus_loads: dict[str, Future] = {}
+_corpus_loads_lock = threading.Lock()
+
+def _load_corpus_tagged(canonical: str) -> None:
+    # Tagged so profiles of the answers waiting for it include this thread
+    with working_on(f"corpus:{canonical}"):
+        _load_corpus_now(canonical)
+
+def _start_corpus_load(canonical: str) -> tuple[Future, bool]:
+    """The background load for `canonical`, and whether this call started it."""
+    with _corpus_loads_lock:
+        future = _corpus_loads.get(canonical)
+        if future is not None:
+            return future, False
+        future = _prefetch_pool.submit(_load_corpus_tagged, canonical)
+        _corpus_loads[canonical] = future
+
+    def _finished(done: Future) -> None:
+        with _corpus_loads_lock:
+            if _corpus_loads.get(canonical) is done:
+                del _corpus_loads[canonical]
+        if done.exception() is not None:
+            print(f"[prefetch_jurisdiction_corpus] Error loading {canonical}: {done.exception()}")
+
+    future.add_done_callback(_finished)
+    return future, True
+
+def prefetch_jurisdiction_corpus(jurisdiction: str) -> bool:
+    """
+    Start loading a jurisdiction's corpus in the background, if it isn't
+    loaded or already being loaded. Returns True if a load was started.
+    """
+    canonical = NORM_KEYS.get((jurisdiction or "").lower())
+    if canonical is None or get_corpus_store().has(canonical):
+        return False
+    if get_single_flight("corpus").in_flight(canonical):
+        return False
+    return _start_corpus_load(canonical)[1]
+
+def get_jurisdiction_corpus(jurisdiction: str) -> str:
+    """
+    Build or return the full text corpus for a given jurisdiction.
+
+    This joins every source into one new string; the answer functions read
+    only what they need through get_corpus_store() instead.
+    """
+    canonical = load_jurisdiction_corpus(jurisdiction)
+    return get_corpus_store().text(canonical)
+
+def _build_jurisdiction_corpus(canonical: str, refresh: bool = False) -> None:
+    """
+    Fetch every source for `canonical` and put the texts in the corpus store
+    (replacing the stored corpus if `refresh` is set).
+    """
+    store = get_corpus_store()
+    # Another caller may have finished the build while we were queued
+    if store.has(canonical) and not refresh:
+        return
+
+    urls = JURISDICTION_SOURCES.get(canonical, [])
+    # Thin jurisdictions: no URLs yet -> empty corpus (handled by callers)
+    if not urls:
+        store.put(canonical, [])
+        return
+
+    print(f"Building corpus for jurisdiction: {canonical}")
+    pieces: list[tuple[str, CompressedSource]] = []
+    # Repeated paragraphs (within or across this jurisdiction's sources) are kept once
+    dedup = ParagraphDeduplicator()
+
+    for url in urls:
+        try:
+            # Each source is streamed into compressed form; its passages are
+            # then streamed through the deduplicator into the stored copy.
+            fetched = get_single_flight("url").do(url, fetch_source, url)
+            writer = SourceWriter(url)
+            for passage in fetched.iter_passages():
+                text = dedup.filter(passage.text)
+                if text:
+                    writer.add(dataclasses.replace(passage, text=text))
+            source = writer.finish()
+            if source.length:
+                pieces.append((url, source))
+        except Exception as e:
+            print(f"  !! Error fetching {url}: {e}")
+
+    store.put(canonical, pieces)
+    usage = store.memory_report()[canonical]
+    print(
+        f"{usage['chars']} characters of text in the {canonical} corpus "
+        f"({usage['compressed_bytes']} bytes compressed, "
+        f"{dedup.dropped} duplicate paragraphs / {dedup.dropped_chars} characters removed)"
+    )
+
+def _joined_corpora_head(
+    store: CorpusStore,
+    jurisdictions: list[str],
+    max_chars: int,
+    taken: dict[str, int] | None = None,
+) -> str:
+    """
+    First `max_chars` characters of the "### <name>" blocks for each
+    jurisdiction joined together, without building the full joined text.
+    If given, `taken` is filled in with how many characters of each corpus
+    were used.
+    """
+    parts: list[str] = []
+    remaining = max_chars
+    for i, canonical in enumerate(jurisdictions):
+        for piece in (("\n\n" if i else "") + f"### {canonical}\n", None, "\n"):
+            if remaining <= 0:
+                return "".join(parts)
+            if piece is None:
+                piece = store.head(canonical, remaining)
+                if taken is not None:
+                    taken[canonical] = len(piece)
+            piece = piece[:remaining]
+            parts.append(piece)
+            remaining -= len(piece)
+    return "".join(parts)
+
+def _excerpt_sources(store: CorpusStore, taken: dict[str, int]) -> dict[str, str]:
+    """URL -> digest of every source the excerpt (`taken` chars of each corpus) drew from."""
+    return {
+        r.url: r.digest
+        for canonical, chars in taken.items()
+        for r in store.head_sources(canonical, chars)
+    }
+
+# ---- Example questions ----
+# Offered as buttons in each mode of the app, and warmed into the answer
+# cache with the most-asked questions (see the cache warming section).
+# "{gov}", "{j1}" and "{j2}" are filled in with the selected governments.
+EXAMPLE_QUESTIONS = {
+    "single": [
+        "What AI policies, directives, or frameworks currently apply to this provincial or territorial government?",
+        "How does this government expect public-sector organizations to use AI responsibly?",
+        "What should my organization know to align our responsible AI practices with this government’s AI expectations?",
+        "What transparency, accountability, or disclosure requirements does this government set for AI use?",
+        "Provide an overview of current AI policies, directives, and guidance for the "
+        "{gov} government, and what they mean in practice for public-sector organizations "
+        "and others wishing to align with this government’s approach to responsible AI.",
+    ],
+    "compare": [
+        "How do these two governments differ in their AI governance and responsible AI requirements for organizations?",
+        "Which of these governments has more explicit rules on transparency, disclosure, or accountability for AI use?",
+        "How do their AI risk-management practices compare, and what does this mean for organizations operating in both?",
+        "Do both governments address generative AI specifically, or do they focus on broader AI systems for public-sector and other organizations?",
+        "How do the AI governance and responsible AI requirements of "
+        "{j1} and {j2} differ, and what do these differences mean "
+        "in practice for organizations operating in both jurisdictions?",
+    ],
+    "canada": [
+        "Do most Canadian provincial or territorial governments have formal AI policies, directives, or frameworks in place?",
+        "How aligned are provincial and territorial AI approaches with the federal government's responsible AI strategy?",
+        "What should an organization operating in multiple provinces know about AI governance across Canada?",
+        "Are there common principles that appear across Canadian AI policies, such as transparency, fairness, accountability, or human rights?",
+        "Provide a Canada-wide overview of current public-sector AI policies, directives, "
+        "frameworks, and guidelines, and what they mean in practice for organizations "
+        "operating in Canada.",
+    ],
+}
+
+def example_questions(mode: str, gov: str = "", j1: str = "", j2: str = "") -> list[str]:
+    return [q.format(gov=gov, j1=j1, j2=j2) for q in EXAMPLE_QUESTIONS[mode]]
+
+# ---- Answer deadlines ----
+# Longest an answer may take in each mode (corpus loading included) before
+# it is cancelled; see cancellation.AnswerJob.
+ANSWER_DEADLINES = {
+    "single": float(os.environ.get("ANSWER_DEADLINE_SINGLE", "90")),
+    "compare": float(os.environ.get("ANSWER_DEADLINE_COMPARE", "120")),
+    "canada": float(os.environ.get("ANSWER_DEADLINE_CANADA", "240")),
+}
+
+# ---- Context compression ----
+# Opt-in local extractive compression of each mode's corpus excerpt (see
+# compression.py). With a keep ratio below 1.0, a mode's excerpt budget of
+# `max_chars` shrinks to `max_chars * ratio`, filled with the most
+# informative sentences of the first `max_chars / ratio` characters of the
+# corpus. The default 1.0 sends the first `max_chars` characters unchanged.
+# Measure the effect with benchmark_compression.py before turning it on.
+CONTEXT_KEEP_RATIOS = {
+    "single": float(os.environ.get("CONTEXT_KEEP_RATIO_SINGLE", "1.0")),
+    "compare": float(os.environ.get("CONTEXT_KEEP_RATIO_COMPARE", "1.0")),
+    "canada": float(os.environ.get("CONTEXT_KEEP_RATIO_CANADA", "1.0")),
+}
+# Scoring sentences against the question as well keeps more of what it asks
+# about, but the excerpt then differs per question and the prompt prefix can
+# no longer be served from the model's prompt cache. Off by default;
+# comparisons never use it (their excerpts are shared across questions).
+CONTEXT_FOCUS_ON_QUESTION = os.environ.get("CONTEXT_FOCUS_ON_QUESTION", "0") == "1"
+
+def excerpt_read_chars(mode: str, max_chars: int) -> int:
+    """How much of the corpus compression picks from for a `max_chars` excerpt in `mode`."""
+    ratio = CONTEXT_KEEP_RATIOS[mode]
+    return max_chars if ratio >= 1 else int(max_chars / ratio)
+
+def compress_excerpt(
+    text: str,
+    mode: str,
+    jurisdictions: list[str],
+    max_chars: int,
+    question: str | None = None,
+) -> str:
+    """
+    Drop the least informative sentences of a corpus head (read with
+    excerpt_read_chars) until it fits in the mode's share of `max_chars`,
+    scoring against the jurisdiction names, policy vocabulary and (with
+    CONTEXT_FOCUS_ON_QUESTION) the question.
+    """
+    ratio = CONTEXT_KEEP_RATIOS[mode]
+    if ratio >= 1 or not text:
+        return text[:max_chars]
+    focus = policy_focus(jurisdictions, question if CONTEXT_FOCUS_ON_QUESTION else None)
+    return compress_context(text, focus, int(max_chars * ratio))
+
+# ---- 4. SINGLE-JURISDICTION ANSWER ----
+def answer_ai_policy_question(
+    jurisdiction: str,
+    question: str,
+    on_delta: Callable[[str], None] | None = None,
+) -> str:
+    """
+    Use OpenAI to answer a question about AI policy for a given jurisdiction.
+    Includes a 'What this means in practice' section.
+
+    If `on_delta` is given, the model's reply is also streamed to it.
+    """
+
+    # Normalize jurisdiction name (e.g., 'federal' → 'Federal')
+    canonical = NORM_KEYS.get(jurisdiction.lower())
+    if canonical is None:
+        return f"⚠️ Unknown jurisdiction: {jurisdiction}"
+
+    # ----GUARDRAIL: BLOCK NON-CANADIAN QUESTIONS ----
+    if is_non_canadian_question(question):
+        return (
+            "This tool only covers AI policies and guidelines for Canadian governments "
+            "(federal, provincial, and territorial). It cannot summarize AI policies "
+            "for other countries or regions. Please ask about a Canadian government instead."
+        )
+
+    # Fetch or build the corpus
+    store = get_corpus_store()
+    load_jurisdiction_corpus(canonical)
+    corpus_len = store.length(canonical)
+    urls = JURISDICTION_SOURCES.get(canonical, [])
+
+    # Case 1: thin jurisdiction (no URLs configured)
+    if not urls:
+        return (
+        f"### AI Policy for {canonical}\n\n"
+        "At this time, no official AI policy documents, directives, or frameworks "
+        "were available for the app and this jurisdiction. "
+        "As a result, only general high-level guidance can be provided.\n\n"
+        f"**Your question:** {question}\n\n"
+        "You may wish to consult:\n"
+        "- The jurisdiction’s central government website\n"
+        "- Digital strategy pages\n"
+        "- Public service modernization or technology governance pages\n"
+        "- Provincial or territorial legislation websites\n"
+        )
+
+    # Case 2: URLs exist, but corpus is empty → fetch / parsing failure
+    if corpus_len == 0:
+        return (
+        f"### AI Policy for {canonical}\n\n"
+        "This app has configured official websites for this jurisdiction, "
+        "but could not retrieve or parse any text from them just now.\n\n"
+        "This is usually due to one of the following:\n"
+        "- Temporary network issues or timeouts\n"
+        "- The sites blocking automated requests\n"
+        "- A change in page structure that prevents text extraction\n\n"
+        "Please try again later, or consult the official sites directly:\n"
+        + "\n".join(f"- {u}" for u in urls)
+        )
+
+    # Case 3: Corpus exists but is too small / not substantial enough
+    if corpus_len < 1500:   # adjust this threshold as needed
+        return (
+        f"### Limited AI Policy Information for {canonical}\n\n"
+        "The curated sources for this jurisdiction currently contain only limited "
+        "public material related to AI, and no formal AI policy, directive, or "
+        "public-sector AI governance framework appears to be available.\n\n"
+        "The available link(s) reviewed were:\n"
+        + "\n".join(f"- {u}" for u in urls)
+        + "\n\nAs more AI governance material becomes available from this jurisdiction, "
+        "it will be incorporated into future summaries.\n"
+        )
+     
+    # Limit token load for GPT
+    max_chars = 16000
+    read_chars = excerpt_read_chars("single", max_chars)
+    trimmed_corpus = compress_excerpt(
+        store.head(canonical, read_chars), "single", [canonical], max_chars, question
+    )
+    artifact = Artifact(
+        "single", [canonical], question, _excerpt_sources(store, {canonical: read_chars})
+    )
+
+    system_prompt = (
+        "You are an expert assistant that summarizes and explains Canadian government "
+        "AI policies, directives, and frameworks in plain, non-legal language.\n"
+        "You do NOT provide legal advice. You focus on high-level practical implications "
+        "for public servants, decision-makers, and the public."
+    )
+
+    context_prompt = f"""
+The user is asking about AI policy for the **{canonical}** government in Canada.
+Their question follows in the next message.
+
+Below are excerpts from official policy/framework pages for this jurisdiction:
+\"\"\"{trimmed_corpus}\"\"\"
+
+### Instructions for your answer:
+- Begin with 2–4 short paragraphs that provide a clear, professional narrative response to the user’s question.
+- Explain the government’s AI-related policies, directives, frameworks, or guidance, and describe what they mean in practice for:
+  (a) public-sector organizations, and 
+  (b) external organizations wishing to align with this government’s approach to responsible AI.
+- Base all statements strictly on the excerpts provided. If the corpus does not address something the user asked about, state this clearly instead of guessing.
+- After the narrative, include a section titled **"Key points"** with 3–6 bullet points summarizing the most important ideas.
+- Include a section titled **"What this means in practice"** with one short paragraph and optional bullet points describing practical implications (e.g., transparency expectations, risk assessment duties, procurement considerations, disclosure rules).
+- End with a section titled **"Where to read more"** listing the main policies, directives, or strategy documents referenced (use bullet points).
+- Some excerpts are preceded by a marker such as "[Section title · pp. 3–4]". When you draw on those excerpts, cite the section and page(s) in "Where to read more".
+"""
+    question_prompt = f"""**User question:**  
+{question}"""
+
+    return complete_chat(
+        on_delta=on_delta,
+        model="gpt-4.1-mini",
+        messages=_prompt_messages(system_prompt, context_prompt, question_prompt),
+        temperature=0.2,
+        artifact=artifact,
+    )
+
+# ---- 5. TWO-GOVERNMENT COMPARISON (normalized + thin-aware) ----
+
+# Trim (to avoid token overload)
+COMPARE_MAX_CHARS = 12000
+
+def prepare_compare_context(jurisdiction: str) -> str:
+    """
+    The excerpts of one jurisdiction's corpus used in comparison prompts
+    (empty for thin jurisdictions).
+
+    Batch jobs prepare this once per jurisdiction and pass it to
+    compare_jurisdictions(contexts=...) for every pair it appears in.
+    """
+    canonical = load_jurisdiction_corpus(jurisdiction)
+    excerpt = get_corpus_store().head(canonical, excerpt_read_chars("compare", COMPARE_MAX_CHARS))
+    return compress_excerpt(excerpt, "compare", [canonical], COMPARE_MAX_CHARS)
+
+def compare_jurisdictions(
+    j1: str,
+    j2: str,
+    question: str | None = None,
+    on_delta: Callable[[str], None] | None = None,
+    contexts: dict[str, str] | None = None,
+) -> str:
+    """
+    Compare AI policies between two governments (e.g., 'Federal' vs 'Ontario').
+    Returns a structured comparison grounded in the corpus for both.
+
+    - Uses NORM_KEYS to normalize names.
+    - If either government has no corpus, returns a helpful explanation instead
+      of calling the model with empty context.
+    - If `on_delta` is given, the model's reply is also streamed to it.
+    - `contexts` may supply already prepared excerpts (see
+      prepare_compare_context), keyed by canonical jurisdiction name.
+    """
+    if not j1 or not j2:
+        return "Please select two governments before running a comparison."
+
+    if j1.lower() == j2.lower():
+        return "Please choose two different governments to compare."
+
+    # Guardrail: block comparisons about non-Canadian governments/regions
+    if question and is_non_canadian_question(question):
+        return (
+            "This comparison tool only covers AI policies and guidelines for Canadian governments "
+            "(federal, provincial, and territorial). It cannot compare AI policies for other "
+            "countries or regions. Please ask about Canadian governments instead."
+        )
+
+    c1 = NORM_KEYS.get(j1.lower())
+    c2 = NORM_KEYS.get(j2.lower())
+
+    if c1 is None or c2 is None:
+        return "One or both of the selected governments aren’t recognized in this app."
+
+    contexts = contexts or {}
+    corpus1_trim = contexts.get(c1)
+    if corpus1_trim is None:
+        corpus1_trim = prepare_compare_context(c1)
+    corpus2_trim = contexts.get(c2)
+    if corpus2_trim is None:
+        corpus2_trim = prepare_compare_context(c2)
+
+    # Handle thin or missing corpora
+    missing = []
+    if not corpus1_trim:
+        missing.append(c1)
+    if not corpus2_trim:
+        missing.append(c2)
+
+    if missing:
+        if len(missing) == 2:
+            return f"""
+I don’t yet have detailed AI policy sources configured for **{c1}** or **{c2}**, so I can’t provide a grounded comparison.
+
+You can still:
+- Explore the **Federal** government or other provinces with richer corpora.
+- Check the official websites for **{c1}** and **{c2}** for the most up-to-date AI, digital, or data strategies.
+""".strip()
+        else:
+            missing_name = missing[0]
+            present_name = c1 if missing_name == c2 else c2
+            return f"""
+I have detailed AI policy sources configured for **{present_name}**, but not yet for **{missing_name}**.
+
+What this means in practice:
+- I can’t provide a balanced, grounded comparison between **{present_name}** and **{missing_name}**.
+- You can still ask single-government questions about **{present_name}**.
+- For **{missing_name}**, please refer to its official government website for AI policy or digital strategy updates.
+""".strip()
+
+    artifact = Artifact(
+        "compare",
+        [c1, c2],
+        question,
+        _excerpt_sources(get_corpus_store(), dict.fromkeys([c1, c2], excerpt_read_chars("compare", COMPARE_MAX_CHARS))),
+    )
+
+    j1_label = c1
+    j2_label = c2
+
+    system_prompt = (
+        "You are an expert assistant in Canadian public-sector AI governance. "
+        "Compare and contrast AI policies from multiple governments based ONLY "
+        "on the provided excerpts. Do not invent information."
+    )
+
+    if question is None:
+        question = (
+            f"How do {j1_label} and {j2_label} differ in their AI policies, "
+            f"and what does this mean in practice for organizations operating in both?"
+        )
+
+    context_prompt = f"""
+The user is asking for a comparison of AI policies between:
+
+1. {j1_label}
+2. {j2_label}
+
+Their question follows in the next message.
+
+Below are excerpts from each government's official AI-related policy pages.
+
+--- BEGIN {j1_label.upper()} EXCERPTS ---
+{corpus1_trim}
+--- END {j1_label.upper()} EXCERPTS ---
+
+--- BEGIN {j2_label.upper()} EXCERPTS ---
+{corpus2_trim}
+--- END {j2_label.upper()} EXCERPTS ---
+
+Instructions:
+- Start with 2–4 short paragraphs that provide a clear, professional narrative comparison of how {j1_label} and {j2_label} approach AI policy and responsible AI, directly addressing the user’s question.
+- Explain both similarities and differences in terms of what they mean for:
+  (a) public-sector organizations within each jurisdiction, and
+  (b) external organizations (e.g., vendors, partners, nonprofits) that operate across or interact with both governments.
+- Reference the actual policy instruments by name where possible, and distinguish mandatory directives, legislation, or binding policy instruments from guidance, frameworks, or strategy documents.
+- After the narrative, include a section titled **"Where the policies appear aligned"** that starts with a short paragraph followed by bullet points summarizing the main areas of alignment.
+- Include a section titled **"Where the policies diverge"** that starts with a short paragraph followed by bullet points summarizing the key differences.
+- Include a section titled **"Implications for organizations operating in more than one jurisdiction or across Canada"** with one short paragraph plus bullet points highlighting practical implications (e.g., compliance, transparency expectations, procurement and vendor requirements, risk management).
+- If the text does not explicitly address something the user asked about, say so clearly rather than guessing.
+"""
+    question_prompt = f"""User question:
+{question}"""
+
+    return complete_chat(
+        on_delta=on_delta,
+        model="gpt-4.1-mini",
+        messages=_prompt_messages(system_prompt, context_prompt, question_prompt),
+        temperature=0.2,
+        artifact=artifact,
+    )
+
+# ---- CANADA-WIDE ANSWER (Updated and Consistent) ----
+def answer_canada_wide(question: str, on_delta: Callable[[str], None] | None = None) -> str:
+    """
+    Generate a Canada-wide overview by merging federal + all provincial/territorial corpora.
+    Includes a 'What this means in practice' section and 'Where to read more'.
+
+    If `on_delta` is given, the model's reply is also streamed to it.
+    """
+
+# Guardrail: ensure the question is actually about Canada / Canadian AI governance
+    if is_non_canadian_question(question):
+        return (
+            "This Canada-wide overview only covers AI policies and guidelines for Canadian governments "
+            "(federal, provincial, and territorial). It cannot summarize AI policies for other countries "
+            "or regions. Please ask a question about AI governance in Canada."
+        )
+    
+# Collect corpora from all jurisdictions that have content
+    store = get_corpus_store()
+    sources_used = []
+
+    for j in JURISDICTION_SOURCES.keys():
+        canonical = j  # already capitalized in our updated list
+        load_jurisdiction_corpus(canonical)
+
+        if store.length(canonical):
+            sources_used.append(canonical)
+
+    # If for some reason everything failed
+    if not sources_used:
+        return (
+            "### Canada-Wide AI Overview\n\n"
+            "At this time, the system could not retrieve any AI policy documents from the "
+            "curated federal, provincial, or territorial sources. Please try again later."
+        )
+
+    # Combine and limit for GPT (only the part that fits is ever built)
+    max_chars = 16000
+    taken: dict[str, int] = {}
+    trimmed = compress_excerpt(
+        _joined_corpora_head(store, sources_used, excerpt_read_chars("canada", max_chars), taken),
+        "canada",
+        sources_used,
+        max_chars,
+        question,
+    )
+    artifact = Artifact("canada", [], question, _excerpt_sources(store, taken))
+
+    system_prompt = (
+        "You are an expert assistant that summarizes and explains Canadian AI policy, directives, "
+        "frameworks, and guidelines in plain, non-legal language. You synthesize trends across federal, "
+        "provincial, and territorial governments.\n\n"
+        "You do NOT provide legal advice or definitive legal interpretations. You focus on high-level "
+        "practical implications for public servants, technology teams, leaders, and the public. You must "
+        "base your answers ONLY on the policy excerpts provided.\n\n"
+        "If the question is not about Canadian public-sector AI policy, or the answer is not supported "
+        "by excerpts, you must say so clearly instead of guessing.\n\n"
+        "If a user asks for harmful, adversarial, or off-topic content, explain that this tool is only "
+        "for understanding official Canadian government AI policies."
+    )
+
+    context_prompt = f"""
+The user is asking a Canada-wide question about public-sector AI policy.
+Their question follows in the next message.
+
+Below are excerpts from curated federal, provincial, and territorial AI policy or digital-governance sources:
+\"\"\"{trimmed}\"\"\"
+
+### Instructions for your answer:
+- First, write 2–4 short paragraphs giving a Canada-wide narrative overview of public-sector AI policy and responsible AI expectations, directly addressing the user’s question.
+- Describe major themes shared across governments (e.g., transparency, privacy, fairness, accountability, risk mitigation) and highlight meaningful differences (for example, federal mandatory directives or stronger requirements in certain provinces).
+- Explain what these patterns mean in practice for:
+  (a) public-sector organizations within individual jurisdictions, and 
+  (b) other organizations (e.g., vendors, partners, nonprofits) that operate across multiple jurisdictions in Canada.
+- After the narrative, add a brief section titled **"Key Canada-wide themes"** with 3–7 bullet points summarizing the main cross-jurisdictional ideas.
+- Include a section titled **"What this means in practice (Canada-wide)"** with one short paragraph and bullet points describing concrete implications for organizations (such as transparency expectations, disclosure practices, procurement and vendor requirements, and AI risk-management approaches).
+- End with a section titled **"Where to read more"** listing, in bullet points, the main jurisdictions and/or types of documents you are drawing on (e.g., federal directives, provincial strategies).
+- Do NOT guess about jurisdictions that have no corpus content — acknowledge any gaps clearly if they are relevant to the question.
+"""
+    question_prompt = f"""**User question:**  
+{question}"""
+
+    return complete_chat(
+        on_delta=on_delta,
+        model="gpt-4.1-mini",
+        messages=_prompt_messages(system_prompt, context_prompt, question_prompt),
+        temperature=0.2,
+        artifact=artifact,
+    )
+
+# ---- Source refresh (change-driven regeneration) ----
+# Refreshing a corpus fetches its sources again. For every source whose text
+# changed, the answers generated from the old text are dropped from the
+# answer cache and regenerated in the background, and the change is written
+# to the audit log (SOURCE_CHANGE_LOG) with a diff. Answers whose excerpts
+# didn't draw on a changed source keep their cache entries, so model spend
+# follows how often the policies change. CORPUS_REFRESH_SECONDS > 0 refreshes
+# loaded corpora periodically; see also `python source_changes.py refresh`.
+_source_changes = change_log_from_env()
+CORPUS_REFRESH_SECONDS = float(os.environ.get("CORPUS_REFRESH_SECONDS", "0"))
+REGENERATION_WORKERS = int(os.environ.get("REGENERATION_WORKERS", "2"))
+_regeneration_pool = ThreadPoolExecutor(max_workers=REGENERATION_WORKERS, thread_name_prefix="regenerate")
+_regenerations: set[Future] = set()
+_regenerations_lock = threading.Lock()
+
+def refresh_jurisdiction_corpus(jurisdiction: str) -> list[dict]:
+    """
+    Fetch a jurisdiction's sources again, invalidate and regenerate the
+    answers affected by any change, and return the change-log entries
+    written (one per changed source).
+
+    With a shared cache backend only one worker refreshes a jurisdiction at
+    a time; the others just drop their copy and read the shared corpus.
+    """
+    canonical = NORM_KEYS.get((jurisdiction or "").lower())
+    if canonical is None:
+        raise ValueError(f"Unknown jurisdiction: {jurisdiction!r}")
+
+    with hold_lease(_cache_backend, f"lease:refresh:{canonical}", CORPUS_BUILD_LEASE_SECONDS) as held:
+        if held:
+            return get_single_flight("corpus").do(f"refresh:{canonical}", _refresh_corpus_now, canonical)
+    get_corpus_store().reload(canonical)
+    return []
+
+def _refresh_corpus_now(canonical: str) -> list[dict]:
+    store = get_corpus_store()
+    if not store.has(canonical):
+        # Nothing can have been generated from it yet
+        _load_corpus_now(canonical)
+        return []
+
+    before = {r.url: (r.digest, bytes(store.compressed_blob(r))) for r in store.sources(canonical)}
+    _build_jurisdiction_corpus(canonical, refresh=True)
+    after = {r.url: r for r in store.sources(canonical)}
+
+    entries = []
+    stale: dict[str, Artifact] = {}
+    for url in [*before, *(u for u in after if u not in before)]:
+        old_digest, old_blob = before.get(url, (None, None))
+        record = after.get(url)
+        new_digest = record.digest if record is not None else None
+        if old_digest == new_digest:
+            continue
+
+        old_text = zlib.decompress(old_blob).decode("utf-8") if old_blob is not None else ""
+        new_text = store.source_text(record) if record is not None else ""
+        keys = _dependencies.dependents(url, old_digest) if old_digest else []
+        for key in keys:
+            artifact = _dependencies.get(key)
+            if artifact is not None:
+                stale[key] = artifact
+        entry = {
+            "jurisdiction": canonical,
+            "url": url,
+            "old_digest": old_digest,
+            "new_digest": new_digest,
+            "old_chars": len(old_text),
+            "new_chars": len(new_text),
+            "invalidated": keys,
+            "diff": source_diff(url, old_text, new_text),
+        }
+        _source_changes.append(entry)
+        entries.append(entry)
+        print(f"[refresh_jurisdiction_corpus] {url} changed; {len(keys)} answers invalidated")
+
+    # The same question may have been answered under different settings;
+    # regenerate it once
+    pending = {}
+    for key, artifact in stale.items():
+        _answer_cache.discard(key)
+        _dependencies.forget(key)
+        pending[(artifact.kind, tuple(artifact.jurisdictions), artifact.question)] = artifact
+    for artifact in pending.values():
+        _schedule_regeneration(artifact)
+    if entries:
+        _cache_warmer.wake()
+    return entries
+
+def _schedule_regeneration(artifact: Artifact) -> None:
+    future = _regeneration_pool.submit(_regenerate, artifact)
+    with _regenerations_lock:
+        _regenerations.add(future)
+
+    def _finished(done: Future) -> None:
+        with _regenerations_lock:
+            _regenerations.discard(done)
+
+    future.add_done_callback(_finished)
+
+def _answer_artifact(artifact: Artifact) -> str:
+    """Answer the artifact's question again (which caches the new answer)."""
+    if artifact.kind == "single":
+        return answer_ai_policy_question(artifact.jurisdictions[0], artifact.question)
+    if artifact.kind == "compare":
+        return compare_jurisdictions(*artifact.jurisdictions, artifact.question)
+    return answer_canada_wide(artifact.question)
+
+def _regenerate(artifact: Artifact) -> None:
+    try:
+        _answer_artifact(artifact)
+    except Exception as e:
+        print(f"[refresh_jurisdiction_corpus] Error regenerating {artifact.kind} answer "
+              f"for {artifact.jurisdictions}: {e}")
+
+def wait_for_regeneration(timeout: float | None = None) -> bool:
+    """Wait for scheduled regenerations to finish; True if none are left."""
+    with _regenerations_lock:
+        pending = list(_regenerations)
+    return not wait_futures(pending, timeout=timeout).not_done
+
+def _refresh_loop() -> None:
+    while True:
+        time.sleep(CORPUS_REFRESH_SECONDS)
+        for canonical in JURISDICTION_SOURCES:
+            if not get_corpus_store().has(canonical):
+                continue
+            try:
+                refresh_jurisdiction_corpus(canonical)
+            except Exception as e:
+                print(f"[refresh_jurisdiction_corpus] Error refreshing {canonical}: {e}")
+
+if CORPUS_REFRESH_SECONDS > 0:
+    threading.Thread(target=_refresh_loop, name="corpus-refresh", daemon=True).start()
+
+# ---- Cache warming ----
+# Questions asked through the app and API are counted; whenever the corpus
+# version changes (refresh, new snapshot, deploy), the CACHE_WARM_TOP_N most
+# asked - topped up with the example questions - are answered again in the
+# background, at most CACHE_WARM_PER_MINUTE a minute, so popular questions
+# stay at cache-hit latency. Off unless CACHE_WARM_TOP_N > 0 (warming calls
+# the model); see also `python cache_warming.py`.
+CACHE_WARM_TOP_N = int(os.environ.get("CACHE_WARM_TOP_N", "0"))
+CACHE_WARM_PER_MINUTE = float(os.environ.get("CACHE_WARM_PER_MINUTE", "10"))
+CACHE_WARM_CHECK_SECONDS = float(os.environ.get("CACHE_WARM_CHECK_SECONDS", "300"))
+_query_stats = QueryStats(backend=_cache_backend)
+# Counts are batched; write the last ones before the process exits
+atexit.register(_query_stats.flush)
+
+def get_query_stats() -> QueryStats:
+    return _query_stats
+
+def record_query(mode: str, jurisdictions: list[str], question: str | None) -> None:
+    """
+    Count a question a user got an answer to ("single", "compare" or
+    "canada" mode). Questions the guardrail turns away aren't counted.
+    """
+    if question and is_non_canadian_question(question):
+        return
+    names = [NORM_KEYS.get(j.lower(), j) for j in jurisdictions]
+    _query_stats.record(mode, names, question)
+
+def corpus_version(jurisdictions: list[str] | None = None) -> str | None:
+    """
+    Identifies the texts of every available corpus; changes whenever one of
+    them does.
+
+    With `jurisdictions`, only their corpora count (in any order), and the
+    result is None if one of them isn't loaded - so results stored with it
+    (e.g. comparison_matrix.py's) can be recognised as stale later.
+    """
+    store = get_corpus_store()
+    if jurisdictions is None:
+        names = list(JURISDICTION_SOURCES)
+    else:
+        names = sorted(NORM_KEYS.get(j.lower(), j) for j in jurisdictions)
+        if not all(store.has(name) for name in names):
+            return None
+    digest = hashlib.sha256()
+    for canonical in names:
+        for r in store.sources(canonical):
+            digest.update(f"{canonical}\0{r.url}\0{r.digest}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def _warm_candidates(n: int) -> list[PopularQuery]:
+    """The `n` most asked questions, then the example questions, without repeats."""
+    queries = {q.key: q for q in _query_stats.top(n)}
+    examples = [PopularQuery("canada", [], q) for q in example_questions("canada")]
+    examples += [
+        PopularQuery("single", [canonical], q)
+        for canonical, urls in JURISDICTION_SOURCES.items() if urls
+        for q in example_questions("single", gov=canonical)
+    ]
+    for query in examples:
+        if len(queries) >= n:
+            break
+        queries.setdefault(query.key, query)
+    return list(queries.values())
+
+def _answer_popular(query: PopularQuery) -> str:
+    return _answer_artifact(Artifact(query.mode, query.jurisdictions, query.question))
+
+_cache_warmer = CacheWarmer(
+    _warm_candidates,
+    _answer_popular,
+    corpus_version,
+    top_n=CACHE_WARM_TOP_N or 20,
+    per_minute=CACHE_WARM_PER_MINUTE,
+    backend=_cache_backend,
+)
+
+def get_cache_warmer() -> CacheWarmer:
+    return _cache_warmer
+
+if CACHE_WARM_TOP_N > 0:
+    _cache_warmer.start(CACHE_WARM_CHECK_SECONDS)
@@ -0,0 +1,196 @@
+# profiling.py
+#
+# Opt-in sampling profiler for answer requests, to see whether a slow answer
+# spent its time fetching, parsing PDFs or HTML, in the guardrail, building
+# the prompt or waiting for the model. A background thread samples the
+# answer's stack (and the corpus-loading threads it waits on) every few
+# milliseconds; nothing is sampled unless profiling is switched on.
+#
+#   PROFILE_ANSWERS=1             profile every answer
+#   PROFILE_SLOW_SECONDS=20       sample every answer, keep the profiles of
+#                                 those that take longer than this
+#   PROFILE_ADMIN_TOKEN=<secret>  profile single requests: ?profile=<secret>
+#                                 on the app URL or an API request
+#   PROFILE_DIR=profiles          where profiles are written
+#   PROFILE_INTERVAL_MS=5         sampling interval
+#
+# Profiles are written as collapsed stacks ("frame;frame;frame count" per
+# line), named after the time, mode and jurisdictions. Open them in
+# speedscope (https://www.speedscope.app) or render them with flamegraph.pl:
+#
+#     flamegraph.pl profiles/20250101-120000.123_single_Ontario_slow.folded > ontario.svg
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable
+
+PROFILE_ANSWERS = os.environ.get("PROFILE_ANSWERS", "0") == "1"
+PROFILE_SLOW_SECONDS = float(os.environ.get("PROFILE_SLOW_SECONDS", "0"))
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN") or None
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # co_qualname (Class.method) is new in Python 3.11
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# ---- Work done on an answer's behalf ----
+# Background work an answer may wait for (a corpus load) runs under a tag,
+# and a thread waiting for it names the same tag, so the answer's profile
+# includes the threads doing that work - and nothing else their pool is
+# busy with for other requests.
+_tags_lock = threading.Lock()
+_working: dict[str, set[int]] = {}  # tag -> threads doing that work
+_waiting: dict[int, set[str]] = {}  # thread -> tags it is waiting for
+
+
+@contextmanager
+def _registered(table: dict, key, value):
+    with _tags_lock:
+        table.setdefault(key, set()).add(value)
+    try:
+        yield
+    finally:
+        with _tags_lock:
+            values = table[key]
+            values.discard(value)
+            if not values:
+                del table[key]
+
+
+def working_on(tag: str):
+    """Context manager marking the current thread as doing the work named `tag`."""
+    return _registered(_working, tag, threading.get_ident())
+
+
+def waiting_for(tag: str):
+    """Context manager marking the current thread as waiting for the work named `tag`."""
+    return _registered(_waiting, threading.get_ident(), tag)
+
+
+def helper_threads(thread_id: int) -> set[int]:
+    """The threads currently doing work that `thread_id` is waiting for."""
+    with _tags_lock:
+        return {ident for tag in _waiting.get(thread_id, ()) for ident in _working.get(tag, ())}
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread (plus the helper_threads() doing work
+    it waits for) every `interval` seconds from a background thread,
+    counting identical stacks.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        names: dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            helpers = helper_threads(self.thread_id)
+            if not helpers.issubset(names):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident in [self.thread_id, *helpers]:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                name = "answer" if ident == self.thread_id else names.get(ident, "worker")
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """The samples as collapsed stacks, one "frame;frame count" line per stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_frames(self, n: int = 5) -> list[tuple[str, int]]:
+        """The `n` innermost frames seen most often (where the time went)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+    def save(self, name: str, directory: str = PROFILE_DIR) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{_UNSAFE_NAME.sub('-', name)}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        return path
+
+
+def profile_requested(token: str | None) -> bool:
+    """True if `token` (e.g. a ?profile= query parameter) matches PROFILE_ADMIN_TOKEN."""
+    return PROFILE_ADMIN_TOKEN is not None and token == PROFILE_ADMIN_TOKEN
+
+
+@contextmanager
+def profile_answer(mode: str, jurisdictions: list[str], force: bool = False):
+    """
+    Profile the answer generated in the `with` block, if profiling is on
+    (or `force`), and save the profile unless it was only sampled for the
+    slow-request threshold and finished in time.
+    """
+    if not (force or PROFILE_ANSWERS or PROFILE_SLOW_SECONDS > 0):
+        yield None
+        return
+
+    profiler = SamplingProfiler(threading.get_ident())
+    profiler.start()
+    started = time.monotonic()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        elapsed = time.monotonic() - started
+        slow = PROFILE_SLOW_SECONDS > 0 and elapsed >= PROFILE_SLOW_SECONDS
+        if force or PROFILE_ANSWERS or slow:
+            reason = "slow" if slow else "requested"
+            stamp = time.strftime("%Y%m%d-%H%M%S") + f".{int(time.time() * 1000) % 1000:03d}"
+            name = "_".join([stamp, mode, *jurisdictions, reason])
+            path = profiler.save(name)
+            top = ", ".join(f"{frame} ×{count}" for frame, count in profiler.top_frames(3))
+            print(f"[profile_answer] {mode} answer took {elapsed:.1f} s; "
+                  f"{profiler.samples} samples in {path} (top: {top})")
+
+
+def profiled(fn: Callable, mode: str, jurisdictions: list[str], force: bool = False) -> Callable:
+    """
+    `fn` wrapped in profile_answer(), or `fn` itself when profiling is off,
+    so unprofiled answers pay nothing.
+    """
+    if not (force or PROFILE_ANSWERS or PROFILE_SLOW_SECONDS > 0):
+        return fn
+
+    def run(*args, **kwargs):
+        with profile_answer(mode, jurisdictions, force):
+            return fn(*args, **kwargs)
+
+    return run
@@ -0,0 +1,314 @@
+# ratelimit.py
+#
+# Client-side rate limiting for OpenAI calls. One RateLimiter is shared by
+# every Streamlit session in the process so that bursts of users queue up in
+# arrival order instead of all hitting the provider at once.
+
+import bisect
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable
+
+# How often waiting callers re-run their cancellation check
+CHECK_INTERVAL_SECONDS = 0.25
+
+
+# ---- Token bucket ----
+class TokenBucket:
+    """
+    A bucket that refills continuously at `per_minute` units per minute.
+
+    `reserve()` always succeeds and returns how long the caller must wait
+    before the reserved units are actually available. The balance is allowed
+    to go negative so that large requests are not starved by small ones.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = float(per_minute)
+        self.capacity = float(per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.per_minute / 60.0)
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` units and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60.0 / self.per_minute
+
+    def refund(self, amount: float) -> None:
+        """Give back units that were reserved but not used (may be negative)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+# ---- Shared limiter (requests/min + tokens/min + concurrency) ----
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets plus a bounded
+    concurrency gate around model calls.
+
+    - Callers are admitted strictly in arrival order (FIFO), so one busy
+      session cannot starve the others.
+    - A 429 from the provider pauses every caller until its Retry-After
+      time has passed, rather than letting the rest of the queue pile on.
+      The retry keeps its original place in the queue.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, int(max_concurrency))
+
+        self._cond = threading.Condition()
+        self._arrivals = itertools.count()
+        # Tickets (arrival numbers) of the waiting callers, in order
+        self._queue: list[int] = []
+        self._active = 0
+        self._paused_until = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (used when the provider returns 429)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def ticket(self) -> int:
+        """A place in the queue, in arrival order (see `slot`)."""
+        return next(self._arrivals)
+
+    @contextmanager
+    def slot(self, estimated_tokens: int, check: Callable[[], None] | None = None, ticket: int | None = None):
+        """
+        Block until this caller may send a request, then hold a concurrency
+        slot for the duration of the `with` block.
+
+        - `check()` is called periodically while waiting; if it raises, the
+          caller leaves the queue (returning any reserved capacity and its
+          slot) and the exception propagates.
+        - A caller retrying a request passes the `ticket` it first queued
+          with, so it goes back in ahead of everyone who arrived after it.
+        """
+        def wait(seconds: float | None) -> None:
+            if check is not None:
+                check()
+                seconds = CHECK_INTERVAL_SECONDS if seconds is None else min(seconds, CHECK_INTERVAL_SECONDS)
+            self._cond.wait(seconds)
+
+        if ticket is None:
+            ticket = self.ticket()
+        with self._cond:
+            bisect.insort(self._queue, ticket)
+            try:
+                # Wait for our turn at the head of the queue and a free slot.
+                while True:
+                    now = time.monotonic()
+                    if self._paused_until > now:
+                        wait(self._paused_until - now)
+                        continue
+                    if self._queue[0] == ticket and self._active < self.max_concurrency:
+                        break
+                    wait(None)
+
+                # Still at the head: take the slot (so a retry queued ahead of
+                # us meanwhile can't overrun the limit), then wait for bucket
+                # capacity so later callers keep their order - and for any
+                # pause that started in the meantime.
+                self._active += 1
+                delay = max(
+                    self.requests.reserve(1),
+                    self.tokens.reserve(estimated_tokens),
+                )
+                deadline = time.monotonic() + delay
+                try:
+                    while (remaining := max(deadline, self._paused_until) - time.monotonic()) > 0:
+                        wait(remaining)
+                except BaseException:
+                    self._active -= 1
+                    self.requests.refund(1)
+                    self.tokens.refund(estimated_tokens)
+                    raise
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int | None) -> None:
+        """Correct the token bucket once the real usage of a call is known."""
+        if actual_tokens is not None:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+
+def limiter_from_env() -> RateLimiter:
+    """Build a RateLimiter from OPENAI_RPM / OPENAI_TPM / OPENAI_MAX_CONCURRENCY."""
+    return RateLimiter(
+        requests_per_minute=float(os.environ.get("OPENAI_RPM", "500")),
+        tokens_per_minute=float(os.environ.get("OPENAI_TPM", "200000")),
+        max_concurrency=int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8")),
+    )
+
+
+# ---- Retry helpers ----
+def _retry_after_seconds(exc: Exception) -> float | None:
+    """Read Retry-After (or retry-after-ms) from an API error's response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    return getattr(exc, "status_code", None) == 429
+
+
+def estimate_tokens(messages: list[dict], completion_allowance: int = 1500) -> int:
+    """Rough token estimate (about 4 characters per token) plus room for the reply."""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 4 + completion_allowance
+
+
+def _call_with_retries(limiter: RateLimiter, estimated: int, max_retries: int, call, check=None):
+    """
+    Run `call()` under the limiter, retrying 429s.
+
+    `call` returns `(result, total_tokens_or_None)`. 429 responses are
+    retried with exponential backoff (plus jitter); when the provider sends
+    Retry-After, that delay is used instead and applied to the whole
+    limiter. Other errors are raised unchanged. `check` (see
+    RateLimiter.slot) can abandon the call while it is waiting.
+    """
+    ticket = limiter.ticket()
+    for attempt in range(max_retries + 1):
+        with limiter.slot(estimated, check, ticket):
+            try:
+                result, actual_tokens = call()
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == max_retries:
+                    raise
+                delay = _retry_after_seconds(e)
+                if delay is None:
+                    delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                print(f"[create_chat_completion] Rate limited, retrying in {delay:.1f}s")
+                limiter.record_usage(estimated, 0)
+                limiter.pause(delay)
+            else:
+                limiter.record_usage(estimated, actual_tokens)
+                return result
+
+
+def create_chat_completion(client, limiter: RateLimiter, max_retries: int = 5, check=None, **kwargs):
+    """Call `client.chat.completions.create(**kwargs)` under the shared limiter, retrying 429s."""
+    def call():
+        response = client.chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        return response, getattr(usage, "total_tokens", None)
+
+    estimated = estimate_tokens(kwargs.get("messages", []))
+    return _call_with_retries(limiter, estimated, max_retries, call, check)
+
+
+def stream_chat_completion(
+    client,
+    limiter: RateLimiter,
+    on_delta,
+    max_retries: int = 5,
+    on_usage=None,
+    check=None,
+    on_stream=None,
+    **kwargs,
+) -> str:
+    """
+    Streaming variant of create_chat_completion: `on_delta(text)` is called
+    for each piece of the reply as it arrives, and the full reply text is
+    returned. The concurrency slot is held until the stream is finished.
+
+    - `on_usage(usage)` receives the usage reported at the end of the stream.
+    - `on_stream(stream)` receives the open stream, so another thread can
+      `close()` it to abort the request at the network level.
+    - `check()` is called between pieces; if the stream fails because it was
+      closed that way, the exception from `check()` is raised instead.
+    """
+    def call():
+        stream = client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        if on_stream is not None:
+            on_stream(stream)
+        parts: list[str] = []
+        total_tokens = None
+        try:
+            for chunk in stream:
+                if check is not None:
+                    check()
+                if chunk.usage is not None:
+                    total_tokens = chunk.usage.total_tokens
+                    if on_usage is not None:
+                        on_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    on_delta(chunk.choices[0].delta.content)
+        except Exception:
+            if check is not None:
+                check()
+            raise
+        finally:
+            stream.close()
+        if check is not None:
+            check()
+        return "".join(parts), total_tokens
+
+    estimated = estimate_tokens(kwargs.get("messages", []))
+    return _call_with_retries(limiter, estimated, max_retries, call, check)
@@ -0,0 +1,67 @@
+# singleflight.py
+#
+# Request coalescing: when several callers ask for the same piece of work at
+# the same time, only the first one does it and the others wait for (and
+# share) its result.
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    De-duplicate concurrent calls by key.
+
+    - The first caller for a key runs the function.
+    - Callers that arrive while it is running block until it finishes and
+      receive the same result (or the same exception).
+    - Nothing is remembered afterwards; caching is left to the caller.
+    - If `poll` is given, waiting callers call it a few times a second; an
+      exception it raises stops that caller waiting (the call itself keeps
+      running for the others).
+    """
+
+    def __init__(self, poll=None, poll_interval: float = 0.25):
+        self._lock = threading.Lock()
+        self._calls: dict[object, _Call] = {}
+        self.poll = poll
+        self.poll_interval = poll_interval
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` once per in-flight `key` and return its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if self.poll is None:
+                call.done.wait()
+            while not call.done.wait(self.poll_interval):
+                self.poll()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -0,0 +1,223 @@
+# snapshot.py
+#
+# Packed corpus snapshots, so a new container can answer questions without
+# fetching 40+ government URLs first. A snapshot bundles every jurisdiction's
+# compressed source texts, passage boundaries (sections and pages) and
+# source metadata in one file. The engine memory-maps it at startup
+# (CORPUS_SNAPSHOT_PATH): texts are decompressed only when read, and the
+# mapped pages are shared by every worker process on the host.
+#
+#     python snapshot.py export --output corpus.snapshot      # fetches everything once
+#     python snapshot.py info corpus.snapshot
+#     python snapshot.py import corpus.snapshot               # into POLICY_CACHE_URL / _PATH
+#
+# File layout (little-endian):
+#   8 bytes   magic b"PWCSNAP\0"
+#   4 bytes   format version (uint32)
+#   8 bytes   manifest length N (uint64)
+#   N bytes   manifest (UTF-8 JSON, see write_snapshot)
+#   ...       compressed source blobs, at offsets relative to the end of the manifest
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+
+from corpus_store import CompressedSource, CorpusStore, SourceRecord
+
+SNAPSHOT_MAGIC = b"PWCSNAP\0"
+SNAPSHOT_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIQ")
+
+
+class CorpusSnapshot:
+    """
+    A snapshot file opened read-only through mmap.
+
+    - `records()` gives a jurisdiction's sources as stored, or None if the
+      snapshot doesn't include it.
+    - `blob()` returns a zero-copy view of a compressed source text.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, manifest_length = _HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a corpus snapshot.")
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported corpus snapshot version in {path}: {version}")
+        start = _HEADER.size
+        self.manifest = json.loads(self._map[start:start + manifest_length].decode("utf-8"))
+        self._data_offset = start + manifest_length
+        self._view = memoryview(self._map)
+
+    @property
+    def created(self) -> str:
+        return self.manifest["created"]
+
+    def jurisdictions(self) -> list[str]:
+        return list(self.manifest["jurisdictions"])
+
+    def records(self, jurisdiction: str) -> list[SourceRecord] | None:
+        entries = self.manifest["jurisdictions"].get(jurisdiction)
+        if entries is None:
+            return None
+        return [
+            SourceRecord(url, digest, length, tuple(tuple(span) for span in spans))
+            for url, digest, length, spans in entries
+        ]
+
+    def blob(self, digest: str) -> memoryview | None:
+        location = self.manifest["blobs"].get(digest)
+        if location is None:
+            return None
+        offset, size = location
+        start = self._data_offset + offset
+        return self._view[start:start + size]
+
+    def source_info(self, url: str) -> dict | None:
+        return self.manifest["sources"].get(url)
+
+
+def write_snapshot(
+    path: str,
+    store: CorpusStore,
+    jurisdictions: list[str],
+    source_info: dict[str, dict] | None = None,
+) -> dict:
+    """
+    Write the given jurisdictions' corpora from `store` to a snapshot file
+    (atomically) and return its manifest.
+
+    The manifest holds `format_version`, `created`, `jurisdictions` (name ->
+    [url, digest, length, spans] per source), `blobs` (digest -> [offset,
+    size]), `sources` (url -> metadata such as when it was fetched) and
+    `indexes` (reserved for prebuilt retrieval data).
+    """
+    blobs: dict[str, bytes] = {}
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "jurisdictions": {},
+        "blobs": {},
+        "sources": source_info or {},
+        "indexes": {},
+    }
+    offset = 0
+    for jurisdiction in jurisdictions:
+        records = store.sources(jurisdiction)
+        manifest["jurisdictions"][jurisdiction] = [
+            [r.url, r.digest, r.length, r.spans] for r in records
+        ]
+        for r in records:
+            if r.digest not in manifest["blobs"]:
+                blob = bytes(store.compressed_blob(r))
+                blobs[r.digest] = blob
+                manifest["blobs"][r.digest] = [offset, len(blob)]
+                offset += len(blob)
+
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(manifest_bytes)))
+        f.write(manifest_bytes)
+        # Blobs go in manifest order, so offsets are cumulative sizes
+        for digest in manifest["blobs"]:
+            f.write(blobs[digest])
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def snapshot_from_env() -> CorpusSnapshot | None:
+    """The snapshot at CORPUS_SNAPSHOT_PATH, or None if unset or missing."""
+    path = os.environ.get("CORPUS_SNAPSHOT_PATH")
+    if not path:
+        return None
+    if not os.path.exists(path):
+        print(f"[snapshot] CORPUS_SNAPSHOT_PATH={path} does not exist; starting without a snapshot")
+        return None
+    snapshot = CorpusSnapshot(path)
+    print(f"[snapshot] Using corpus snapshot {path} from {snapshot.created}")
+    return snapshot
+
+
+# ---- Command line ----
+def export_snapshot(output: str, jurisdictions: list[str] | None = None) -> dict:
+    """Build (or reuse) every corpus through the engine and write them to `output`."""
+    import policy_engine
+
+    names = jurisdictions or list(policy_engine.JURISDICTION_SOURCES)
+    for name in names:
+        policy_engine.load_jurisdiction_corpus(name)
+
+    store = policy_engine.get_corpus_store()
+    health = policy_engine.get_source_health()
+    source_info = {}
+    for name in names:
+        for record in store.sources(name):
+            record_health = health.get(record.url)
+            source_info[record.url] = {
+                "jurisdiction": name,
+                "chars": record.length,
+                "fetched": record_health.last_success,
+            }
+    return write_snapshot(output, store, names, source_info)
+
+
+def import_snapshot(path: str) -> int:
+    """Copy a snapshot's corpora into the shared cache backend; returns how many."""
+    from cache_backend import backend_from_env
+
+    backend = backend_from_env()
+    if backend is None:
+        raise SystemExit("Set POLICY_CACHE_URL or POLICY_CACHE_PATH to import into a shared cache.")
+
+    snapshot = CorpusSnapshot(path)
+    store = CorpusStore(backend=backend)
+    for name in snapshot.jurisdictions():
+        sources = []
+        for r in snapshot.records(name):
+            blob = bytes(snapshot.blob(r.digest))
+            sources.append((r.url, CompressedSource(r.url, blob, r.digest, r.length, r.spans)))
+        store.put(name, sources)
+    return len(snapshot.jurisdictions())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export, inspect or import corpus snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="build all corpora and write a snapshot")
+    export.add_argument("--output", default="corpus.snapshot", help="snapshot file to write")
+    export.add_argument("--jurisdictions", default=None, help="comma-separated subset (default: all)")
+
+    info = commands.add_parser("info", help="summarize a snapshot")
+    info.add_argument("path")
+
+    load = commands.add_parser("import", help="copy a snapshot into the shared cache backend")
+    load.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        names = [name.strip() for name in args.jurisdictions.split(",")] if args.jurisdictions else None
+        manifest = export_snapshot(args.output, names)
+        size = os.path.getsize(args.output)
+        print(f"Wrote {args.output}: {len(manifest['jurisdictions'])} jurisdictions, "
+              f"{len(manifest['blobs'])} source texts, {size} bytes")
+    elif args.command == "info":
+        snapshot = CorpusSnapshot(args.path)
+        print(f"{args.path}: format {SNAPSHOT_FORMAT_VERSION}, created {snapshot.created}")
+        for name in snapshot.jurisdictions():
+            records = snapshot.records(name)
+            print(f"  {name:<28} {len(records):>3} sources {sum(r.length for r in records):>9} chars")
+    else:
+        count = import_snapshot(args.path)
+        print(f"Imported {count} jurisdictions from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# source_changes.py
+#
+# Change-driven regeneration. Every generated answer is recorded together
+# with the source texts (URL + content digest) its prompt excerpt was taken
+# from. When a corpus is refreshed and a source's text has changed, only the
+# answers that used the old text are dropped from the answer cache and
+# regenerated in the background; everything else stays cached. Each change
+# is appended to an audit log with a diff of the source text.
+#
+#     python source_changes.py refresh                          # re-fetch every corpus
+#     python source_changes.py refresh --jurisdictions Ontario
+#     python source_changes.py log --limit 5                    # recent changes with diffs
+#
+# `refresh` works on the shared cache the app uses (POLICY_CACHE_URL or
+# POLICY_CACHE_PATH must be set); running workers pick up refreshed corpora
+# within CORPUS_SYNC_SECONDS.
+#
+# Set CORPUS_REFRESH_SECONDS to have the engine refresh loaded corpora
+# periodically, and SOURCE_CHANGE_LOG to choose the audit log file
+# (default: source_changes.jsonl).
+
+import argparse
+import difflib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+
+# Longest diff kept per change in the audit log, in lines
+MAX_DIFF_LINES = 400
+
+
+@dataclass
+class Artifact:
+    """
+    Something generated from corpus text, and how to generate it again.
+
+    - `kind` is the answer mode: "single", "compare" or "canada".
+    - `sources` maps each source URL the prompt excerpt drew from to the
+      digest of the text it used.
+    """
+    kind: str
+    jurisdictions: list[str]
+    question: str | None
+    sources: dict[str, str] = field(default_factory=dict)
+
+
+class DependencyTracker:
+    """
+    Thread-safe map from generated artifacts (by answer cache key) to the
+    source texts they were built from, with a reverse index by URL.
+
+    - `dependents(url, digest)` lists the artifacts built from that exact
+      text of `url`, i.e. the ones a change to it makes stale.
+    - The least recently recorded artifacts are forgotten once
+      `max_entries` is reached (their answers age out of the cache too).
+    - With a shared `backend` (see cache_backend.py), the records are shared
+      between processes, so whichever worker refreshes a corpus finds the
+      answers every worker generated. The reverse index is kept as one
+      backend set per source text (URL + digest), added to atomically, with
+      members expiring after `ttl_seconds` like the answers they point to.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float | None = None, backend=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._artifacts: OrderedDict[str, Artifact] = OrderedDict()
+        self._by_source: dict[str, set[str]] = {}
+
+    def record(self, key: str, artifact: Artifact) -> None:
+        with self._lock:
+            if key in self._artifacts:
+                return
+            self._remember(key, artifact)
+        if self.backend is not None:
+            self.backend.set(
+                f"deps:artifact:{key}",
+                json.dumps(asdict(artifact)).encode("utf-8"),
+                ttl_seconds=self.ttl_seconds,
+            )
+            for url, digest in artifact.sources.items():
+                self.backend.add_members(_source_key(url, digest), [key], ttl_seconds=self.ttl_seconds)
+
+    def _remember(self, key: str, artifact: Artifact) -> None:
+        self._artifacts[key] = artifact
+        for url in artifact.sources:
+            self._by_source.setdefault(url, set()).add(key)
+        while len(self._artifacts) > self.max_entries:
+            old_key, old = self._artifacts.popitem(last=False)
+            self._unindex(old_key, old)
+
+    def _unindex(self, key: str, artifact: Artifact) -> None:
+        for url in artifact.sources:
+            keys = self._by_source.get(url)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_source[url]
+
+    def get(self, key: str) -> Artifact | None:
+        with self._lock:
+            artifact = self._artifacts.get(key)
+        if artifact is None and self.backend is not None:
+            raw = self.backend.get(f"deps:artifact:{key}")
+            if raw is not None:
+                artifact = Artifact(**json.loads(raw))
+        return artifact
+
+    def dependents(self, url: str, digest: str) -> list[str]:
+        """Keys of the artifacts built from `url` while its text had `digest`."""
+        with self._lock:
+            keys = set(self._by_source.get(url, ()))
+        if self.backend is not None:
+            keys.update(self.backend.members(_source_key(url, digest)))
+        found = []
+        for key in sorted(keys):
+            artifact = self.get(key)
+            if artifact is not None and artifact.sources.get(url) == digest:
+                found.append(key)
+        return found
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            artifact = self._artifacts.pop(key, None)
+            if artifact is not None:
+                self._unindex(key, artifact)
+        if self.backend is not None:
+            if artifact is None:
+                artifact = self.get(key)
+            self.backend.delete(f"deps:artifact:{key}")
+            for url, digest in artifact.sources.items() if artifact is not None else ():
+                self.backend.remove_members(_source_key(url, digest), [key])
+
+    def __len__(self) -> int:
+        return len(self._artifacts)
+
+
+def _source_key(url: str, digest: str) -> str:
+    return f"deps:source:{digest}:{url}"
+
+
+def source_diff(url: str, old_text: str, new_text: str, max_lines: int = MAX_DIFF_LINES) -> str:
+    """Unified line diff between two versions of a source text, truncated to `max_lines`."""
+    lines = list(difflib.unified_diff(
+        old_text.splitlines(), new_text.splitlines(),
+        fromfile=f"{url} (before)", tofile=f"{url} (after)", lineterm="", n=1,
+    ))
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"... {len(lines) - max_lines} more diff lines"]
+    return "\n".join(lines)
+
+
+class SourceChangeLog:
+    """Append-only JSON-lines audit log of source changes (one line per changed source)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, entry: dict) -> None:
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **entry}
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def entries(self, limit: int | None = None) -> list[dict]:
+        """The most recent `limit` entries (all of them by default), oldest first."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        return entries[-limit:] if limit else entries
+
+
+def change_log_from_env() -> SourceChangeLog:
+    return SourceChangeLog(os.environ.get("SOURCE_CHANGE_LOG", "source_changes.jsonl"))
+
+
+# ---- Command line ----
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Refresh corpora and review source changes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    refresh = commands.add_parser("refresh", help="re-fetch corpora and regenerate affected answers")
+    refresh.add_argument("--jurisdictions", default=None, help="comma-separated subset (default: all)")
+
+    log = commands.add_parser("log", help="show recorded source changes")
+    log.add_argument("--limit", type=int, default=10, help="number of most recent changes to show")
+    log.add_argument("--no-diff", action="store_true", help="leave out the text diffs")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        from cache_backend import backend_from_env
+
+        # A fresh process without shared storage has nothing to compare the
+        # new texts with, and nobody else would see the refreshed corpora
+        if backend_from_env() is None:
+            parser.error("refresh needs the shared cache the app uses: set POLICY_CACHE_URL or POLICY_CACHE_PATH")
+
+        import policy_engine
+
+        names = (
+            [name.strip() for name in args.jurisdictions.split(",")]
+            if args.jurisdictions else list(policy_engine.JURISDICTION_SOURCES)
+        )
+        for name in names:
+            changes = policy_engine.refresh_jurisdiction_corpus(name)
+            print(f"{name}: {len(changes)} changed sources, "
+                  f"{sum(len(c['invalidated']) for c in changes)} answers invalidated")
+        # Let the background regeneration finish before exiting
+        policy_engine.wait_for_regeneration()
+    else:
+        for entry in change_log_from_env().entries(args.limit):
+            print(f"{entry['time']}  {entry['jurisdiction']}  {entry['url']}")
+            print(f"  {entry['old_chars']} -> {entry['new_chars']} characters, "
+                  f"{len(entry['invalidated'])} answers invalidated")
+            if not args.no_diff and entry["diff"]:
+                print("\n".join("    " + line for line in entry["diff"].splitlines()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# source_health.py
+#
+# Health records and circuit breaking for the configured source URLs. Every
+# fetch is recorded (status, latency, extracted length); after repeated
+# failures a source is skipped for a cool-off period and its last good copy
+# is served instead, so one dead link doesn't hold up a cold corpus build.
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from corpus_store import CompressedSource
+
+# Cool-offs stop doubling after this many further failures (the result is
+# capped at max_cooloff_seconds anyway; this keeps the arithmetic bounded)
+MAX_BACKOFF_DOUBLINGS = 20
+
+
+@dataclass
+class SourceHealth:
+    """
+    What we know about one source URL.
+
+    - `last_status` is the HTTP status code, or None if the request itself
+      failed (DNS, timeout, connection refused) - see `last_error`.
+    - `open_until` is when the circuit closes again (0 while it is closed).
+    """
+    url: str
+    last_status: int | None = None
+    last_error: str | None = None
+    latency_seconds: float | None = None
+    extracted_chars: int = 0
+    consecutive_failures: int = 0
+    last_checked: float | None = None
+    last_success: float | None = None
+    open_until: float = 0.0
+
+    def circuit_open(self, now: float | None = None) -> bool:
+        return self.open_until > (time.time() if now is None else now)
+
+    def summary(self) -> str:
+        """Short human-readable status, e.g. for the Information sources page."""
+        if self.last_checked is None:
+            return "not checked yet"
+        if self.circuit_open():
+            minutes = max(1, round((self.open_until - time.time()) / 60))
+            return f"skipped after {self.consecutive_failures} failures (retry in ~{minutes} min)"
+        if self.consecutive_failures:
+            return f"failing ({self.last_error or self.last_status})"
+        return "ok"
+
+
+class SourceHealthTracker:
+    """
+    Thread-safe health records plus a per-URL circuit breaker.
+
+    - After `failure_threshold` consecutive failures the circuit opens for
+      `cooloff_seconds`, doubling with every further failure up to
+      `max_cooloff_seconds`.
+    - Once the cool-off has passed the next fetch is let through as a trial;
+      a success closes the circuit, a failure reopens it.
+    - The digest of the last successfully fetched copy of each source is
+      kept. With a shared `backend` (see cache_backend.py) the copy itself
+      is stored there and served while the source is failing; records and
+      copies then survive restarts and are shared between processes.
+      Without one, callers fall back to the text in the corpus store.
+    - `version` goes up with every recorded fetch in this process, so views
+      of the records can be cached until it changes.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 2,
+        cooloff_seconds: float = 15 * 60,
+        max_cooloff_seconds: float = 6 * 3600,
+        backend=None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooloff_seconds = cooloff_seconds
+        self.max_cooloff_seconds = max_cooloff_seconds
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._health: dict[str, SourceHealth] = {}
+        self._last_good: dict[str, str] = {}  # url -> digest
+        self.version = 0
+
+    def get(self, url: str) -> SourceHealth:
+        """The record for `url` (a fresh "not checked yet" record if unknown)."""
+        with self._lock:
+            health = self._health.get(url)
+        if health is None and self.backend is not None:
+            raw = self.backend.get(f"health:{url}")
+            if raw is not None:
+                health = SourceHealth(**json.loads(raw))
+                with self._lock:
+                    health = self._health.setdefault(url, health)
+        return health or SourceHealth(url)
+
+    def allow(self, url: str) -> bool:
+        """False while the circuit for `url` is open."""
+        return not self.get(url).circuit_open()
+
+    def last_good_digest(self, url: str) -> str | None:
+        """Digest of the last good copy of `url`, or None if it was never fetched successfully."""
+        with self._lock:
+            digest = self._last_good.get(url)
+        if digest is None and self.backend is not None:
+            meta = self.backend.get(f"health:last_good:{url}")
+            if meta is not None:
+                digest = json.loads(meta)[0]
+                with self._lock:
+                    digest = self._last_good.setdefault(url, digest)
+        return digest
+
+    def last_good(self, url: str) -> CompressedSource | None:
+        """The last good copy of `url`, read back from the backend (None without one)."""
+        if self.backend is None:
+            return None
+        meta = self.backend.get(f"health:last_good:{url}")
+        blob = self.backend.get(f"health:last_good_blob:{url}")
+        if meta is None or blob is None:
+            return None
+        digest, length, spans = json.loads(meta)
+        return CompressedSource(url, blob, digest, length, tuple(tuple(s) for s in spans))
+
+    def record_success(self, url: str, status: int, latency: float, source: CompressedSource) -> None:
+        now = time.time()
+        health = SourceHealth(
+            url,
+            last_status=status,
+            latency_seconds=latency,
+            extracted_chars=source.length,
+            last_checked=now,
+            last_success=now,
+        )
+        with self._lock:
+            self._health[url] = health
+            self._last_good[url] = source.digest
+            self.version += 1
+        if self.backend is not None:
+            self.backend.set(f"health:last_good_blob:{url}", source.blob)
+            self.backend.set(
+                f"health:last_good:{url}",
+                json.dumps([source.digest, source.length, source.spans]).encode("utf-8"),
+            )
+            self._save(health)
+
+    def record_failure(
+        self,
+        url: str,
+        status: int | None,
+        error: str,
+        latency: float,
+    ) -> SourceHealth:
+        previous = self.get(url)
+        now = time.time()
+        failures = previous.consecutive_failures + 1
+        health = SourceHealth(
+            url,
+            last_status=status,
+            last_error=error,
+            latency_seconds=latency,
+            extracted_chars=0,
+            consecutive_failures=failures,
+            last_checked=now,
+            last_success=previous.last_success,
+        )
+        if failures >= self.failure_threshold:
+            doublings = min(failures - self.failure_threshold, MAX_BACKOFF_DOUBLINGS)
+            cooloff = self.cooloff_seconds * 2 ** doublings
+            health.open_until = now + min(cooloff, self.max_cooloff_seconds)
+        with self._lock:
+            self._health[url] = health
+            self.version += 1
+        if self.backend is not None:
+            self._save(health)
+        return health
+
+    def _save(self, health: SourceHealth) -> None:
+        self.backend.set(f"health:{health.url}", json.dumps(asdict(health)).encode("utf-8"))
+
+
+def health_tracker_from_env(backend=None) -> SourceHealthTracker:
+    """
+    Build a SourceHealthTracker from SOURCE_FAILURE_THRESHOLD,
+    SOURCE_COOLOFF_SECONDS and SOURCE_MAX_COOLOFF_SECONDS.
+    """
+    return SourceHealthTracker(
+        failure_threshold=int(os.environ.get("SOURCE_FAILURE_THRESHOLD", "2")),
+        cooloff_seconds=float(os.environ.get("SOURCE_COOLOFF_SECONDS", str(15 * 60))),
+        max_cooloff_seconds=float(os.environ.get("SOURCE_MAX_COOLOFF_SECONDS", str(6 * 3600))),
+        backend=backend,
+    )
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from starlette.requests import ClientDisconnect
+from starlette.testclient import TestClient
+
+import api
+import policy_engine
+from cancellation import AnswerCancelled, check_cancelled
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """Stub out the model: answers echo their arguments; queries are recorded."""
+    calls = []
+
+    def answer(jurisdiction, question, on_delta=None):
+        if on_delta is not None:
+            on_delta(f"{jurisdiction}: ")
+            on_delta(question)
+        return f"{jurisdiction}: {question}"
+
+    monkeypatch.setattr(policy_engine, "answer_ai_policy_question", answer)
+    monkeypatch.setattr(policy_engine, "compare_jurisdictions", lambda j1, j2, q, on_delta=None: f"{j1} vs {j2}: {q}")
+    monkeypatch.setattr(policy_engine, "record_query", lambda *args: calls.append(args))
+    return calls
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)
+
+
+def test_answer(client, recorded):
+    r = client.post("/v1/answer", json={"jurisdiction": "ontario", "question": " Is AI allowed? "})
+    assert r.status_code == 200
+    assert r.json() == {"answer": "Ontario: Is AI allowed?"}
+    assert recorded == [("single", ["Ontario"], "Is AI allowed?")]
+
+
+def test_compare_question_is_optional(client, recorded):
+    r = client.post("/v1/compare", json={"jurisdiction_1": "Ontario", "jurisdiction_2": "Alberta"})
+    assert r.json() == {"answer": "Ontario vs Alberta: None"}
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"question": "q"}, "'jurisdiction' is required."),
+    ({"jurisdiction": "Atlantis", "question": "q"}, "Unknown jurisdiction: 'Atlantis'"),
+    ({"jurisdiction": "Ontario", "question": ""}, "'question' is required."),
+    (["not", "an", "object"], "Request body must be a JSON object."),
+])
+def test_invalid_requests(client, recorded, body, error):
+    r = client.post("/v1/answer", json=body)
+    assert r.status_code == 400
+    assert r.json() == {"error": error}
+    assert recorded == []
+
+
+def test_stream_sends_ndjson_deltas(client, recorded):
+    r = client.post("/v1/answer", json={"jurisdiction": "Ontario", "question": "q", "stream": True})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines == [{"delta": "Ontario: "}, {"delta": "q"}, {"done": True}]
+    assert recorded == [("single", ["Ontario"], "q")]
+
+
+def test_stream_without_deltas_sends_the_whole_answer(client, recorded):
+    r = client.post("/v1/compare", json={"jurisdiction_1": "Ontario", "jurisdiction_2": "Alberta", "stream": True})
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines == [{"delta": "Ontario vs Alberta: None"}, {"done": True}]
+
+
+def test_errors_are_reported(client, monkeypatch):
+    def fail(jurisdiction, question, on_delta=None):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(policy_engine, "answer_ai_policy_question", fail)
+    r = client.post("/v1/answer", json={"jurisdiction": "Ontario", "question": "q"})
+    assert r.status_code == 500
+    assert r.json() == {"error": "Error generating answer: model unavailable"}
+    r = client.post("/v1/answer", json={"jurisdiction": "Ontario", "question": "q", "stream": True})
+    assert [json.loads(line) for line in r.text.splitlines()] == [
+        {"error": "Error generating answer: model unavailable"}
+    ]
+
+
+def test_deadline(client, monkeypatch):
+    def slow(jurisdiction, question, on_delta=None):
+        while True:
+            time.sleep(0.01)
+            check_cancelled()
+
+    monkeypatch.setattr(policy_engine, "answer_ai_policy_question", slow)
+    monkeypatch.setitem(policy_engine.ANSWER_DEADLINES, "single", 0.05)
+    r = client.post("/v1/answer", json={"jurisdiction": "Ontario", "question": "q"})
+    assert r.status_code == 504
+
+
+def test_busy_server_turns_requests_away(client, recorded, monkeypatch):
+    # No free slot and no room to wait
+    monkeypatch.setattr(api, "_gate", api.Backpressure(0, 0))
+    r = client.post("/v1/answer", json={"jurisdiction": "Ontario", "question": "q"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "5"
+    assert recorded == []
+
+
+def test_backpressure_bounds_the_waiting_line():
+    async def scenario():
+        gate = api.Backpressure(1, 1)
+        await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+        with pytest.raises(api.Overloaded):
+            await gate.acquire()
+        gate.release()
+        await waiter
+        assert gate.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_corpus_status(client):
+    r = client.get("/v1/corpus")
+    assert r.status_code == 200
+    status = r.json()
+    assert set(status["jurisdictions"]) == set(policy_engine.JURISDICTION_SOURCES)
+    assert status["requests"] == {"waiting": 0}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_client_disconnect_cancels_the_answer(monkeypatch, stream):
+    cancelled = threading.Event()
+    finished = threading.Event()
+
+    def slow(jurisdiction, question, on_delta=None):
+        try:
+            for _ in range(200):
+                time.sleep(0.01)
+                check_cancelled()
+        except AnswerCancelled:
+            cancelled.set()
+            raise
+        finally:
+            finished.set()
+        return "too late"
+
+    monkeypatch.setattr(policy_engine, "answer_ai_policy_question", slow)
+    monkeypatch.setattr(api, "DISCONNECT_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(api, "_gate", api.Backpressure(1, 0))
+
+    body = json.dumps({"jurisdiction": "Ontario", "question": "q", "stream": stream}).encode()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if stream:
+            raise OSError("connection closed")
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/v1/answer", "raw_path": b"/v1/answer",
+        "root_path": "", "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "server": ("testserver", 80), "client": ("testclient", 1234),
+    }
+    try:
+        asyncio.run(api.app(scope, receive, send))
+    except ClientDisconnect:
+        # What the server sees when the stream can't be sent
+        assert stream
+
+    assert finished.wait(1)
+    assert cancelled.is_set()
+    # The slot was given back
+    assert not api._gate._semaphore.locked()
@@ -0,0 +1,201 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from cache_backend import (
+    CacheBackend,
+    MemoryBackend,
+    RedisBackend,
+    SQLiteBackend,
+    backend_from_url,
+    hold_lease,
+    run_once_across_processes,
+)
+from corpus_store import CorpusStore, Passage
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite"))
+    return RedisBackend(client=fakeredis.FakeRedis(), prefix="test:")
+
+
+def test_round_trip(backend):
+    assert backend.get("missing") is None
+    backend.set("key", b"value")
+    assert backend.get("key") == b"value"
+    backend.set("key", b"\x00binary\xff")
+    assert backend.get("key") == b"\x00binary\xff"
+    backend.delete("key")
+    assert backend.get("key") is None
+    backend.delete("key")
+
+
+def test_entries_expire(backend):
+    backend.set("short", b"1", ttl_seconds=0.05)
+    backend.set("long", b"2", ttl_seconds=60)
+    assert backend.get("short") == b"1"
+    time.sleep(0.1)
+    assert backend.get("short") is None
+    assert backend.get("long") == b"2"
+
+
+def test_lease_is_taken_once_until_it_expires(backend):
+    assert backend.add("lease", b"a", ttl_seconds=0.05)
+    assert not backend.add("lease", b"b", ttl_seconds=0.05)
+    assert backend.get("lease") == b"a"
+    time.sleep(0.1)
+    assert backend.add("lease", b"c", ttl_seconds=0.05)
+    assert backend.get("lease") == b"c"
+
+
+def test_lease_is_free_again_once_deleted(backend):
+    assert backend.add("lease", b"1")
+    backend.delete("lease")
+    assert backend.add("lease", b"1")
+
+
+def test_delete_if_only_deletes_the_expected_value(backend):
+    backend.set("lease", b"mine")
+    assert not backend.delete_if("lease", b"theirs")
+    assert backend.get("lease") == b"mine"
+    assert backend.delete_if("lease", b"mine")
+    assert backend.get("lease") is None
+    assert not backend.delete_if("lease", b"mine")
+
+
+def test_expired_holder_keeps_its_hands_off_the_next_lease(backend):
+    first = hold_lease(backend, "lease", 0.05)
+    assert first.__enter__()
+    time.sleep(0.1)
+    # The first holder overran its lease and another worker took it over
+    second = hold_lease(backend, "lease", 60)
+    assert second.__enter__()
+    first.__exit__(None, None, None)
+    with hold_lease(backend, "lease", 60) as third:
+        assert not third
+    second.__exit__(None, None, None)
+    assert backend.get("lease") is None
+
+
+def test_run_once_waits_for_the_lease_holder(backend):
+    started = threading.Event()
+    release = threading.Event()
+    builds = []
+
+    def build():
+        builds.append(threading.current_thread().name)
+        started.set()
+        release.wait(5)
+        backend.set("result", b"built")
+        return b"built"
+
+    def ready():
+        return backend.get("result")
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(run_once_across_processes(backend, "lease", build, ready)),
+        name="leader",
+    )
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(
+        target=lambda: results.append(
+            run_once_across_processes(backend, "lease", build, ready, poll_seconds=0.01)
+        ),
+        name="follower",
+    )
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == [b"built", b"built"]
+    assert builds == ["leader"]
+    assert backend.get("lease") is None
+
+
+def test_run_once_builds_after_an_abandoned_lease(backend):
+    backend.add("lease", b"1", ttl_seconds=0.05)
+    result = run_once_across_processes(
+        backend, "lease", lambda: "rebuilt", lambda: None, lease_seconds=0.05, poll_seconds=0.01
+    )
+    assert result == "rebuilt"
+
+
+def test_corpus_store_shared_through_backend(backend):
+    writer = CorpusStore(backend=backend)
+    writer.put("Ontario", [
+        ("https://a", [Passage("https://a", "First passage.", section="Scope", page_start=1, page_end=1)]),
+        ("https://b", "Plain text source"),
+    ])
+    reader = CorpusStore(backend=backend)
+    assert reader.has("Ontario")
+    assert reader.text("Ontario") == writer.text("Ontario")
+    assert [p.section for p in reader.iter_passages("Ontario")] == [p.section for p in writer.iter_passages("Ontario")]
+
+
+def test_backend_from_url(tmp_path):
+    assert isinstance(backend_from_url("memory://"), MemoryBackend)
+    sqlite = backend_from_url(f"sqlite:///{tmp_path}/c.sqlite")
+    assert isinstance(sqlite, SQLiteBackend) and sqlite.path == f"{tmp_path}/c.sqlite"
+    with pytest.raises(ValueError):
+        backend_from_url("ftp://example")
+
+
+def test_counters(backend):
+    assert backend.top_counts("counts", 5) == []
+    backend.incr_counts("counts", {"a": 1, "b": 3})
+    backend.incr_counts("counts", {"a": 4, "c": 1})
+    assert backend.top_counts("counts", 2) == [("a", 5), ("b", 3)]
+    backend.incr_counts("counts", {"d": 10}, max_entries=2)
+    assert backend.top_counts("counts", 5) == [("d", 10), ("a", 5)]
+
+
+def test_counters_add_up_across_threads(backend):
+    def count():
+        for _ in range(50):
+            backend.incr_counts("counts", {"q": 1})
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert backend.top_counts("counts", 1) == [("q", 200)]
+
+
+def test_members(backend):
+    backend.add_members("set", ["a", "b"])
+    backend.add_members("set", ["b", "c"], ttl_seconds=0.05)
+    assert sorted(backend.members("set")) == ["a", "b", "c"]
+    backend.remove_members("set", ["a"])
+    assert sorted(backend.members("set")) == ["b", "c"]
+    time.sleep(0.1)
+    assert backend.members("set") == []
+    assert backend.members("missing") == []
+
+
+def test_redis_client_returning_str():
+    backend = RedisBackend(client=fakeredis.FakeRedis(decode_responses=True), prefix="test:")
+    backend.incr_counts("counts", {"a": 2, "b": 1})
+    assert backend.top_counts("counts", 2) == [("a", 2), ("b", 1)]
+    backend.add_members("set", ["a"])
+    assert backend.members("set") == ["a"]
+    assert backend.add("lease", b"token")
+    assert backend.delete_if("lease", b"token")
+
+
+def test_backends_implement_the_whole_interface():
+    class Partial(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,51 @@
+from cache_backend import MemoryBackend
+from cache_warming import CacheWarmer, PopularQuery, QueryStats
+
+
+def test_counts_are_batched_until_flushed():
+    backend = MemoryBackend()
+    stats = QueryStats(backend=backend, flush_seconds=3600)
+    for _ in range(3):
+        stats.record("single", ["Ontario"], "What applies?")
+    stats.record("canada", [], "Common principles?")
+    assert backend.top_counts("warm:query_counts", 5) == []
+    top = stats.top(5)
+    assert [(q.mode, q.jurisdictions, q.question, q.count) for q in top] == [
+        ("single", ["Ontario"], "What applies?", 3),
+        ("canada", [], "Common principles?", 1),
+    ]
+
+
+def test_workers_add_up_in_a_shared_backend():
+    backend = MemoryBackend()
+    first = QueryStats(backend=backend, flush_seconds=0)
+    second = QueryStats(backend=backend, flush_seconds=0)
+    first.record("compare", ["Alberta", "Ontario"], None)
+    second.record("compare", ["Alberta", "Ontario"], None)
+    assert backend.top_counts("warm:query_counts", 1)[0][1] == 2
+    assert first.top(1)[0].count == 2
+
+
+def test_only_max_entries_are_kept():
+    stats = QueryStats(max_entries=2)
+    for question, times in [("a", 3), ("b", 1), ("c", 2)]:
+        for _ in range(times):
+            stats.record("single", ["Ontario"], question)
+    assert [q.question for q in stats.top(5)] == ["a", "c"]
+
+
+def test_warmer_warms_each_version_once():
+    answered = []
+    version = ["v1"]
+    warmer = CacheWarmer(
+        candidates=lambda n: [PopularQuery("canada", [], "q")],
+        answer=lambda query: answered.append(query.question),
+        version=lambda: version[0],
+        per_minute=6000,
+        backend=MemoryBackend(),
+    )
+    assert warmer.warm_if_changed()["warmed"] == 1
+    assert warmer.warm_if_changed() is None
+    version[0] = "v2"
+    assert warmer.warm_if_changed()["warmed"] == 1
+    assert answered == ["q", "q"]
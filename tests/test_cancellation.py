@@ -0,0 +1,132 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import policy_engine
+from cancellation import AnswerCancelled, AnswerJob, CancelToken, DeadlineExceeded, cancel_scope, check_cancelled, current_token
+
+
+def test_token_check_and_reason():
+    token = CancelToken()
+    token.check()
+    token.cancel("superseded")
+    token.cancel("later reasons are ignored")
+    assert token.reason == "superseded"
+    with pytest.raises(AnswerCancelled, match="superseded"):
+        token.check()
+
+
+def test_deadline_cancels_and_runs_callbacks():
+    token = CancelToken(0.05)
+    closed = []
+    token.on_cancel(lambda: closed.append(True))
+    assert token.remaining() > 0
+    time.sleep(0.15)
+    assert closed == [True]
+    with pytest.raises(DeadlineExceeded):
+        token.check()
+
+
+def test_callback_registered_after_cancel_runs_at_once():
+    token = CancelToken()
+    token.cancel()
+    ran = []
+    token.on_cancel(lambda: ran.append(True))
+    assert ran == [True]
+
+
+def test_close_stops_the_deadline_timer():
+    token = CancelToken(0.05)
+    ran = []
+    token.on_cancel(lambda: ran.append(True))
+    token.close()
+    time.sleep(0.1)
+    assert ran == []
+
+
+def test_cancel_scope_sets_the_current_token():
+    outer, inner = CancelToken(), CancelToken()
+    with cancel_scope(outer):
+        with cancel_scope(inner):
+            assert current_token() is inner
+            inner.cancel()
+            with pytest.raises(AnswerCancelled):
+                check_cancelled()
+        assert current_token() is outer
+        check_cancelled()
+    assert current_token() is None
+
+
+def test_answer_job_streams_and_finishes():
+    def answer(question, on_delta):
+        on_delta("Hello ")
+        on_delta(question)
+        return "Hello " + question
+
+    job = AnswerJob(answer, "world")
+    assert job.wait(5)
+    assert job.answer == "Hello world" and job.text() == "Hello world"
+    assert job.error is None
+
+
+def test_answer_job_cancel():
+    def answer(on_delta):
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    job = AnswerJob(answer)
+    job.cancel("superseded")
+    assert job.wait(5)
+    assert isinstance(job.error, AnswerCancelled) and job.answer is None
+
+
+def test_answer_job_deadline():
+    def answer(on_delta):
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    job = AnswerJob(answer, deadline_seconds=0.05)
+    assert job.wait(5)
+    assert isinstance(job.error, DeadlineExceeded)
+
+
+class _HangingStream:
+    """A model stream that sends nothing until it is closed."""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        if not self.closed.wait(5):
+            raise AssertionError("stream was never closed")
+        raise ConnectionError("stream closed")
+
+    def close(self):
+        self.closed.set()
+
+
+def test_cancel_aborts_a_non_streaming_model_call(monkeypatch):
+    streams = []
+
+    def create(**kwargs):
+        assert kwargs.get("stream")
+        streams.append(_HangingStream())
+        return streams[-1]
+
+    client = type("Client", (), {})()
+    client.chat = type("Chat", (), {})()
+    client.chat.completions = type("Completions", (), {"create": staticmethod(create)})()
+    monkeypatch.setattr(policy_engine, "get_client", lambda: client)
+    monkeypatch.setattr(policy_engine, "_cache_backend", None)
+
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel, args=("client disconnected",)).start()
+    started = time.monotonic()
+    with cancel_scope(token), pytest.raises(AnswerCancelled):
+        policy_engine.complete_chat(model="m", messages=[{"role": "user", "content": uuid.uuid4().hex}])
+    assert time.monotonic() - started < 2
+    assert streams and streams[0].closed.is_set()
@@ -0,0 +1,66 @@
+import pytest
+
+import policy_engine
+from comparison_matrix import build_comparison_matrix, find_comparison, load_comparison_matrix
+from corpus_store import CorpusStore
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """The engine with a fresh corpus store holding `corpora`; comparisons are stubbed and counted."""
+    corpora = {"Federal": "Federal text.", "Ontario": "Ontario text.", "Alberta": "Alberta text."}
+    store = CorpusStore()
+    compared = []
+
+    def load(jurisdiction):
+        if not store.has(jurisdiction):
+            store.put(jurisdiction, [(f"https://{jurisdiction}", corpora[jurisdiction])])
+        return jurisdiction
+
+    def compare(j1, j2, question, contexts=None):
+        compared.append((j1, j2))
+        return f"{contexts[j1]} vs {contexts[j2]}"
+
+    monkeypatch.setattr(policy_engine, "_corpus_store", store)
+    monkeypatch.setattr(policy_engine, "load_jurisdiction_corpus", load)
+    monkeypatch.setattr(policy_engine, "prepare_compare_context", lambda j: store.text(load(j)))
+    monkeypatch.setattr(policy_engine, "compare_jurisdictions", compare)
+    return corpora, store, compared
+
+
+def test_results_are_found_only_for_the_current_corpora(engine, tmp_path):
+    _, store, _ = engine
+    output = str(tmp_path / "matrix.json")
+    build_comparison_matrix(["Federal", "Ontario"], None, output)
+    matrix = load_comparison_matrix(output)
+    version = policy_engine.corpus_version(["Ontario", "Federal"])
+
+    result = find_comparison(matrix, "Ontario", "Federal", None, version)
+    assert result["answer"] == "Federal text. vs Ontario text."
+    assert find_comparison(matrix, "Federal", "Ontario", "Another question?", version) is None
+    assert find_comparison(matrix, "Federal", "Ontario", None, "other version") is None
+    # Corpora not loaded: no version to check against
+    store.reload("Ontario")
+    assert policy_engine.corpus_version(["Federal", "Ontario"]) is None
+    assert find_comparison(matrix, "Federal", "Ontario", None, None) is None
+
+
+def test_rebuild_redoes_only_pairs_whose_corpora_changed(engine, tmp_path):
+    corpora, store, compared = engine
+    output = str(tmp_path / "matrix.json")
+    jurisdictions = ["Federal", "Ontario", "Alberta"]
+    build_comparison_matrix(jurisdictions, None, output)
+    assert len(compared) == 3
+
+    compared.clear()
+    build_comparison_matrix(jurisdictions, None, output)
+    assert compared == []
+
+    # A refresh changed Alberta's sources
+    corpora["Alberta"] = "New Alberta text."
+    store.reload("Alberta")
+    build_comparison_matrix(jurisdictions, None, output)
+    assert sorted(compared) == [("Federal", "Alberta"), ("Ontario", "Alberta")]
+    matrix = load_comparison_matrix(output)
+    version = policy_engine.corpus_version(["Alberta", "Ontario"])
+    assert find_comparison(matrix, "Alberta", "Ontario", None, version)["answer"] == "Ontario text. vs New Alberta text."
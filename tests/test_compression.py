@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+import policy_engine
+from compression import compress_context
+
+WORDS = (
+    "policy directive privacy risk assessment transparency oversight procurement vendor ministry "
+    "model data public service accountability fairness bias disclosure training records review"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+
+
+def _corpus(seed: int = 1) -> str:
+    rng = random.Random(seed)
+    blocks = []
+    for name in ("Ontario", "Alberta", "Yukon"):
+        blocks.append(f"### {name}")
+        for page in range(1, 30):
+            blocks.append(f"[Directive on AI · pp. {page}–{page + 1}]")
+            blocks.append(" ".join(_sentence(rng) for _ in range(3)))
+            blocks.append("")
+    return "\n".join(blocks)
+
+
+@pytest.mark.parametrize("max_chars", [300, 1000, 4000, 9000])
+def test_budget_includes_headings_and_markers(max_chars):
+    text = _corpus()
+    out = compress_context(text, "privacy risk", max_chars)
+    assert len(out) <= max_chars
+    assert out.startswith("### ") or out.startswith("[")
+
+
+def test_sentences_keep_document_order():
+    text = _corpus(2)
+    out = compress_context(text, "privacy", 2000)
+    sentences = [s for line in out.splitlines() if not line.startswith(("#", "[")) for s in line.split(". ")]
+    positions = [text.index(s.rstrip(".")) for s in sentences if s]
+    assert positions == sorted(positions)
+
+
+def test_short_text_is_unchanged():
+    assert compress_context("Short text.", "", 100) == "Short text."
+
+
+def test_excerpts_are_unchanged_unless_compression_is_on(monkeypatch):
+    text = _corpus()
+    monkeypatch.setitem(policy_engine.CONTEXT_KEEP_RATIOS, "single", 1.0)
+    assert policy_engine.excerpt_read_chars("single", 5000) == 5000
+    assert policy_engine.compress_excerpt(text[:5000], "single", ["Ontario"], 5000) == text[:5000]
+
+
+def test_keep_ratio_cuts_the_excerpt_below_the_budget(monkeypatch):
+    text = _corpus()
+    monkeypatch.setitem(policy_engine.CONTEXT_KEEP_RATIOS, "single", 0.5)
+    read_chars = policy_engine.excerpt_read_chars("single", 5000)
+    assert read_chars == 10000
+    out = policy_engine.compress_excerpt(text[:read_chars], "single", ["Ontario"], 5000)
+    assert 0 < len(out) <= 2500
@@ -0,0 +1,102 @@
+import threading
+
+from cache_backend import MemoryBackend
+from corpus_store import CorpusStore, ParagraphDeduplicator, Passage, SourceWriter
+
+
+def test_dedup_keeps_wrapped_pdf_passages_whole():
+    dedup = ParagraphDeduplicator()
+    first = "Vendors must also complete an\nalgorithmic impact assessment."
+    second = "Suppliers must also complete an\nprovide documentation."
+    assert dedup.filter(first) == first
+    # A repeated wrapped line inside a different passage is not a duplicate
+    assert dedup.filter(second) == second
+
+
+def test_dedup_drops_repeated_paragraphs():
+    dedup = ParagraphDeduplicator()
+    assert dedup.filter("We use cookies to improve this site.")
+    assert dedup.filter("  We use COOKIES to improve this site!  ") == ""
+    assert dedup.dropped == 1
+
+
+def test_dedup_keeps_numbers_outside_boilerplate():
+    dedup = ParagraphDeduplicator()
+    for text in ["Phase 1: consult stakeholders", "Phase 2: consult stakeholders",
+                 "Budget 2024: $40 million", "Budget 2025: $50 million"]:
+        assert dedup.filter(text) == text
+
+
+def test_dedup_ignores_numbers_in_boilerplate():
+    dedup = ParagraphDeduplicator()
+    assert dedup.filter("Date modified: 2025-01-01")
+    assert dedup.filter("Date modified: 2025-03-04") == ""
+    assert dedup.filter("Page 3 of 12")
+    assert dedup.filter("Page 4 of 12") == ""
+
+
+def test_store_round_trip_and_slices():
+    store = CorpusStore()
+    store.put("Ontario", [("https://a", "first source"), ("https://b", "second")])
+    text = store.text("Ontario")
+    assert text == "first source\n\nsecond"
+    assert store.length("Ontario") == len(text)
+    assert store.head("Ontario", 7) == text[:7]
+    assert store.slice("Ontario", 5, 16) == text[5:16]
+    assert [r.url for r in store.head_sources("Ontario", 5)] == ["https://a"]
+
+
+def test_identical_sources_are_stored_once():
+    store = CorpusStore()
+    store.put("Ontario", [("https://a", "shared text")])
+    store.put("Alberta", [("https://b", "shared text")])
+    assert store.sources("Ontario")[0].digest == store.sources("Alberta")[0].digest
+    assert len(store._blobs) == 1
+
+
+def test_passages_keep_provenance():
+    writer = SourceWriter("https://pdf")
+    writer.add(Passage("https://pdf", "Scope text.", section="Scope", page_start=3, page_end=4))
+    writer.add(Passage("https://pdf", "Next.", section="Duties", page_start=5))
+    store = CorpusStore()
+    store.put("Federal", [("https://pdf", writer.finish())])
+    assert store.text("Federal") == "[Scope · pp. 3–4]\nScope text.\n[Duties · p. 5]\nNext."
+    passages = list(store.iter_passages("Federal"))
+    assert [(p.text, p.section, p.page_start) for p in passages] == [
+        ("Scope text.", "Scope", 3), ("Next.", "Duties", 5)
+    ]
+
+
+def test_store_picks_up_corpus_replaced_by_another_process():
+    backend = MemoryBackend()
+    worker = CorpusStore(backend=backend, sync_seconds=0)
+    refresher = CorpusStore(backend=backend, sync_seconds=0)
+    worker.put("Ontario", [("https://a", "old text")])
+    assert refresher.text("Ontario") == "old text"
+    refresher.put("Ontario", [("https://a", "new text")])
+    assert worker.text("Ontario") == "new text"
+
+
+def test_store_checks_backend_version_only_every_sync_seconds():
+    backend = MemoryBackend()
+    worker = CorpusStore(backend=backend, sync_seconds=3600)
+    worker.put("Ontario", [("https://a", "old text")])
+    CorpusStore(backend=backend).put("Ontario", [("https://a", "new text")])
+    assert worker.text("Ontario") == "old text"
+    worker.sync_seconds = 0
+    assert worker.text("Ontario") == "new text"
+
+
+def test_memory_report_after_another_process_replaced_a_corpus():
+    backend = MemoryBackend()
+    first = CorpusStore(backend=backend, sync_seconds=0)
+    second = CorpusStore(backend=backend, sync_seconds=0)
+    first.put("Ontario", [("https://a", "old text")])
+    second.put("Ontario", [("https://a", "newer text")])
+
+    done = []
+    thread = threading.Thread(target=lambda: done.append(first.memory_report()), daemon=True)
+    thread.start()
+    thread.join(5)
+    assert done, "memory_report() deadlocked"
+    assert first.length("Ontario") == len("newer text")
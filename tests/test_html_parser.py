@@ -0,0 +1,47 @@
+from policy_engine import _ParagraphParser
+
+
+def passages(html: str, chunk: int | None = None) -> list[str]:
+    parser = _ParagraphParser("https://example.ca")
+    chunks = [html] if chunk is None else [html[i:i + chunk] for i in range(0, len(html), chunk)]
+    texts = []
+    for piece in chunks:
+        parser.feed(piece)
+        texts += [p.text for p in parser.pop_passages()]
+    parser.close()
+    return texts + [p.text for p in parser.pop_passages()]
+
+
+def test_paragraphs_and_list_items():
+    html = "<main><p>First <b>bold</b>\n paragraph.</p><ul><li>One</li><li>Two</ul><p>Last"
+    assert passages(html) == ["First bold paragraph.", "One", "Two", "Last"]
+
+
+def test_skipped_elements():
+    html = "<nav><li>Home</li></nav><p>Body<script>var x = 1;</script> text</p><footer><p>Contact</p></footer>"
+    assert passages(html) == ["Body text"]
+
+
+def test_nested_list_keeps_document_order():
+    html = "<ul><li>Parent <ul><li>Child one</li><li>Child two</li></ul> continued</li><li>Next</li></ul>"
+    assert passages(html) == ["Parent", "Child one", "Child two", "continued", "Next"]
+
+
+def test_paragraph_inside_list_item():
+    html = "<ol><li>Item <p>Paragraph</p> tail</li></ol>"
+    assert passages(html) == ["Item", "Paragraph", "tail"]
+
+
+def test_tail_after_implicitly_closed_paragraph():
+    html = "<div><p>Intro<div>Block</div> after the block</div><p>Next"
+    assert passages(html) == ["Intro", "Block after the block", "Next"]
+
+
+def test_text_outside_paragraphs_is_ignored():
+    html = "<div>Loose text</div><p>Kept</p><div>More loose text</div>"
+    assert passages(html) == ["Kept"]
+
+
+def test_chunked_feed_matches_whole_document():
+    html = "<ul><li>Parent <ul><li>Child</li></ul> tail</li></ul><div><p>A<table><tr><td>B</td></tr></table>C</div>"
+    assert passages(html, chunk=7) == passages(html)
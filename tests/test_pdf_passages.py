@@ -0,0 +1,106 @@
+import io
+
+import pdfplumber
+import pytest
+
+import policy_engine
+from policy_engine import _is_heading, iter_pdf_passages
+
+
+def build_pdf(pages: list[list[tuple[str, float, str]]]) -> bytes:
+    """
+    A minimal PDF with one text line per (font, size, text) entry, top to
+    bottom; font "F1" is Helvetica and "F2" Helvetica-Bold.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # the page tree, once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>",
+    ]
+    kids = []
+    for lines in pages:
+        ops = []
+        y = 760
+        for font, size, text in lines:
+            ops.append(f"BT /{font} {size} Tf 72 {y} Td ({text}) Tj ET")
+            y -= int(size * 2)
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R"
+            b" /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def passages(pages) -> list[tuple[str | None, int, int, str]]:
+    with pdfplumber.open(io.BytesIO(build_pdf(pages))) as pdf:
+        return [
+            (p.section, p.page_start, p.page_end, p.text)
+            for p in iter_pdf_passages(pdf, "https://example.ca/policy.pdf")
+        ]
+
+
+BODY = "F1", 10
+
+
+def test_sections_and_page_ranges():
+    pages = [
+        [("F1", 18, "1 Purpose"), (*BODY, "This directive sets the rules."), (*BODY, "It applies to every department.")],
+        [(*BODY, "Departments report each year."), ("F1", 18, "2 Scope"), (*BODY, "Automated decisions are in scope.")],
+        [("F2", 10, "Exceptions"), (*BODY, "Internal tools are excluded.")],
+    ]
+    assert passages(pages) == [
+        ("1 Purpose", 1, 2, "This directive sets the rules.\nIt applies to every department.\nDepartments report each year."),
+        ("2 Scope", 2, 2, "Automated decisions are in scope."),
+        ("Exceptions", 3, 3, "Internal tools are excluded."),
+    ]
+
+
+def test_text_before_the_first_heading_has_no_section():
+    pages = [[(*BODY, "Cover page text."), ("F1", 18, "Overview"), (*BODY, "Body text.")]]
+    assert passages(pages) == [
+        (None, 1, 1, "Cover page text."),
+        ("Overview", 1, 1, "Body text."),
+    ]
+
+
+def test_wrapped_heading_is_joined():
+    body = "Body text set in the most common size on the page."
+    pages = [[("F1", 18, "Guide on the Use of"), ("F1", 18, "Generative AI"), (*BODY, body)]]
+    assert passages(pages) == [("Guide on the Use of Generative AI", 1, 1, body)]
+
+
+def test_long_sections_are_split_at_lines(monkeypatch):
+    monkeypatch.setattr(policy_engine, "PDF_CHUNK_CHARS", 40)
+    pages = [[("F1", 18, "Duties"), *[(*BODY, f"Line number {i} of the duties.") for i in range(4)]]]
+    found = passages(pages)
+    assert [section for section, *_ in found] == ["Duties", "Duties"]
+    assert [text.count("\n") + 1 for *_, text in found] == [2, 2]
+
+
+@pytest.mark.parametrize("text, size, bold, heading", [
+    ("Purpose", 14, False, True),
+    ("Purpose", 10, True, True),
+    ("Purpose", 10, False, False),
+    ("A sentence set large.", 14, False, False),
+    ("2.1", 14, False, False),
+    ("x" * 121, 14, False, False),
+])
+def test_is_heading(text, size, bold, heading):
+    assert _is_heading(text, size, bold, body_size=10) is heading
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from profiling import SamplingProfiler, helper_threads, waiting_for, working_on
+
+
+def _busy(stop: threading.Event) -> None:
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def load_for_this_answer(stop):
+    with working_on("corpus:Ontario"):
+        _busy(stop)
+
+
+def load_for_another_request(stop):
+    with working_on("corpus:Alberta"):
+        _busy(stop)
+
+
+def test_profile_includes_only_the_work_the_answer_waits_for():
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=load_for_this_answer, args=(stop,), name="corpus-prefetch_0"),
+        threading.Thread(target=load_for_another_request, args=(stop,), name="corpus-prefetch_1"),
+    ]
+    for worker in workers:
+        worker.start()
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.002)
+    profiler.start()
+    try:
+        with waiting_for("corpus:Ontario"):
+            assert helper_threads(threading.get_ident()) == {workers[0].ident}
+            time.sleep(0.2)
+    finally:
+        profiler.stop()
+        stop.set()
+        for worker in workers:
+            worker.join(5)
+
+    stacks = profiler.collapsed()
+    assert "corpus-prefetch_0;" in stacks and "load_for_this_answer" in stacks
+    assert "load_for_another_request" not in stacks
+    assert helper_threads(threading.get_ident()) == set()
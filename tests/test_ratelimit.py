@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+from ratelimit import RateLimiter, TokenBucket, _call_with_retries, _retry_after_seconds
+
+
+class _Error(Exception):
+    def __init__(self, headers):
+        self.status_code = 429
+        self.response = type("Response", (), {"headers": headers})()
+
+
+def test_bucket_waits_once_empty():
+    bucket = TokenBucket(60)  # one per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+
+
+def test_bucket_refund():
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    bucket.refund(30)
+    assert bucket.reserve(30) == 0.0
+
+
+def test_limiter_bounds_concurrency():
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10**6, max_concurrency=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        with limiter.slot(10):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert max(peak) == 2
+    assert limiter.active == 0 and limiter.queued == 0
+
+
+def test_limiter_admits_in_arrival_order():
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10**6, max_concurrency=1)
+    order = []
+
+    def call(i):
+        with limiter.slot(10):
+            order.append(i)
+
+    threads = []
+    with limiter.slot(10):
+        for i in range(4):
+            threads.append(threading.Thread(target=call, args=(i,)))
+            threads[-1].start()
+            while limiter.queued < i + 1:
+                time.sleep(0.001)
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2, 3]
+
+
+def test_waiting_caller_can_give_up():
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10**6, max_concurrency=1)
+
+    def check():
+        raise TimeoutError()
+
+    with limiter.slot(10):
+        with pytest.raises(TimeoutError):
+            with limiter.slot(10, check=check):
+                pass
+    assert limiter.queued == 0
+    with limiter.slot(10):
+        pass
+
+
+def test_pause_holds_back_callers():
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10**6, max_concurrency=4)
+    limiter.pause(0.1)
+    started = time.monotonic()
+    with limiter.slot(10):
+        pass
+    assert time.monotonic() - started >= 0.09
+
+
+def test_pause_during_capacity_wait_is_honoured():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10**6, max_concurrency=4)
+    limiter.requests.reserve(600)  # the next request waits 0.1s for capacity
+    timer = threading.Timer(0.02, limiter.pause, args=(0.3,))
+    timer.start()
+    started = time.monotonic()
+    with limiter.slot(10):
+        pass
+    assert time.monotonic() - started >= 0.3
+
+
+def test_retry_keeps_its_place_in_the_queue():
+    limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10**6, max_concurrency=1)
+    order = []
+    attempts = []
+
+    def first():
+        attempts.append(1)
+        order.append("first" if len(attempts) > 1 else "first (429)")
+        if len(attempts) == 1:
+            raise _Error({"retry-after-ms": "50"})
+        return "ok", None
+
+    def second():
+        with limiter.slot(10):
+            order.append("second")
+
+    threads = []
+    with limiter.slot(10):
+        threads.append(threading.Thread(target=_call_with_retries, args=(limiter, 10, 1, first)))
+        threads[-1].start()
+        while limiter.queued < 1:
+            time.sleep(0.001)
+        threads.append(threading.Thread(target=second))
+        threads[-1].start()
+        while limiter.queued < 2:
+            time.sleep(0.001)
+    for t in threads:
+        t.join(5)
+    assert order == ["first (429)", "first", "second"]
+
+
+def test_retry_after_headers():
+    assert _retry_after_seconds(_Error({"retry-after-ms": "1500"})) == 1.5
+    assert _retry_after_seconds(_Error({"retry-after": "3"})) == 3.0
+    assert _retry_after_seconds(_Error({})) is None
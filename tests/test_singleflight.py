@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def _run_concurrently(flight, fn, n=5, key="k"):
+    results = []
+    errors = []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results, errors
+
+
+def test_concurrent_calls_share_one_run():
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.05)
+        return "result"
+
+    results, errors = _run_concurrently(SingleFlight(), work)
+    assert results == ["result"] * 5 and not errors
+    assert len(calls) == 1
+
+
+def test_waiters_get_the_leaders_error():
+    def fail():
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    results, errors = _run_concurrently(SingleFlight(), fail)
+    assert not results
+    assert len(errors) == 5 and all(isinstance(e, ValueError) for e in errors)
+
+
+def test_nothing_is_remembered_afterwards():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == 1
+    assert not flight.in_flight("k")
+    assert flight.do("k", lambda: 2) == 2
+
+
+def test_poll_stops_a_waiter_but_not_the_call():
+    release = threading.Event()
+    stop_waiting = threading.Event()
+
+    def poll():
+        if stop_waiting.is_set():
+            raise TimeoutError()
+
+    flight = SingleFlight(poll=poll, poll_interval=0.01)
+    leader = threading.Thread(target=lambda: flight.do("k", release.wait))
+    leader.start()
+    while not flight.in_flight("k"):
+        time.sleep(0.001)
+    stop_waiting.set()
+    with pytest.raises(TimeoutError):
+        flight.do("k", lambda: "never runs")
+    assert flight.in_flight("k")
+    release.set()
+    leader.join(5)
+    assert not flight.in_flight("k")
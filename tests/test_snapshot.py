@@ -0,0 +1,60 @@
+import struct
+
+import pytest
+
+from corpus_store import CorpusStore, Passage
+from snapshot import SNAPSHOT_FORMAT_VERSION, SNAPSHOT_MAGIC, CorpusSnapshot, write_snapshot
+
+
+@pytest.fixture
+def store():
+    store = CorpusStore()
+    store.put("Ontario", [
+        ("https://on/a", [Passage("https://on/a", "Scope of the directive.", section="Scope", page_start=2, page_end=2)]),
+        ("https://shared", "Text published by both governments."),
+    ])
+    store.put("Alberta", [("https://shared", "Text published by both governments.")])
+    return store
+
+
+def test_header_layout(store, tmp_path):
+    path = tmp_path / "corpus.snapshot"
+    manifest = write_snapshot(str(path), store, ["Ontario", "Alberta"])
+    data = path.read_bytes()
+    magic, version, manifest_length = struct.unpack_from("<8sIQ", data, 0)
+    assert magic == SNAPSHOT_MAGIC and version == SNAPSHOT_FORMAT_VERSION
+    assert manifest["format_version"] == SNAPSHOT_FORMAT_VERSION
+    # Identical texts are written once; blobs follow the manifest back to back
+    assert len(manifest["blobs"]) == 2
+    blob_bytes = sum(size for _, size in manifest["blobs"].values())
+    assert len(data) == 20 + manifest_length + blob_bytes
+
+
+def test_round_trip_through_store(store, tmp_path):
+    path = tmp_path / "corpus.snapshot"
+    write_snapshot(str(path), store, ["Ontario", "Alberta"], {"https://on/a": {"fetched": "today"}})
+    snapshot = CorpusSnapshot(str(path))
+    assert snapshot.jurisdictions() == ["Ontario", "Alberta"]
+    assert snapshot.records("Ontario") == store.sources("Ontario")
+    assert snapshot.records("Quebec") is None
+    assert snapshot.source_info("https://on/a") == {"fetched": "today"}
+
+    reader = CorpusStore(snapshot=snapshot)
+    assert reader.text("Ontario") == store.text("Ontario")
+    assert reader.text("Alberta") == store.text("Alberta")
+    passage = next(reader.iter_passages("Ontario"))
+    assert (passage.section, passage.page_start) == ("Scope", 2)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not.snapshot"
+    path.write_bytes(b"NOTSNAP\0" + struct.pack("<IQ", 1, 0))
+    with pytest.raises(ValueError, match="not a corpus snapshot"):
+        CorpusSnapshot(str(path))
+
+
+def test_rejects_other_format_versions(tmp_path):
+    path = tmp_path / "future.snapshot"
+    path.write_bytes(struct.pack("<8sIQ", SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION + 1, 2) + b"{}")
+    with pytest.raises(ValueError, match="Unsupported corpus snapshot version"):
+        CorpusSnapshot(str(path))
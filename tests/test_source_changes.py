@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+import policy_engine as pe
+from cache_backend import MemoryBackend
+from corpus_store import CorpusStore, Passage, SourceWriter
+from source_changes import Artifact, DependencyTracker, SourceChangeLog
+
+URL = "https://example.org/policy"
+
+
+def _artifact(digest, url=URL):
+    return Artifact("single", ["Ontario"], "What is the policy?", {url: digest})
+
+
+def test_dependents_match_the_exact_source_text():
+    tracker = DependencyTracker()
+    tracker.record("a", _artifact("old"))
+    tracker.record("b", _artifact("new"))
+    assert tracker.dependents(URL, "old") == ["a"]
+    tracker.forget("a")
+    assert tracker.dependents(URL, "old") == []
+    assert tracker.dependents(URL, "new") == ["b"]
+
+
+def test_oldest_artifacts_are_forgotten_past_max_entries():
+    tracker = DependencyTracker(max_entries=2)
+    for key in "abc":
+        tracker.record(key, _artifact("d"))
+    assert len(tracker) == 2
+    assert tracker.dependents(URL, "d") == ["b", "c"]
+
+
+def test_workers_share_dependencies_through_the_backend():
+    backend = MemoryBackend()
+    first = DependencyTracker(backend=backend)
+    second = DependencyTracker(backend=backend)
+    first.record("a", _artifact("d"))
+    second.record("b", _artifact("d"))
+    assert first.dependents(URL, "d") == ["a", "b"]
+    first.forget("b")
+    assert DependencyTracker(backend=backend).dependents(URL, "d") == ["a"]
+
+
+def test_shared_dependencies_expire_with_the_answers():
+    backend = MemoryBackend()
+    DependencyTracker(backend=backend, ttl_seconds=0.01).record("a", _artifact("d"))
+    other = DependencyTracker(backend=backend)
+    assert other.dependents(URL, "d") == ["a"]
+    time.sleep(0.02)
+    assert other.dependents(URL, "d") == []
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    """The engine with a fresh store, tracker and change log, fetching `texts[url]`."""
+    texts = {URL: "First version of the policy.", "https://example.org/other": "Unchanged text."}
+
+    def fetch(url):
+        writer = SourceWriter(url)
+        writer.add(Passage(url, texts[url]))
+        return writer.finish()
+
+    regenerated = []
+    monkeypatch.setattr(pe, "JURISDICTION_SOURCES", {**pe.JURISDICTION_SOURCES, "Ontario": list(texts)})
+    monkeypatch.setattr(pe, "fetch_source", fetch)
+    monkeypatch.setattr(pe, "_cache_backend", None)
+    monkeypatch.setattr(pe, "_corpus_store", CorpusStore())
+    monkeypatch.setattr(pe, "_dependencies", DependencyTracker())
+    monkeypatch.setattr(pe, "_source_changes", SourceChangeLog(str(tmp_path / "changes.jsonl")))
+    monkeypatch.setattr(pe, "_schedule_regeneration", regenerated.append)
+    pe._build_jurisdiction_corpus("Ontario")
+    return texts, regenerated
+
+
+def test_refresh_invalidates_only_answers_built_from_changed_sources(engine):
+    texts, regenerated = engine
+    digests = {r.url: r.digest for r in pe.get_corpus_store().sources("Ontario")}
+    stale = Artifact("single", ["Ontario"], "Changed?", {URL: digests[URL]})
+    kept = Artifact("single", ["Ontario"], "Unchanged?", {"https://example.org/other": digests["https://example.org/other"]})
+    pe._dependencies.record("stale", stale)
+    pe._dependencies.record("kept", kept)
+
+    texts[URL] = "Second version of the policy."
+    entries = pe.refresh_jurisdiction_corpus("Ontario")
+
+    assert [e["url"] for e in entries] == [URL]
+    assert entries[0]["invalidated"] == ["stale"]
+    assert regenerated == [stale]
+    assert pe._dependencies.get("stale") is None
+    assert pe._dependencies.get("kept") == kept
+    assert "Second version" in pe.get_corpus_store().text("Ontario")
+
+
+def test_refresh_writes_the_audit_log(engine):
+    texts, _ = engine
+    assert pe.refresh_jurisdiction_corpus("Ontario") == []
+    assert pe._source_changes.entries() == []
+
+    texts[URL] = "Second version of the policy."
+    pe.refresh_jurisdiction_corpus("Ontario")
+    [entry] = pe._source_changes.entries()
+    assert entry["jurisdiction"] == "Ontario"
+    assert entry["url"] == URL
+    assert entry["old_digest"] != entry["new_digest"]
+    assert "-First version of the policy." in entry["diff"]
+    assert "+Second version of the policy." in entry["diff"]
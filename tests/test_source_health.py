@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+import policy_engine as pe
+from cache_backend import MemoryBackend
+from corpus_store import CorpusStore, Passage, SourceWriter
+from source_health import SourceHealthTracker
+
+URL = "https://example.ca/policy"
+
+
+def source(text: str):
+    writer = SourceWriter(URL)
+    writer.add(Passage(URL, text))
+    return writer.finish()
+
+
+def test_circuit_opens_after_threshold_failures():
+    tracker = SourceHealthTracker(failure_threshold=2, cooloff_seconds=60)
+    tracker.record_failure(URL, 500, "HTTP 500", 0.1)
+    assert tracker.allow(URL)
+    record = tracker.record_failure(URL, None, "ConnectTimeout", 0.1)
+    assert not tracker.allow(URL)
+    assert record.open_until - time.time() == pytest.approx(60, abs=1)
+    assert "skipped after 2 failures" in record.summary()
+
+
+def test_half_open_trial_closes_or_reopens_the_circuit():
+    tracker = SourceHealthTracker(failure_threshold=1, cooloff_seconds=0.05)
+    tracker.record_failure(URL, 500, "HTTP 500", 0.1)
+    assert not tracker.allow(URL)
+    time.sleep(0.1)
+    # Cool-off over: the next fetch goes through as a trial
+    assert tracker.allow(URL)
+    record = tracker.record_failure(URL, 500, "HTTP 500", 0.1)
+    assert not tracker.allow(URL)
+    assert record.consecutive_failures == 2
+    time.sleep(0.15)
+    assert tracker.allow(URL)
+    tracker.record_success(URL, 200, 0.1, source("Back again."))
+    assert tracker.allow(URL)
+    assert tracker.get(URL).consecutive_failures == 0
+    assert tracker.get(URL).summary() == "ok"
+
+
+def test_cooloff_doubles_up_to_the_maximum():
+    tracker = SourceHealthTracker(failure_threshold=2, cooloff_seconds=10, max_cooloff_seconds=35)
+    cooloffs = []
+    for _ in range(5):
+        record = tracker.record_failure(URL, 500, "HTTP 500", 0.1)
+        if record.open_until:
+            cooloffs.append(round(record.open_until - record.last_checked))
+    assert cooloffs == [10, 20, 35, 35]
+
+
+def test_cooloff_stays_bounded_after_many_failures():
+    tracker = SourceHealthTracker(failure_threshold=2, cooloff_seconds=10, max_cooloff_seconds=3600)
+    for _ in range(2000):
+        record = tracker.record_failure(URL, 500, "HTTP 500", 0.1)
+    assert round(record.open_until - record.last_checked) == 3600
+
+
+def test_only_the_digest_is_kept_in_memory():
+    good = source("Good text.")
+    tracker = SourceHealthTracker()
+    tracker.record_success(URL, 200, 0.1, good)
+    assert tracker.last_good_digest(URL) == good.digest
+    assert tracker.last_good(URL) is None
+    assert tracker._last_good == {URL: good.digest}
+
+
+def test_last_good_copy_is_shared_through_the_backend():
+    backend = MemoryBackend()
+    good = source("Good text.")
+    SourceHealthTracker(backend=backend).record_success(URL, 200, 0.1, good)
+    other = SourceHealthTracker(backend=backend)
+    assert other.last_good_digest(URL) == good.digest
+    assert [p.text for p in other.last_good(URL).iter_passages()] == ["Good text."]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """The engine with fresh health records and corpus store, fetching `responses[url]`."""
+    responses = {}
+
+    def fetch(url, outcome=None):
+        status, text = responses[url]
+        outcome["status"] = status
+        if status != 200:
+            outcome["error"] = f"HTTP {status}"
+            return
+        yield Passage(url, text)
+
+    monkeypatch.setattr(pe, "iter_passages_from_url", fetch)
+    monkeypatch.setattr(pe, "_source_health", SourceHealthTracker(failure_threshold=2, cooloff_seconds=60))
+    monkeypatch.setattr(pe, "_corpus_store", CorpusStore())
+    return responses
+
+
+def text_of(fetched) -> str:
+    return "".join(p.text for p in fetched.iter_passages())
+
+
+def test_fetch_source_falls_back_to_the_stored_copy(engine):
+    engine[URL] = (200, "Version one.")
+    fetched = pe.fetch_source(URL)
+    assert text_of(fetched) == "Version one."
+    pe.get_corpus_store().put("Ontario", [(URL, fetched)])
+
+    engine[URL] = (503, "")
+    assert text_of(pe.fetch_source(URL)) == "Version one."
+    assert pe.get_source_health().get(URL).consecutive_failures == 1
+
+
+def test_fetch_source_skips_a_source_while_its_circuit_is_open(engine):
+    engine[URL] = (200, "Version one.")
+    pe.get_corpus_store().put("Ontario", [(URL, pe.fetch_source(URL))])
+    engine[URL] = (503, "")
+    pe.fetch_source(URL)
+    pe.fetch_source(URL)
+    assert not pe.get_source_health().allow(URL)
+
+    # Not requested at all while the circuit is open
+    del engine[URL]
+    assert text_of(pe.fetch_source(URL)) == "Version one."
+
+
+def test_fetch_source_without_a_good_copy_is_empty(engine):
+    engine[URL] = (404, "")
+    assert pe.fetch_source(URL).length == 0